@@ -36,6 +36,9 @@ class Agent(object):
         self._model = None
         self.path = path
         self.device = device
+        # (policy in canonical order, value) predicted by the model, keyed 
+        # by the canonical key of the game state. (See cached_predict().)
+        self._predictions = {}
                
     @property
     def model(self):
@@ -105,6 +108,8 @@ class Agent(object):
                 )
         # update agents path attribute
         self.path = path
+        # predictions of the old parameters are stale
+        self._predictions.clear()
     
     def MCTS(self, root, search_iters, temp):
         ''' Returns the Policy found from a MCTS.
@@ -127,7 +132,7 @@ class Agent(object):
         '''
         # if the root has not been expanded, then expand...
         if not root.is_expanded:
-            probs, value = self.predict(root.state.encoded_state)
+            probs, value = self.cached_predict(root.state)
             actions = root.state.valid_actions()
             root.expand(probs, actions)
         # perform MCTS
@@ -138,10 +143,13 @@ class Agent(object):
                 # the value should be from the current players perspective
                 value = -1
                 leaf.backup(value)
+            # if the leaf is in the tablebase, then its value is known...
+            elif (known := leaf.state.known_value()) is not None:
+                leaf.backup(known)
             # if no winner yet...
             else:
                 # predict
-                probs, value = self.predict(leaf.state.encoded_state)
+                probs, value = self.cached_predict(leaf.state)
                 # expand and backup
                 actions = leaf.state.valid_actions()
                 leaf.expand(probs, actions)
@@ -228,6 +236,45 @@ class Agent(object):
         
         return probs, value
     
+    def cached_predict(self, game_state, max_size=PREDICTION_CACHE_SIZE):
+        ''' Returns the policy and value predictions from the agents model 
+        for 'game_state', as predict() (not training). Predictions are 
+        cached by the canonical key of the state (see GameState.key), so 
+        a position reached again in search, by transposed moves or as a 
+        relabelled copy, is only predicted once. (The policy is kept in the
+        canonical order of the nodes and mapped back to the labels of each
+        copy.)
+
+        Parameters
+        ----------
+        game_state : GameState
+            state of an upset-downset game.
+        max_size : int (positive), optional
+            the cache is cleared once it holds this many predictions. The 
+            default is PREDICTION_CACHE_SIZE.
+
+        Returns
+        -------
+        probs : numpy array
+            policy predicted by the agents model.
+        value : float
+            the game value predicted by the agents model.
+
+        '''
+        order = game_state.canonical_order
+        cached = self._predictions.get(game_state.key)
+        if cached is None:
+            probs, value = self.predict(game_state.encoded_state)
+            if len(self._predictions) >= max_size:
+                self._predictions.clear()
+            self._predictions[game_state.key] = (probs[order], value)
+        else:
+            canonical_probs, value = cached
+            probs = np.zeros(MAX_NODES, dtype=np.float32)
+            probs[order] = canonical_probs
+        
+        return probs, value
+    
     def approximate_outcome(self, game, search_iters):
         '''Approximates the outcome of game. For this to malke sense the game
         must be a normal play short partisan combinatorial game (a combinatorial 
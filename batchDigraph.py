@@ -0,0 +1,189 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module holds batched versions of some of the algorithms in the
+digraph module. A batch of B directed graphs on (at most) n nodes is stored
+as a boolean adjacency tensor of shape (B, n, n): entry (b, i, j) is True if
+and only if there is an edge i --> j in the b-th graph. Every function
+works on all B graphs at once in a few vectorized passes. (A single graph
+may be passed as an (n, n) array.)
+"""
+import numpy as np
+
+def to_adjacency(G, num_nodes):
+    ''' Returns the adjacency matrix of the directed graph 'G'.
+
+    Parameters
+    ----------
+    G : dict
+        adjacency representation of a directed graph. (Adjacency lists keyed
+        by node.) Nodes are to be labelled by 0,...,'num_nodes'-1.
+    num_nodes : int (nonnegative)
+        the size of the adjacency matrix.
+
+    Returns
+    -------
+    numpy array
+        boolean array of shape ('num_nodes', 'num_nodes').
+
+    '''
+    A = np.zeros((num_nodes, num_nodes), dtype=bool)
+    for v in G:
+        A[v, G[v]] = True
+    return A
+
+def to_adjacency_batch(graphs, num_nodes):
+    ''' Returns the adjacency tensor of the directed graphs 'graphs'.
+
+    Parameters
+    ----------
+    graphs : list
+        adjacency representations of directed graphs. (Adjacency lists keyed
+        by node.) Nodes are to be labelled by 0,...,'num_nodes'-1.
+    num_nodes : int (nonnegative)
+        the number of nodes in each graph of the batch.
+
+    Returns
+    -------
+    numpy array
+        boolean array of shape (len('graphs'), 'num_nodes', 'num_nodes').
+
+    '''
+    A = np.zeros((len(graphs), num_nodes, num_nodes), dtype=bool)
+    for b, G in enumerate(graphs):
+        for v in G:
+            A[b, v, G[v]] = True
+    return A
+
+def from_adjacency(A, nodes=None):
+    ''' Returns the adjacency representation of the directed graph with
+    adjacency matrix 'A'.
+
+    Parameters
+    ----------
+    A : numpy array
+        boolean array of shape (n, n).
+    nodes : iterable, optional
+        the nodes to be kept. The default is None, in which case all
+        0,...,n-1 are kept.
+
+    Returns
+    -------
+    dict
+        adjacency lists keyed by node.
+
+    '''
+    nodes = range(len(A)) if nodes is None else nodes
+    return {int(v): np.flatnonzero(A[v]).tolist() for v in nodes}
+
+def unpack_rows(row_masks, num_nodes):
+    ''' Returns the adjacency tensor whose rows are given as bitmasks.
+
+    Parameters
+    ----------
+    row_masks : numpy array
+        int array of shape (B, n) (or (n,)): bit j of row_masks[b, i] is set 
+        if and only if there is an edge i --> j in the b-th graph.
+    num_nodes : int (nonnegative)
+        the number of nodes n. (At most 63.)
+
+    Returns
+    -------
+    numpy array
+        boolean array of shape (B, n, n) (or (n, n)).
+
+    '''
+    row_masks = np.asarray(row_masks, dtype=np.int64)
+    return ((row_masks[..., None] >> np.arange(num_nodes)) & 1).astype(bool)
+
+def transitive_closure(A):
+    ''' Returns the transitive closures of the directed graphs with adjacency
+    tensor 'A'. (Vectorized Warshall: n passes, one per intermediate node.)
+
+    Parameters
+    ----------
+    A : numpy array
+        boolean array of shape (B, n, n) or (n, n).
+
+    Returns
+    -------
+    numpy array
+        boolean array of the same shape as 'A': entry (b, i, j) is True if
+        and only if there is a (nonempty) path i --> j in the b-th graph.
+
+    Reference:
+        https://en.wikipedia.org/wiki/Floyd%E2%80%93Warshall_algorithm
+
+    '''
+    R = np.array(A, dtype=bool)
+    n = R.shape[-1]
+    for k in range(n):
+        # i --> k --> j gives i --> j
+        R |= R[..., :, k, None] & R[..., None, k, :]
+    return R
+
+def is_acyclic(A, closure=None):
+    ''' Returns wether each directed graph with adjacency tensor 'A' is
+    acyclic.
+
+    Parameters
+    ----------
+    A : numpy array
+        boolean array of shape (B, n, n) or (n, n).
+    closure : numpy array, optional
+        the transitive closure of 'A' if already at hand. The default is
+        None.
+
+    Returns
+    -------
+    numpy array (or bool)
+        boolean array of shape (B,): True if the b-th graph is acyclic and
+        False otherwise.
+
+    '''
+    R = transitive_closure(A) if closure is None else closure
+    # a graph has a cycle if and only if some node reaches itself.
+    return ~np.diagonal(R, axis1=-2, axis2=-1).any(axis=-1)
+
+def transitive_reduction(A, closure=None):
+    ''' Returns the transitive reductions of the directed acyclic graphs with
+    adjacency tensor 'A'. (It is assumed that the graphs are acyclic, we do
+    not check.) An edge of the transitive closure survives exactly when it
+    is not the composite of two edges of the transitive closure.
+
+    Parameters
+    ----------
+    A : numpy array
+        boolean array of shape (B, n, n) or (n, n).
+    closure : numpy array, optional
+        the transitive closure of 'A' if already at hand. The default is
+        None.
+
+    Returns
+    -------
+    numpy array
+        boolean array of the same shape as 'A'.
+
+    '''
+    R = transitive_closure(A) if closure is None else closure
+    # boolean matrix product of the closure with itself
+    R_f = R.astype(np.float32)
+    two_step = np.matmul(R_f, R_f) > 0
+    return R & ~two_step
+
+def number_of_edges(A):
+    ''' Returns the number of edges in each directed graph with adjacency
+    tensor 'A'.
+
+    Parameters
+    ----------
+    A : numpy array
+        boolean array of shape (B, n, n) or (n, n).
+
+    Returns
+    -------
+    numpy array (or int)
+        int array of shape (B,).
+
+    '''
+    return np.count_nonzero(A, axis=(-2, -1))
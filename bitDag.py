@@ -0,0 +1,460 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+"""
+
+def bit(x):
+    ''' Returns the bitmask having only the bit for node 'x' set.
+
+    Parameters
+    ----------
+    x : int (nonnegative)
+        node label.
+
+    Returns
+    -------
+    int
+        the integer 2**x.
+
+    '''
+    return 1 << int(x)
+
+def bits(mask):
+    ''' Returns the nodes whose bits are set in 'mask', in increasing order.
+
+    Parameters
+    ----------
+    mask : int (nonnegative)
+        bitmask of nodes: bit x is set if and only if node x is present.
+
+    Returns
+    -------
+    list
+        the nodes (int) present in 'mask'.
+
+    '''
+    nodes = []
+    while mask:
+        low = mask & -mask
+        nodes.append(low.bit_length() - 1)
+        mask ^= low
+    return nodes
+
+def popcount(mask):
+    ''' Returns the number of bits set in 'mask'.
+
+    Parameters
+    ----------
+    mask : int (nonnegative)
+        bitmask of nodes.
+
+    Returns
+    -------
+    int
+        the number of nodes present in 'mask'.
+
+    '''
+    return bin(mask).count('1')
+
+def to_mask(nodes):
+    ''' Returns the bitmask of 'nodes'.
+
+    Parameters
+    ----------
+    nodes : iterable
+        node labels (nonnegative ints).
+
+    Returns
+    -------
+    int
+        bitmask having the bit of each node in 'nodes' set.
+
+    '''
+    mask = 0
+    for x in nodes:
+        mask |= 1 << int(x)
+    return mask
+
+class BitDag(object):
+    ''' Class for a directed acyclic graph stored as integer bitmasks.
+
+    Node x is represented by the bit 2**x. For each node we store the mask
+    of its children and parents, and once (in topological order) the masks
+    of its descendants and ancestors. Reachability queries (upsets and
+    downsets), sinks, sources, transitive closure and transitive reduction
+    are then all word operations on these masks.
+    '''
+    def __init__(self, dag):
+        '''
+        Parameters
+        ----------
+        dag : dict
+            adjacency representation of a directed graph. (Adjacency lists
+            keyed by node.) Nodes are to be labelled by nonnegative integers.
+            All nodes must be a key in the dict.
+
+        Returns
+        -------
+        None.
+
+        NOTE: if 'dag' has a cycle no reachability information is computed.
+        Check with the is_acyclic() method.
+
+        '''
+        # labels may be numpy integers, which would overflow as masks.
+        nodes = 0
+        children = {}
+        parents = {}
+        for v in dag:
+            v = int(v)
+            nodes |= 1 << v
+            children[v] = 0
+            parents[v] = 0
+        for v in dag:
+            v_int = int(v)
+            for u in dag[v]:
+                u = int(u)
+                children[v_int] |= 1 << u
+                parents[u] |= 1 << v_int
+        self.nodes = nodes
+        self.children = children
+        self.parents = parents
+        self.order = self._topological_order()
+        self.descendant_masks = None
+        self.ancestor_masks = None
+        self._components = None
+        if self.order is not None:
+            self._set_reachability()
+
+    @classmethod
+    def from_masks(cls,
+                   nodes,
+                   children,
+                   parents,
+                   descendant_masks,
+                   ancestor_masks,
+                   order,
+                   components=None):
+        ''' Returns a BitDag built directly from precomputed masks. (No
+        checking is done, the masks are assumed to be consistent.)
+
+        Parameters
+        ----------
+        nodes : int
+            bitmask of all nodes.
+        children : dict
+            bitmask of children keyed by node.
+        parents : dict
+            bitmask of parents keyed by node.
+        descendant_masks : dict
+            bitmask of (strict) descendants keyed by node.
+        ancestor_masks : dict
+            bitmask of (strict) ancestors keyed by node.
+        order : list
+            a topological ordering of the nodes.
+        components : list, optional
+            bitmasks of the connected components. The default is None, in
+            which case they are found when first needed.
+
+        Returns
+        -------
+        BitDag
+
+        '''
+        bitdag = cls.__new__(cls)
+        bitdag.nodes = nodes
+        bitdag.children = children
+        bitdag.parents = parents
+        bitdag.descendant_masks = descendant_masks
+        bitdag.ancestor_masks = ancestor_masks
+        bitdag.order = order
+        bitdag._components = components
+        return bitdag
+
+    def _topological_order(self):
+        ''' Returns a topological ordering of the nodes (Kahn's algorithm),
+        or None if there is a cycle.
+        '''
+        remaining = dict(self.parents)
+        ready = [v for v in remaining if remaining[v] == 0]
+        order = []
+        while ready:
+            v = ready.pop()
+            order.append(v)
+            v_bit = 1 << v
+            for u in bits(self.children[v]):
+                remaining[u] &= ~v_bit
+                if remaining[u] == 0:
+                    ready.append(u)
+        return order if len(order) == len(self.children) else None
+
+    def _set_reachability(self):
+        ''' Computes descendant and ancestor masks of all nodes in a single
+        pass over the topological ordering (in each direction).
+        '''
+        descendant_masks = {}
+        for v in reversed(self.order):
+            des = 0
+            for u in bits(self.children[v]):
+                des |= (1 << u) | descendant_masks[u]
+            descendant_masks[v] = des
+        ancestor_masks = {}
+        for v in self.order:
+            anc = 0
+            for u in bits(self.parents[v]):
+                anc |= (1 << u) | ancestor_masks[u]
+            ancestor_masks[v] = anc
+        self.descendant_masks = descendant_masks
+        self.ancestor_masks = ancestor_masks
+
+    def is_acyclic(self):
+        ''' Returns wether the directed graph is acyclic.
+
+        Returns
+        -------
+        bool
+            True if acyclic and False otherwise.
+
+        '''
+        return self.order is not None
+
+    def __len__(self):
+        return len(self.children)
+
+    def __iter__(self):
+        return iter(bits(self.nodes))
+
+    def __contains__(self, x):
+        return x in self.children
+
+    def number_of_edges(self):
+        ''' Returns the number of edges.
+
+        Returns
+        -------
+        int
+            the number of edges.
+
+        '''
+        return sum(popcount(mask) for mask in self.children.values())
+
+    def descendants(self, x):
+        ''' Returns the bitmask of all nodes reachable from node 'x' (not
+        including 'x').
+        '''
+        return self.descendant_masks[x]
+
+    def ancestors(self, x):
+        ''' Returns the bitmask of all nodes having a path to node 'x' (not
+        including 'x').
+        '''
+        return self.ancestor_masks[x]
+
+    def upset(self, x):
+        ''' Returns the bitmask of the upset of node 'x': all nodes
+        reachable from 'x', including 'x' itself.
+        '''
+        return self.descendant_masks[x] | (1 << int(x))
+
+    def downset(self, x):
+        ''' Returns the bitmask of the downset of node 'x': all nodes
+        having a path to 'x', including 'x' itself.
+        '''
+        return self.ancestor_masks[x] | (1 << int(x))
+
+    def sinks(self):
+        ''' Returns the bitmask of all sinks. (A node is a sink if it has
+        no outgoing edges.)
+        '''
+        mask = 0
+        for v, c in self.children.items():
+            if not c:
+                mask |= 1 << v
+        return mask
+
+    def sources(self):
+        ''' Returns the bitmask of all sources. (A node is a source if it has
+        no incoming edges.)
+        '''
+        mask = 0
+        for v, p in self.parents.items():
+            if not p:
+                mask |= 1 << v
+        return mask
+
+    def components(self):
+        ''' Returns the bitmasks of the connected components of the
+        undirected graph underlying the graph, ordered by their smallest
+        node. (Found once by union-find and cached. Options inherit them,
+        see restrict().)
+
+        Returns
+        -------
+        list
+            bitmasks of the connected components.
+
+        '''
+        if self._components is None:
+            self._components = self._split(self.nodes)
+        return self._components
+
+    def _split(self, mask):
+        ''' Returns the bitmasks of the connected components of the subgraph
+        on the nodes in 'mask' (union-find over its edges), ordered by their
+        smallest node.
+        '''
+        root = {v: v for v in bits(mask)}
+        def find(v):
+            while root[v] != v:
+                root[v] = root[root[v]]
+                v = root[v]
+            return v
+        for v in root:
+            for u in bits(self.children[v] & mask):
+                a, b = find(v), find(u)
+                if a != b:
+                    root[max(a, b)] = min(a, b)
+        components = {}
+        for v in root:
+            r = find(v)
+            components[r] = components.get(r, 0) | (1 << v)
+        return [components[r] for r in sorted(components)]
+
+    def transitive_closure(self):
+        ''' Returns the transitive closure. (Shares reachability masks with
+        'self'.)
+
+        Returns
+        -------
+        BitDag
+            the transitive closure: the children of each node are its
+            descendants.
+
+        '''
+        return BitDag.from_masks(
+            self.nodes,
+            dict(self.descendant_masks),
+            dict(self.ancestor_masks),
+            self.descendant_masks,
+            self.ancestor_masks,
+            self.order,
+            self._components
+            )
+
+    def transitive_reduction(self):
+        ''' Returns the transitive reduction. (Shares reachability masks with
+        'self'.) A child u of v is removed exactly when u is a descendant of
+        another child of v.
+
+        Returns
+        -------
+        BitDag
+            the transitive reduction.
+
+        '''
+        des = self.descendant_masks
+        children = {}
+        parents = {v: 0 for v in self.children}
+        for v, c in self.children.items():
+            redundant = 0
+            for u in bits(c):
+                redundant |= des[u]
+            c &= ~redundant
+            children[v] = c
+            v_bit = 1 << v
+            for u in bits(c):
+                parents[u] |= v_bit
+        return BitDag.from_masks(
+            self.nodes,
+            children,
+            parents,
+            self.descendant_masks,
+            self.ancestor_masks,
+            self.order,
+            self._components
+            )
+
+    def reverse(self):
+        ''' Returns the reverse directed graph. (Shares all masks with 'self',
+        only the roles of children/parents and descendants/ancestors are
+        swapped.)
+        '''
+        return BitDag.from_masks(
+            self.nodes,
+            self.parents,
+            self.children,
+            self.ancestor_masks,
+            self.descendant_masks,
+            self.order[::-1],
+            self._components
+            )
+
+    def restrict(self, mask):
+        ''' Returns the subgraph on the nodes in 'mask', which is assumed to
+        be convex: any node on a path between two nodes of 'mask' is in
+        'mask'. (E.g., the complement of an upset or a downset.) Then all
+        reachability information restricts and nothing is recomputed. If
+        the components are known, only those losing nodes are split.
+
+        Parameters
+        ----------
+        mask : int
+            bitmask of a convex subset of nodes.
+
+        Returns
+        -------
+        BitDag
+            the subgraph on 'mask'.
+
+        '''
+        mask &= self.nodes
+        nodes = bits(mask)
+        option = BitDag.from_masks(
+            mask,
+            {v: self.children[v] & mask for v in nodes},
+            {v: self.parents[v] & mask for v in nodes},
+            {v: self.descendant_masks[v] & mask for v in nodes},
+            {v: self.ancestor_masks[v] & mask for v in nodes},
+            [v for v in self.order if (mask >> v) & 1]
+            )
+        if self._components is not None:
+            # components missing no nodes are unchanged, only the others
+            # (e.g. the one component containing a played upset) are split.
+            components = []
+            for component in self._components:
+                if component & mask == component:
+                    components.append(component)
+                elif component & mask:
+                    components.extend(option._split(component & mask))
+            components.sort(key=lambda component: component & -component)
+            option._components = components
+        return option
+
+    def subgraph(self, mask):
+        ''' Returns the subgraph on the nodes in 'mask'. (Reachability is
+        recomputed, use restrict() for convex subsets.)
+
+        Parameters
+        ----------
+        mask : int
+            bitmask of a subset of nodes.
+
+        Returns
+        -------
+        BitDag
+            the subgraph on 'mask'.
+
+        '''
+        mask &= self.nodes
+        return BitDag({v: bits(self.children[v] & mask) for v in bits(mask)})
+
+    def to_dict(self):
+        ''' Returns the adjacency representation of the graph. (Adjacency
+        lists keyed by node.)
+
+        Returns
+        -------
+        dict
+            adjacency lists keyed by node.
+
+        '''
+        return {v: bits(self.children[v]) for v in bits(self.nodes)}
@@ -0,0 +1,143 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module provides a mutable board for playing through a game of
+upset-downset in search, without building a new UpDown (and GameState) for
+every move. The nodes remaining are a single bitmask over the labels of the
+game, the upset and downset of every node and the nodes each player may play
+are precomputed as masks, and the masks before each move are kept on a
+preallocated stack. (A move removes at least one node, so there are never
+more moves to undo than nodes.) Playing and undoing a move are then a few
+int operations, and an UpDown is only built on request (see to_game()).
+"""
+from bitDag import bits
+from outcomeSolver import UP, DOWN
+from upDown import UpDown
+
+class Board(object):
+    ''' Class for a mutable game of upset-downset, with a player to move,
+    supporting play() and undo().
+    '''
+    def __init__(self, game, current_player=UP):
+        '''
+        Parameters
+        ----------
+        game : UpDown
+            a game of upset-downset.
+        current_player : int (0 or 1), optional
+            the player to move: UP (0) or DOWN (1). The default is UP.
+
+        Returns
+        -------
+        None.
+
+        '''
+        bitdag = game.bitdag
+        self.game = game
+        # masks keyed by node (label).
+        size = max(bitdag) + 1 if len(bitdag) else 0
+        self.up_masks = [0]*size
+        self.down_masks = [0]*size
+        blue, red = 0, 0
+        for x in bitdag:
+            self.up_masks[x] = bitdag.upset(x)
+            self.down_masks[x] = bitdag.downset(x)
+            if game.coloring[x] == 1:
+                blue |= 1 << x
+            elif game.coloring[x] == -1:
+                red |= 1 << x
+        # nodes Up (resp. Down) may play: blue/green (resp. red/green).
+        self.up_playable = bitdag.nodes & ~red
+        self.down_playable = bitdag.nodes & ~blue
+        self.mask = bitdag.nodes
+        self.current_player = current_player
+        # the masks before each move and the nodes played, and the number
+        # of moves played.
+        self.history = [0]*(len(bitdag) + 1)
+        self.moves = [0]*(len(bitdag) + 1)
+        self.depth = 0
+
+    def __len__(self):
+        return bin(self.mask).count('1')
+
+    def valid_mask(self):
+        ''' Returns the bitmask of the nodes the current player may play.
+        '''
+        return self.mask & (self.up_playable if self.current_player == UP
+                            else self.down_playable)
+
+    def valid_actions(self):
+        ''' Returns the nodes the current player may play.
+
+        Returns
+        -------
+        list
+            nodes available to play.
+
+        '''
+        return bits(self.valid_mask())
+
+    def is_terminal(self):
+        ''' Returns wether the current player has lost the game: they have
+        no valid moves.
+        '''
+        return not self.valid_mask()
+
+    def play(self, x):
+        ''' Plays the node 'x' for the current player: removes its upset
+        (if Up is to move) or downset (if Down is to move), and passes the
+        move.
+
+        Parameters
+        ----------
+        x : int (nonnegative)
+            a valid action.
+
+        Returns
+        -------
+        None.
+
+        '''
+        assert (self.valid_mask() >> x) & 1, f'{x} is not a valid action.'
+        self.history[self.depth] = self.mask
+        self.moves[self.depth] = x
+        self.depth += 1
+        if self.current_player == UP:
+            self.mask &= ~self.up_masks[x]
+            self.current_player = DOWN
+        else:
+            self.mask &= ~self.down_masks[x]
+            self.current_player = UP
+
+    def undo(self):
+        ''' Takes back the last move played.
+
+        Returns
+        -------
+        int
+            the node played by the move taken back.
+
+        '''
+        assert self.depth, 'There is no move to undo.'
+        self.depth -= 1
+        self.mask = self.history[self.depth]
+        self.current_player = DOWN if self.current_player == UP else UP
+        return self.moves[self.depth]
+
+    def to_game(self):
+        ''' Returns the game of upset-downset on the nodes remaining.
+
+        Returns
+        -------
+        UpDown
+
+        '''
+        game = self.game
+        option = UpDown(
+            game.bitdag.restrict(self.mask),
+            {x: game.coloring[x] for x in bits(self.mask)},
+            reduced=True
+            )
+        game._inherit_layout(option)
+
+        return option
@@ -0,0 +1,211 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module computes canonical forms of colored directed acyclic
+graphs (games of upset-downset), so that relabelled copies of the same
+position share a single key. The canonical form is found by color
+refinement (1-dimensional Weisfeiler-Leman) of each connected component,
+followed by individualization-refinement to break the remaining ties,
+taking the smallest certificate over all branches. Branches through nodes
+having the same color, children and parents (twins), or through nodes in
+the same orbit under the automorphisms found so far (two leaves with the
+same certificate differ by an automorphism), are explored once.
+
+Reference:
+    - https://en.wikipedia.org/wiki/Graph_canonization
+    - B. D. McKay and A. Piperno, Practical graph isomorphism II,
+      Journal of Symbolic Computation 60 (2014), 94-112.
+"""
+from bitDag import BitDag, bits
+import hashlib
+
+def _refine(cells, children, parents):
+    ''' Returns the coarsest equitable refinement of the ordered partition
+    'cells' (cell keyed by local node index). Cells are renumbered
+    0,1,... by sorting label-independent signatures, so the result does
+    not depend on the labelling.
+    '''
+    num_cells = len(set(cells))
+    while True:
+        signatures = [
+            (cells[v],
+             tuple(sorted([cells[u] for u in children[v]])),
+             tuple(sorted([cells[u] for u in parents[v]])))
+            for v in range(len(cells))
+            ]
+        ranks = {s: r for r, s in enumerate(sorted(set(signatures)))}
+        cells = [ranks[s] for s in signatures]
+        if len(ranks) == num_cells:
+            return cells
+        num_cells = len(ranks)
+
+def _orbits(num_nodes, automorphisms, fixed):
+    ''' Returns the orbit representative keyed by local node index, under
+    the group generated by the 'automorphisms' fixing each node of 'fixed'.
+    (Union-find.)
+    '''
+    root = list(range(num_nodes))
+    def find(v):
+        while root[v] != v:
+            root[v] = root[root[v]]
+            v = root[v]
+        return v
+    for gamma in automorphisms:
+        if any(gamma[v] != v for v in fixed):
+            continue
+        for v in range(num_nodes):
+            a, b = find(v), find(gamma[v])
+            if a != b:
+                root[max(a, b)] = min(a, b)
+    return [find(v) for v in range(num_nodes)]
+
+def _component_form(nodes, colors, children, parents):
+    ''' Returns the canonical certificate and canonical ordering of the
+    nodes of a connected colored dag. ('children' and 'parents' are lists
+    of local node indices keyed by local node index.)
+    '''
+    k = len(nodes)
+    cells = _refine(
+        [(colors[v], len(children[v]), len(parents[v])) for v in range(k)],
+        children,
+        parents
+        )
+    # the smallest certificate found (with its leaf), the first leaf, and 
+    # the automorphisms found by comparing leaves.
+    best = [None, None]
+    first = [None, None]
+    automorphisms = []
+
+    def leaf(cells):
+        # discrete partition: the cell of each node is its position.
+        certificate = (
+            tuple(colors[v] for v in sorted(range(k), key=cells.__getitem__)),
+            tuple(sorted((cells[v], cells[u])
+                         for v in range(k) for u in children[v]))
+            )
+        for other in (first, best):
+            if other[0] == certificate:
+                # two leaves with the same certificate differ by an
+                # automorphism.
+                node_at = [0]*k
+                for v in range(k):
+                    node_at[other[1][v]] = v
+                automorphisms.append([node_at[cells[v]] for v in range(k)])
+                return
+        if first[0] is None:
+            first[0], first[1] = certificate, cells
+        if best[0] is None or certificate < best[0]:
+            best[0], best[1] = certificate, cells
+
+    def search(cells, fixed):
+        cell_sizes = {}
+        for c in cells:
+            cell_sizes[c] = cell_sizes.get(c, 0) + 1
+        if len(cell_sizes) == k:
+            leaf(cells)
+            return
+        # individualize each node of the first smallest nontrivial cell
+        # (one per twin class and orbit) and refine.
+        target = min((size, c) for c, size in cell_sizes.items()
+                     if size > 1)[1]
+        seen_twins = set()
+        seen_orbits = set()
+        for v in range(k):
+            if cells[v] != target:
+                continue
+            twin_class = (frozenset(children[v]), frozenset(parents[v]))
+            if twin_class in seen_twins:
+                continue
+            orbit = _orbits(k, automorphisms, fixed)
+            if any(orbit[v] == orbit[w] for w in seen_orbits):
+                continue
+            seen_twins.add(twin_class)
+            seen_orbits.add(v)
+            split = [2*c + (1 if c == target and u != v else 0)
+                     for u, c in enumerate(cells)]
+            search(_refine(split, children, parents), fixed + [v])
+
+    search(cells, [])
+    certificate, cells = best
+    order = [nodes[v] for v in sorted(range(k), key=cells.__getitem__)]
+    return certificate, order
+
+def canonical_form(dag, coloring=None):
+    ''' Returns a canonical form of the colored directed acyclic graph
+    'dag'. Two colored dags have the same canonical form if and only if
+    they are isomorphic (as colored graphs). (For upset-downset games the
+    dag is transitively reduced, so this is isomorphism of colored posets.)
+
+    Parameters
+    ----------
+    dag : dict or BitDag
+        adjacency representation of a directed acyclic graph. (Adjacency
+        lists keyed by node.)
+    coloring : dict, optional
+        color keyed by node. The default is None, in which case all nodes
+        are colored 0 (green).
+
+    Returns
+    -------
+    certificate : tuple
+        the canonical form: a tuple with one entry per connected component,
+        sorted. Each entry is a pair of the colors of the components nodes
+        in canonical order, and its edges between canonical positions.
+    order : list
+        the nodes of 'dag' in canonical order: the node order[i]
+        is in canonical position i.
+
+    '''
+    bitdag = dag if isinstance(dag, BitDag) else BitDag(dag)
+    forms = []
+    for component in bitdag.components():
+        nodes = bits(component)
+        local = {v: i for i, v in enumerate(nodes)}
+        forms.append(_component_form(
+            nodes,
+            [0 if coloring is None else int(coloring[v]) for v in nodes],
+            [[local[u] for u in bits(bitdag.children[v])] for v in nodes],
+            [[local[u] for u in bits(bitdag.parents[v])] for v in nodes]
+            ))
+    forms.sort(key=lambda form: (len(form[1]), form[0]))
+    certificate = tuple(form[0] for form in forms)
+    order = [v for form in forms for v in form[1]]
+
+    return certificate, order
+
+def canonical_key(dag, coloring=None, extra=None, num_bits=64):
+    ''' Returns a stable (across runs and processes) integer key of the
+    canonical form of the colored directed acyclic graph 'dag'. (See
+    canonical_form().)
+
+    Parameters
+    ----------
+    dag : dict or BitDag
+        adjacency representation of a directed acyclic graph. (Adjacency
+        lists keyed by node.)
+    coloring : dict, optional
+        color keyed by node. The default is None.
+    extra : optional
+        anything with a stable repr (e.g. the player to move) to be hashed
+        along with the canonical form. The default is None.
+    num_bits : int, optional
+        64 or 128. The default is 64.
+
+    Returns
+    -------
+    int (nonnegative)
+        a 'num_bits'-bit hash of the canonical form.
+
+    '''
+    certificate, _ = canonical_form(dag, coloring)
+    return certificate_key(certificate, extra, num_bits)
+
+def certificate_key(certificate, extra=None, num_bits=64):
+    ''' Returns the integer key of the canonical form 'certificate' (as
+    returned by canonical_form()). (See canonical_key().)
+    '''
+    digest = hashlib.blake2b(
+        repr((certificate, extra)).encode(),
+        digest_size=num_bits // 8
+        ).digest()
+    return int.from_bytes(digest, 'little')
@@ -1,14 +1,22 @@
 """
 @author: Charles Petersen and Jamison Barsotti 
+
+NOTE: A game on complete bipartite graphs is kept as the bitmasks of the
+bottom and top nodes of each graph only (every bottom node is below every
+top node). Playing a node removes it and, if it is a bottom node played by
+Up (resp. a top node played by Down), the whole top (resp. bottom) of its
+graph, so options are found from the masks without the directed acyclic
+graph, which is only built when asked for. The graph of each node is looked
+up in a dict shared by a game and all of its options.
 """
 
 from upDown import UpDown
-import digraph
+from bitDag import BitDag, bits, popcount
 
 def complete_bipartite_dag(graphs):
     ''' Returns a directed acyclic graph corresponding to the complete 
     bipartite graphs, 'graphs'.
-    
+
     Parameters
     ----------
     graphs : list
@@ -16,7 +24,7 @@ def complete_bipartite_dag(graphs):
         representinting a distinct instance of the (horizontally-oriented) 
         complete bipartite  graph having 'm' nodes on top and 'n' nodes on 
         bottom.
-        
+
     Returns
     -------
     dict
@@ -27,28 +35,27 @@ def complete_bipartite_dag(graphs):
         from bottom nodes to top nodes. 
 
     '''
-    dag = {}
-    # update total number of nodes processed after each iteration
+    return _parts_dag(_consecutive_parts(graphs))
+
+def _consecutive_parts(graphs):
+    # the (bottom, top) masks of the graphs, labelled consecutively from 0:
+    # the bottom nodes of each graph before its top nodes.
+    parts = []
     last_count = 0  
     for graph in graphs:
-        #determine relations for current graph 
-        graph_rels = {}
-        # number of elements on bottom and top
-        bottom_count = graph[1]
-        top_count = graph[0]
-        # total number of elements in current graph
-        count = top_count + bottom_count
-        # label elements on top and bottom.
-        bot_elems = [i for i in range(last_count, last_count + bottom_count)]
-        top_elems = [i for i in 
-                     range(last_count + bottom_count, last_count + count)]
-        # edges amongst bottom and top nodes
-        graph_rels.update({i: top_elems for i in bot_elems})
-        graph_rels.update({i:[] for i in top_elems})
-        # update before processing next graph
-        dag.update(graph_rels)      
-        last_count += count
-        
+        top_count, bottom_count = graph[0], graph[1]
+        bottom = ((1 << bottom_count) - 1) << last_count
+        top = ((1 << top_count) - 1) << (last_count + bottom_count)
+        parts.append((bottom, top))
+        last_count += top_count + bottom_count
+    return parts
+
+def _parts_dag(parts):
+    dag = {}
+    for bottom, top in parts:
+        top_elems = bits(top)
+        dag.update({i: top_elems for i in bits(bottom)})
+        dag.update({i: [] for i in top_elems})
     return dag
 
 
@@ -60,24 +67,110 @@ class CompleteBipartiteGame(UpDown):
         ''' Initializes an all green game of upset-downset on a poset whose 
         Hasse diagram is a disjoint union of (horizontally-oriented) complete 
         bipartite graphs.
-        
+
         Parameters
         ----------
         graphs : list
             ordered pairs (tuples or lists) of non-negative integers (m,n) each 
             representinting a distinct (horizontally-oriented) complete 
             bipartite having m nodes on top and n nodes on bottom.
-            
+
         Returns
         -------
         None
 
         '''
-        dag = complete_bipartite_dag(graphs)
-        UpDown.__init__(self, dag, reduced = True)
-        self.graphs = graphs
-        
-        
+        parts = _consecutive_parts(graphs)
+        part_of = {x: i for i, (bottom, top) in enumerate(parts)
+                   for x in bits(bottom | top)}
+        self._set_parts(parts, part_of)
+
+    @classmethod
+    def _from_parts(cls, parts, part_of):
+        game = cls.__new__(cls)
+        game._set_parts(parts, part_of)
+        return game
+
+    def _set_parts(self, parts, part_of):
+        # the (bottom, top) masks of each graph (empty once played out), and
+        # the graph of each node.
+        self.parts = parts
+        self._part_of = part_of
+        # the dag and coloring are only built when asked for.
+        self._bitdag = None
+        self._coloring = None
+        self._dag = None
+        self._init_caches()
+
+    @property
+    def graphs(self):
+        # the (m, n) pairs of the graphs not played out.
+        return [(popcount(top), popcount(bottom))
+                for bottom, top in self.parts if bottom | top]
+
+    @property
+    def bitdag(self):
+        if self._bitdag is None:
+            self._bitdag = BitDag(_parts_dag(self.parts))
+        return self._bitdag
+
+    @bitdag.setter
+    def bitdag(self, x):
+        self._bitdag = x
+
+    @property
+    def coloring(self):
+        if self._coloring is None:
+            self._coloring = {x:0 for x in self.nodes()}
+        return self._coloring
+
+    @coloring.setter
+    def coloring(self, x):
+        self._coloring = x
+
+    def nodes(self):
+        ''' Returns all nodes, graph by graph.
+
+        Returns
+        -------
+        list
+            all nodes.
+
+        '''
+        return [x for bottom, top in self.parts for x in bits(bottom | top)]
+
+    def up_nodes(self):
+        return self.nodes()
+
+    def down_nodes(self):
+        return self.nodes()
+
+    def __len__(self):
+        return sum(popcount(bottom | top) for bottom, top in self.parts)
+
+    def _option(self, x, upset):
+        # the game after node x is played, removing its upset if 'upset'
+        # is True and its downset otherwise.
+        i = self._part_of.get(x)
+        assert i is not None, f'{x} is not a node of the game.'
+        bottom, top = self.parts[i]
+        assert (bottom | top) >> x & 1, f'{x} is not a node of the game.'
+        if (bottom >> x) & 1:
+            bottom &= ~(1 << x)
+            if upset:
+                top = 0
+        else:
+            top &= ~(1 << x)
+            if not upset:
+                bottom = 0
+        option_parts = self.parts.copy()
+        option_parts[i] = (bottom, top)
+        option = CompleteBipartiteGame._from_parts(option_parts,
+                                                   self._part_of)
+        self._inherit_layout(option)
+
+        return option
+
     def up_play(self, x):
         '''returns the complete bipartite game of upset-downset 
         left after Up plays node 'x'.
@@ -93,44 +186,8 @@ class CompleteBipartiteGame(UpDown):
             the game after Up plays node 'x'.
 
         '''
-        # get the index of the graph containing node x in the list of graphs 
-        option_graphs = self.graphs.copy()
-        nodes = sorted(list(self.dag))
-        x_idx = nodes.index(x)
-        x_graph_idx = 0
-        num_nodes_before_x = 0
-        while num_nodes_before_x <= x_idx:
-            num_nodes_before_x += sum(option_graphs[x_graph_idx])
-            x_graph_idx += 1
-        x_graph_idx -= 1
-        
-        # remove nodes from graph containing x and mutate list of 
-        # graphs accordingly
-        x_upset = self.upset(x)
-        num_to_remove = len(x_upset)        
-        if num_to_remove > 1:
-            option_m = 0
-            option_n = option_graphs[x_graph_idx][1] - 1
-        else:
-            option_m = option_graphs[x_graph_idx][0] - 1
-            option_n = option_graphs[x_graph_idx][1]
-        graph = (option_m, option_n) 
-        if option_m != 0 or option_n != 0:
-            option_graphs[x_graph_idx] = graph
-        else:
-            del option_graphs[x_graph_idx]
-            
-        # instantiate option, relable nodes and set coloring
-        # (I wish I had a cleaner idea for this, but im lazy...)
-        option_nodes = sorted(list(set(nodes) - set(x_upset)))
-        option = CompleteBipartiteGame(option_graphs)
-        relabelling = {i: option_nodes[i] for i in range(len(option_nodes))}
-        option.dag = digraph.relabel(option.dag, relabelling)
-        option.coloring = {i:0 for i in option_nodes}
-        option.layout = {i: self.layout[i] for i in option_nodes}
-        
-        return  option
-    
+        return self._option(x, upset=True)
+
     def down_play(self, x):
         '''Returns the complete bipartite game of upset-downset 
         left after Down plays node 'x'.
@@ -146,48 +203,12 @@ class CompleteBipartiteGame(UpDown):
             the game after Down plays node 'x'.
 
         '''
-        # get the index of the graph containing node x in the list of graphs 
-        option_graphs = self.graphs.copy()
-        nodes = sorted(list(self.dag))
-        x_idx = nodes.index(x)
-        x_graph_idx = 0
-        num_nodes_before_x = 0
-        while num_nodes_before_x <= x_idx:
-            num_nodes_before_x += sum(option_graphs[x_graph_idx])
-            x_graph_idx += 1
-        x_graph_idx -= 1
-        
-        # remove nodes from graph containing x and mutate list of 
-        # graphs accordingly
-        x_downset = self.downset(x)
-        num_to_remove = len(x_downset)        
-        if num_to_remove > 1:
-            option_m = option_graphs[x_graph_idx][0] - 1
-            option_n = 0
-        else:
-            option_m = option_graphs[x_graph_idx][0]
-            option_n = option_graphs[x_graph_idx][1] - 1
-        graph = (option_m, option_n) 
-        if option_m != 0 or option_n != 0:
-            option_graphs[x_graph_idx] = graph
-        else:
-            del option_graphs[x_graph_idx]
-            
-        # instantiate option, relable nodes and set coloring
-        # (I wish I had a cleaner idea for this, but im lazy...)
-        option_nodes = sorted(list(set(nodes) - set(x_downset)))
-        option = CompleteBipartiteGame(option_graphs)
-        relabelling = {i: option_nodes[i] for i in range(len(option_nodes))}
-        option.dag = digraph.relabel(option.dag, relabelling)
-        option.coloring = {i:0 for i in option_nodes}
-        option.layout = {i: self.layout[i] for i in option_nodes}
-        
-        return  option
-    
+        return self._option(x, upset=False)
+
     def __neg__(self):                
         '''Returns the negative of the complete bipartite game of
         upset-downset.
-    
+
         Returns
         -------
         CompletBipartiteGame
@@ -204,7 +225,7 @@ class CompleteBipartiteGame(UpDown):
         '''Returns the (disjunctive) sum of games. **Relabels elements in 
         'other' to consecutive nonnegative integers starting from len('self').
         If 'other' is a complete bipartote game, then the sum will be too!
-        
+
         Parameters
         ----------
         other : UpDown
@@ -215,7 +236,7 @@ class CompleteBipartiteGame(UpDown):
         UpDown (CompleteBipartiteGame)
             The upset-downset game on the disjoint union of directed acyclic 
             graphs with unchanged colorings.
-            
+
         Note: the sum retains all nodes ('other' being relabelled), edges 
             and coloring from both 'self' and 'other' with no new edges added 
             between 'self' and 'other'
@@ -226,10 +247,10 @@ class CompleteBipartiteGame(UpDown):
             return CompleteBipartiteGame(add_graphs)
         else:
             return super().__add__(other)
-    
+
     def __sub__(self, other):
         ''' Returns the difference of games.
-    
+
         Parameters
         ----------
         other : UpDown
@@ -245,5 +266,3 @@ class CompleteBipartiteGame(UpDown):
 
         '''
         return self + (-other)
-
-            
@@ -3,12 +3,8 @@
 """
 import torch
 
-#GAME STATE PARAMETERS
-MAX_NODES = 10    #max number of nodes ina game playable by the agent
-ENCODED_STATE_SHAPE = (4, MAX_NODES, MAX_NODES)    #shape of encoded game states
-UP = 0    #token for Up player
-DOWN = 1    #token for Down player
-RGB_DIST = (0.25, 0.75)    #distribution of game node colorings in self-play/eval : (RGB, all green)
+#GAME STATE PARAMETERS (see gameConfig.py)
+from gameConfig import *
 
 #MODEL_PARAMETERS
 DEVICE = torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')    #device to put model on        
@@ -22,6 +18,7 @@ NUM_HIDDEN_VAL = 96    #size of the hidden layer in the value head
 DIRICHLET_EPS = 0.25   #fraction of dirichlet noise to add to root probabilities
 DIRICHLET_ALPHA = 2.25  #dirichlet distribution parameter
 C_PUCT = 1.0    #puct formula parameter
+PREDICTION_CACHE_SIZE = 2**16    #max number of model predictions cached by an agent (by canonical key)
 
 #SELF_PLAY_PARAMETERS
 ASYNC_SELF_PLAYS = 8    #the number of parallel self-play processes
@@ -29,6 +26,7 @@ SELF_PLAY_MARKOV_EXP = 1    #exponent for markov process in self play game gener
 SELF_PLAY_SEARCH_ITERS = 600   #number of mcts search iterations in self play
 TEMP = 1.0    #self play temperature
 TEMP_THRSHLD = 2     #self play temperature threshold
+GENERATOR_CHAINS = 32    #number of markov chains run together in generating self-play games
 
 #TRAINING PARAMETERS
 GAMES_TO_TRAIN = 10000   #how long to wait for replay buffer to fill during training (seconds)
@@ -0,0 +1,428 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module mirrors the graph algorithms of the digraph module for
+large directed graphs (e.g. posets with 10^5 nodes, far beyond the size of
+games the agent plays). Graphs are stored in compressed sparse row (CSR)
+form: the children of the node in position i are
+indices[indptr[i]:indptr[i+1]]. All algorithms are iterative and run in
+O(V+E) time, so there is no recursion limit to worry about.
+"""
+import numpy as np
+
+class CSRGraph(object):
+    ''' Class for an array-backed (CSR) directed graph. Nodes are stored
+    by position 0,...,n-1 and 'labels' maps each position to the nodes
+    label.
+    '''
+    def __init__(self, indptr, indices, labels=None):
+        '''
+        Parameters
+        ----------
+        indptr : numpy array
+            int array of length n+1. The children of the node in position i
+            are indices[indptr[i]:indptr[i+1]].
+        indices : numpy array
+            int array of length E (the number of edges) of node positions.
+        labels : numpy array, optional
+            node label keyed by position. The default is None, in which
+            case each node is labelled by its position.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        n = len(self.indptr) - 1
+        self.labels = np.arange(n) if labels is None else np.asarray(labels)
+        self._position = None
+        self._reverse = None
+
+    @classmethod
+    def from_dict(cls, G):
+        ''' Returns the CSRGraph of the directed graph 'G'.
+
+        Parameters
+        ----------
+        G : dict
+            adjacency representation of a directed graph. (Adjacency lists
+            keyed by node.)
+
+        Returns
+        -------
+        CSRGraph
+
+        '''
+        labels = list(G)
+        position = {v: i for i, v in enumerate(labels)}
+        indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(G[v]) for v in labels])
+        indices = np.fromiter(
+            (position[u] for v in labels for u in G[v]),
+            dtype=np.int64,
+            count=indptr[-1]
+            )
+        graph = cls(indptr, indices, labels)
+        graph._position = position
+        return graph
+
+    @classmethod
+    def from_edges(cls, num_nodes, tails, heads):
+        ''' Returns the CSRGraph on nodes 0,...,'num_nodes'-1 with an edge
+        from tails[k] to heads[k] for each k.
+
+        Parameters
+        ----------
+        num_nodes : int (nonnegative)
+            number of nodes.
+        tails : numpy array
+            int array of the starting node of each edge.
+        heads : numpy array
+            int array of the ending node of each edge.
+
+        Returns
+        -------
+        CSRGraph
+
+        '''
+        tails = np.asarray(tails, dtype=np.int64)
+        heads = np.asarray(heads, dtype=np.int64)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(tails, minlength=num_nodes))
+        # (a stable sort on integer keys is a radix sort in numpy.)
+        order = np.argsort(tails, kind='stable')
+        return cls(indptr, heads[order])
+
+    def to_dict(self):
+        ''' Returns the adjacency representation of the graph. (Adjacency
+        lists keyed by node.)
+
+        Returns
+        -------
+        dict
+            adjacency lists keyed by node (label).
+
+        '''
+        labels = self.labels.tolist()
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        return {labels[i]: [labels[j] for j in indices[indptr[i]:indptr[i+1]]]
+                for i in range(len(labels))}
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def number_of_edges(self):
+        ''' Returns the number of edges.
+        '''
+        return len(self.indices)
+
+    def position(self, v):
+        ''' Returns the position of the node labelled 'v'.
+        '''
+        if self._position is None:
+            self._position = {x: i for i, x in enumerate(self.labels.tolist())}
+        return self._position[v]
+
+    def out_degrees(self):
+        ''' Returns the number of outgoing edges keyed by position.
+        '''
+        return np.diff(self.indptr)
+
+    def in_degrees(self):
+        ''' Returns the number of incoming edges keyed by position.
+        '''
+        return np.bincount(self.indices, minlength=len(self))
+
+    def reverse(self):
+        ''' Returns the reverse of the graph. (Computed once and cached.)
+
+        Returns
+        -------
+        CSRGraph
+            the graph with all edges reversed, having the same labels.
+
+        '''
+        if self._reverse is None:
+            tails = np.repeat(np.arange(len(self)), self.out_degrees())
+            rev = CSRGraph.from_edges(len(self), self.indices, tails)
+            rev.labels = self.labels
+            rev._position = self._position
+            rev._reverse = self
+            self._reverse = rev
+        return self._reverse
+
+    def undirected(self):
+        ''' Returns the graph with both the edges of 'self' and their
+        reverses. (The undirected graph underlying 'self'.)
+        '''
+        tails = np.repeat(np.arange(len(self)), self.out_degrees())
+        und = CSRGraph.from_edges(
+            len(self),
+            np.concatenate([tails, self.indices]),
+            np.concatenate([self.indices, tails])
+            )
+        und.labels = self.labels
+        und._position = self._position
+        return und
+
+def _kahn_levels(G):
+    ''' Returns a topological ordering of the node positions of 'G' (as
+    found by Kahn's algorithm) and the level of each node: the length of the
+    longest path ending at the node. If 'G' has a cycle the ordering will be 
+    missing the nodes on or after a cycle.
+    '''
+    indptr = G.indptr.tolist()
+    indices = G.indices.tolist()
+    indegree = G.in_degrees().tolist()
+    level = [0]*len(G)
+    order = [v for v in range(len(G)) if indegree[v] == 0]
+    # 'order' doubles as the queue of nodes whose parents are all done.
+    for v in order:
+        next_level = level[v] + 1
+        for u in indices[indptr[v]:indptr[v+1]]:
+            if level[u] < next_level:
+                level[u] = next_level
+            indegree[u] -= 1
+            if indegree[u] == 0:
+                order.append(u)
+    return (np.array(order, dtype=np.int64), 
+            np.array(level, dtype=np.int64))
+
+def sinks(G):
+    ''' Returns all sink nodes in the directed graph 'G'.
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    Returns
+    -------
+    numpy array
+        labels of all sinks of 'G'.
+
+    '''
+    return G.labels[G.out_degrees() == 0]
+
+def sources(G):
+    ''' Returns all source nodes in the directed graph 'G'.
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    Returns
+    -------
+    numpy array
+        labels of all sources of 'G'.
+
+    '''
+    return G.labels[G.in_degrees() == 0]
+
+def descendants(G, source):
+    ''' Returns all nodes reachable from 'source' node in the directed
+    graph 'G'. (Breadth first search.)
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    source : int (nonnegative)
+        node (label) of 'G'.
+
+    Returns
+    -------
+    numpy array
+        labels of all nodes reachable from 'source' in 'G'.
+
+    '''
+    indptr = G.indptr.tolist()
+    indices = G.indices.tolist()
+    visited = [False]*len(G)
+    queue = [G.position(source)]
+    # 'queue' doubles as the list of reached nodes (source first).
+    for v in queue:
+        for u in indices[indptr[v]:indptr[v+1]]:
+            if not visited[u]:
+                visited[u] = True
+                queue.append(u)
+    return G.labels[np.array(queue[1:], dtype=np.int64)]
+
+def ancestors(G, source):
+    ''' Returns all nodes having a path to 'source' node in the directed
+    graph 'G'.
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    source : int (nonnegative)
+        node (label) of 'G'.
+
+    Returns
+    -------
+    numpy array
+        labels of all nodes having a path to 'source' in 'G'.
+
+    '''
+    return descendants(G.reverse(), source)
+
+def is_acyclic(G):
+    ''' Returns wether the directed graph G is acyclic.
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    Returns
+    -------
+    bool
+        True if 'G' is acyclic and False otherwise.
+
+    '''
+    order, _ = _kahn_levels(G)
+    return len(order) == len(G)
+
+def topological_sort(G, reverse=False):
+    ''' Returns a topological ordering of the nodes in the directed acyclic
+    graph 'G'. (It is assumed that 'G' is acyclic, we do not check.)
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    reverse : bool, optional
+        if True, the reverse of the topological ordering will be returned.
+        The default is False.
+
+    Returns
+    -------
+    numpy array
+        labels of the nodes of 'G' in topological order.
+
+    '''
+    order, _ = _kahn_levels(G)
+    if reverse:
+        order = order[::-1]
+    return G.labels[order]
+
+def longest_path_lengths(G, direction='outgoing'):
+    ''' Returns the length of the longest path outgoing (optionally,
+    incoming) each node in the directed acyclic graph 'G'. (It is assumed
+    that 'G' is acyclic, we do not check.)
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    direction : str, optional
+         If 'outgoing', the length of the longest path starting at each node
+         will be computed. If 'incoming', the length of the longest path
+         ending at each node will be computed.
+
+    Returns
+    -------
+    numpy array
+        lengths of the longest outgoing (optionally incoming) paths in 'G'
+        keyed by position.
+
+    '''
+    # the level of a node in Kahn's algorithm is the length of the longest
+    # path ending at it.
+    if direction == 'outgoing':
+        G = G.reverse()
+    _, level = _kahn_levels(G)
+    return level
+
+def connected_components(G):
+    ''' Returns the nodes in each component of the undirected graph
+    underlying the directed graph 'G'.
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    Returns
+    -------
+    list
+        numpy arrays of labels of nodes in each connected compnent of the
+        undirected graph underlying 'G'.
+    '''
+    if len(G) == 0:
+        return []
+    und = G.undirected()
+    indptr = und.indptr.tolist()
+    indices = und.indices.tolist()
+    n = len(G)
+    # component id keyed by position, found by an iterative dfs from
+    # each node not yet visited.
+    component = [-1]*n
+    num_components = 0
+    for v in range(n):
+        if component[v] != -1:
+            continue
+        component[v] = num_components
+        stack = [v]
+        while stack:
+            w = stack.pop()
+            for u in indices[indptr[w]:indptr[w+1]]:
+                if component[u] == -1:
+                    component[u] = num_components
+                    stack.append(u)
+        num_components += 1
+    component = np.array(component, dtype=np.int64)
+    order = np.argsort(component, kind='stable')
+    splits = np.cumsum(np.bincount(component, minlength=num_components))[:-1]
+    return [G.labels[c] for c in np.split(order, splits)]
+
+def hasse_layout(G):
+    ''' Returns the xy-coordinates of each node in a Hasse diagram plot layout
+    of the directed acyclic graph 'G', as arrays. (It is assumed that 'G' is 
+    acyclic, we do not check.) This is the layout of hasse_layout() in the 
+    digraph module, computed with a constant number of array passes after 
+    finding the levels (over a topological ordering) and components.
+
+    Parameters
+    ----------
+    G : CSRGraph
+
+    Returns
+    -------
+    x : numpy array
+        float array of x-coordinates keyed by position.
+    y : numpy array
+        int array of y-coordinates keyed by position: the level of each
+        node, i.e., the length of the longest path ending at the node.
+    '''
+    n = len(G)
+    if n == 0:
+        return np.zeros(0), np.zeros(0, dtype=np.int64)
+    _, level = _kahn_levels(G)
+    components = connected_components(G)
+    component = np.empty(n, dtype=np.int64)
+    for c, labels in enumerate(components):
+        component[[G.position(v) for v in labels.tolist()]] = c
+    num_components = len(components)
+    num_levels = level.max() + 1
+    # the number of nodes on each level of each component.
+    size = np.zeros((num_components, num_levels), dtype=np.int64)
+    np.add.at(size, (component, level), 1)
+    # the rank of each node within its level (by label) in its component.
+    order = np.lexsort((G.labels, level, component))
+    group = component[order]*num_levels + level[order]
+    group_start = np.searchsorted(group, group)
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n) - group_start
+    # each level is centered over the one below, so the left most node of
+    # a level is shifted from the bottom level by half the difference in
+    # size, and each component starts right of the widest level of the 
+    # ones before it.
+    widest = size.max(axis=1)
+    bottom = size[:, 0]
+    offset = np.concatenate(([0], np.cumsum(widest)[:-1]))
+    left = offset + (widest - bottom)/2 + 1
+    x = left[component] + (bottom[component] - size[component, level])/2 + rank
+    
+    return x, level
@@ -1,7 +1,6 @@
 """
 @author: Charles Petersen and Jamison Barsotti
 """
-import copy
 import collections 
 
 def relabel(G, relabel_map):
@@ -50,11 +49,9 @@ def subgraph(G, nodes):
 
     '''
     sub_graph = {}
+    node_set = set(nodes)
     for v in nodes:
-        sub_graph[v] = []
-        for u in G[v]:
-            if u in nodes:
-                sub_graph[v].append(u)              
+        sub_graph[v] = [u for u in G[v] if u in node_set]
     return sub_graph
 
 def reverse(G):
@@ -150,7 +147,8 @@ def sources(G):
         all sources of 'G'. (A node is a source if it has no incoming edges.)
         
     '''
-    return sinks(reverse(G))
+    has_parent = {u for v in G for u in G[v]}
+    return [v for v in G if v not in has_parent]
 
 def descendants(G, source):
     ''' Returns all nodes reachable from 'source' node in the directed 
@@ -176,19 +174,21 @@ def descendants(G, source):
         MIT Press, 2009. 
         
     '''
-    def dfs_visit(G,v):
-        visited[v] = 0
-        reachable_from_source.append(v)
-        for u in G[v]:
-            if visited[u] == -1:
-                dfs_visit(G,u)
-        visited[v] = 1
-        
+    # iterative dfs: the stack holds nodes in the order they are to be
+    # visited, so nodes are reported in the same (pre)order as a recursive 
+    # dfs would.
     reachable_from_source = []
-    visited = {v:-1 for v in G}
-    for v in G[source]:
-        if visited[v] == -1:
-            dfs_visit(G,v)
+    visited = set()
+    stack = list(reversed(G[source]))
+    while stack:
+        v = stack.pop()
+        if v in visited:
+            continue
+        visited.add(v)
+        reachable_from_source.append(v)
+        for u in reversed(G[v]):
+            if u not in visited:
+                stack.append(u)
             
     return reachable_from_source
    
@@ -233,24 +233,28 @@ def is_acyclic(G):
         MIT Press, 2009.
 
     '''
-    def dfs_visit(G,v):
-        visited[v] = 0
-        for u in G[v]:
-            # if we encounter a node again before we've finished exploring it's 
-            # adjacecny list there must be a cycle!
-            if visited[u] == 0:
-                return False
-            if visited[u] == -1:
-                if not dfs_visit(G,u):
-                    return False
-        visited[v] = 1
-        return True
-
+    # iterative dfs: each stack entry is a node together with an iterator
+    # over the part of its adjacency list not yet explored.
     visited = {v:-1 for v in G}
-    for v in G:
-        if visited[v] == -1:
-            if not dfs_visit(G,v):
-                return False
+    for root in G:
+        if visited[root] != -1:
+            continue
+        visited[root] = 0
+        stack = [(root, iter(G[root]))]
+        while stack:
+            v, adj_v = stack[-1]
+            for u in adj_v:
+                # if we encounter a node again before we've finished 
+                # exploring it's adjacecny list there must be a cycle!
+                if visited[u] == 0:
+                    return False
+                if visited[u] == -1:
+                    visited[u] = 0
+                    stack.append((u, iter(G[u])))
+                    break
+            else:
+                visited[v] = 1
+                stack.pop()
             
     return True
 
@@ -279,20 +283,27 @@ def topological_sort(G, reverse = False):
         MIT Press, 2009.
 
     '''
-    def dfs_visit(G,v):
-        visited[v] = 0
-        for u in G[v]:
-            if visited[u] == -1:
-                dfs_visit(G,u)  
-        # Done with v, add it to ordering.
-        visited[v] = 1
-        order.append(v)
-        
+    # iterative dfs: each stack entry is a node together with an iterator
+    # over the part of its adjacency list not yet explored.
     order = []
     visited = {v:-1 for v in G}
-    for v in G:
-        if visited[v] == -1:
-            dfs_visit(G,v)
+    for root in G:
+        if visited[root] != -1:
+            continue
+        visited[root] = 0
+        stack = [(root, iter(G[root]))]
+        while stack:
+            v, adj_v = stack[-1]
+            for u in adj_v:
+                if visited[u] == -1:
+                    visited[u] = 0
+                    stack.append((u, iter(G[u])))
+                    break
+            else:
+                # Done with v, add it to ordering.
+                visited[v] = 1
+                order.append(v)
+                stack.pop()
     # Since we were appending finished nodes to the list we need to reverse.
     if not reverse:
         order.reverse()
@@ -423,42 +434,163 @@ def connected_components(G):
         lists of nodes in each connected compnent of the undirected graph 
         underlying 'G'.
     '''
-    def dfs_visit(G,v):
-        visited[v] = 0
-        for u in undirected[v]:
-            if visited[u] == -1:
-                v_component.add(u)
-                dfs_visit(undirected,u)  
-        visited[v] = 1
-        
     components = []
-    # if no nodes return empty list
-    if len(G) == 0:
-        return components
-    # get undirected version of G.
-    undirected = copy.deepcopy(G)
-    rev = reverse(G)
-    for v in undirected:
-        undirected[v].extend(rev[v])
-    # to be updated as we discover each component.
-    nodes = set(G)
-    visited = {v:-1 for v in G}
-    v = nodes.pop()
-    # dfs to find all components of G
-    while True:
+    # get undirected version of G. (Adjacency lists keyed by node.)
+    undirected = {v: list(G[v]) for v in G}
+    for v in G:
+        for u in G[v]:
+            undirected[u].append(v)
+    # iterative dfs from each node not yet visited finds its component.
+    visited = set()
+    for v in G:
+        if v in visited:
+            continue
+        visited.add(v)
         v_component = {v}
-        dfs_visit(undirected,v)
+        stack = [v]
+        while stack:
+            w = stack.pop()
+            for u in undirected[w]:
+                if u not in visited:
+                    visited.add(u)
+                    v_component.add(u)
+                    stack.append(u)
         components.append(v_component)
-        nodes = nodes - v_component
-        if nodes:
-            v = nodes.pop()
-        else: 
-            break
         
     return components
 
 
-def hasse_layout(G):
+class DagIndex(object):
+    ''' Class for the derived structures of a directed acyclic graph: its 
+    reverse, a topological ordering, the levels of its nodes, its components, 
+    transitive closure and transitive reduction. Each is computed lazily the
+    first time it is needed and then memoized, so that all consumers of the
+    same graph share the work. (It is assumed that the graph is acyclic, we 
+    do not check, and that it is not mutated after the index is built.)
+    '''
+    def __init__(self, G):
+        '''
+        Parameters
+        ----------
+        G : dict
+            adjacency representation of a directed acyclic graph. (Adjacency 
+            lists keyed by node.)
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.graph = G
+        self._reverse = None
+        self._order = None
+        self._levels = None
+        self._heights = None
+        self._components = None
+        self._descendant_sets = None
+        self._closure = None
+        self._reduction = None
+        
+    @property
+    def reverse(self):
+        ''' dict: adjacency representation of the reverse graph. '''
+        if self._reverse is None:
+            self._reverse = reverse(self.graph)
+        return self._reverse
+    
+    @property
+    def order(self):
+        ''' list: a topological ordering of the nodes. '''
+        if self._order is None:
+            self._order = topological_sort(self.graph)
+        return self._order
+    
+    @property
+    def levels(self):
+        ''' dict: the length of the longest path ending at each node keyed 
+        by node. (The 'incoming' longest path lengths.)
+        '''
+        if self._levels is None:
+            rev = self.reverse
+            levels = {}
+            for v in self.order:
+                levels[v] = max((levels[u] + 1 for u in rev[v]), default=0)
+            self._levels = levels
+        return self._levels
+    
+    @property
+    def heights(self):
+        ''' dict: the length of the longest path starting at each node keyed 
+        by node. (The 'outgoing' longest path lengths.)
+        '''
+        if self._heights is None:
+            G = self.graph
+            heights = {}
+            for v in reversed(self.order):
+                heights[v] = max((heights[u] + 1 for u in G[v]), default=0)
+            self._heights = heights
+        return self._heights
+    
+    @property
+    def components(self):
+        ''' list: sets of nodes in each connected component of the 
+        undirected graph underlying the graph.
+        '''
+        if self._components is None:
+            self._components = connected_components(self.graph)
+        return self._components
+    
+    def _descendants(self):
+        # descendant sets of all nodes, in a single pass over the 
+        # reverse topological ordering.
+        if self._descendant_sets is None:
+            G = self.graph
+            des = {}
+            for v in reversed(self.order):
+                des_v = set(G[v])
+                for u in G[v]:
+                    des_v |= des[u]
+                des[v] = des_v
+            self._descendant_sets = des
+        return self._descendant_sets
+    
+    def descendants(self, source):
+        ''' Returns all nodes reachable from 'source' (a list). '''
+        return list(self._descendants()[source])
+    
+    def ancestors(self, source):
+        ''' Returns all nodes having a path to 'source' (a list). '''
+        return descendants(self.reverse, source)
+    
+    @property
+    def transitive_closure(self):
+        ''' dict: adjacency representation of the transitive closure. '''
+        if self._closure is None:
+            des = self._descendants()
+            self._closure = {v: list(des[v]) for v in self.graph}
+        return self._closure
+    
+    @property
+    def transitive_reduction(self):
+        ''' dict: adjacency representation of the transitive reduction. A 
+        child u of v is removed exactly when u is a descendant of another 
+        child of v.
+        '''
+        if self._reduction is None:
+            G = self.graph
+            des = self._descendants()
+            reduction = {}
+            for v in G:
+                adj_v = set(G[v])
+                for u in G[v]:
+                    if u in adj_v:
+                        adj_v -= des[u]
+                reduction[v] = list(adj_v)
+            self._reduction = reduction
+        return self._reduction
+
+
+def hasse_layout(G, index=None):
     ''' Returns the xy-coordinates of each node in a Hasse diagram plot layout
     of the directed acyclic graph 'G'. In particular, all arrows (edges) 
     should be pointing up. (It is assumed that 'G' is acyclic, we do not check.)
@@ -468,6 +600,9 @@ def hasse_layout(G):
     G : dict
         adjacency representation of a directed acyclic** graph. (Adjacency lists 
         keyed by node.)
+    index : DagIndex, optional
+        the index of 'G', if one is already at hand. The default is None, in
+        which case a new one is built.
 
     Returns
     -------
@@ -481,26 +616,29 @@ def hasse_layout(G):
             is evenly spaced horizontally with previous level.
     
     NOTE: At times this layout can return an unwanted overlap between edges 
-    and nodes. However, it works pretty well most of the time.
+    and nodes. However, it works pretty well most of the time. For large
+    graphs, hasse_layout() in the csrDigraph module computes the same layout
+    as coordinate arrays.
     
     Reference: 
         - https://en.wikipedia.org/wiki/Hasse_diagram
     '''
     # hasse diagram coordinates of nodes: coordinate keyed by node
     hasse_pos = {}
-    components = connected_components(G)
+    if index is None:
+        index = DagIndex(G)
+    components = index.components
+    # the level of a node in its component is its level in 'G'.
+    levels = index.levels
     # loop over components setting coordinates for each component. At each 
     # iteration keep track of the largest x coordinate for use in spacing the
     # next component.
     prev_comp_max_x = 0
     for nodes_list in components:
-        comp = subgraph(G,nodes_list)
-        # level of each node in current component: level keyed by node
-        levels_dict = longest_path_lengths(comp, direction = 'incoming')
         # level set decomp of current component: node lists keyed by level
         level_sets = collections.defaultdict(list)
-        for key, val in sorted(levels_dict.items()):
-            level_sets[val].append(key)
+        for node in sorted(nodes_list):
+            level_sets[levels[node]].append(node)
         # loop over all levels in current component, starting from bottom and 
         # moving up level by level. Initialize coordinates 
         # for all nodes in the current level. At each iteration we keep track
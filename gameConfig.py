@@ -0,0 +1,14 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: The game state parameters of config.py, kept apart (and free of 
+torch) for the tools which only generate or store games. (See the 
+gameCorpus module.)
+"""
+
+#GAME STATE PARAMETERS
+MAX_NODES = 10    #max number of nodes ina game playable by the agent
+ENCODED_STATE_SHAPE = (4, MAX_NODES, MAX_NODES)    #shape of encoded game states
+UP = 0    #token for Up player
+DOWN = 1    #token for Down player
+RGB_DIST = (0.25, 0.75)    #distribution of game node colorings in self-play/eval : (RGB, all green)
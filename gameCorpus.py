@@ -0,0 +1,310 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module builds and reads corpora of pre-generated random games of
+upset-downset, so that training and evaluation need not rerun the markov
+chain of the randomDag module at every start, and draw the same games from
+one run to the next.
+
+A corpus is split into shards, each a single file written by its own
+process from its own seed. (So shards are written in parallel and a corpus
+is reproducible from its seed.) A shard holds a small header followed by its
+games as fixed size records: the transitive reduction of the dag as bit-rows
+(bit j of row i is set if and only if there is an edge i --> j), the colors
+of the nodes and the player to move. The records are memory-mapped when
+read, so slicing a corpus returns views of the files (no copies), and the
+game at any index is a single record read.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob, escape
+from randomDag import uniform_random_dags
+from gameConfig import MAX_NODES, RGB_DIST, UP, DOWN
+import os
+import re
+import batchDigraph
+import numpy as np
+
+# the first entry of the header of a corpus shard.
+MAGIC = int.from_bytes(b'UDCORPS1', 'little')
+HEADER_SIZE = 8
+# the number of markov chains run together in generating a shard.
+CHAINS_PER_BATCH = 256
+
+def record_dtype(num_nodes):
+    ''' Returns the numpy dtype of the records of games on 'num_nodes' nodes.
+    (The bit-rows are the smallest unsigned ints holding 'num_nodes' bits.)
+
+    Parameters
+    ----------
+    num_nodes : int (positive)
+        the number of nodes. (At most 64.)
+
+    Returns
+    -------
+    numpy dtype
+        fields 'rows', 'colors' and 'player'.
+
+    '''
+    assert 0 < num_nodes <= 64, 'The games must have from 1 to 64 nodes.'
+    row_type = next(t for t in (np.uint8, np.uint16, np.uint32, np.uint64)
+                    if num_nodes <= 8 * np.dtype(t).itemsize)
+    return np.dtype([('rows', row_type, (num_nodes,)),
+                     ('colors', np.int8, (num_nodes,)),
+                     ('player', np.uint8)])
+
+def shard_path(path, shard, num_shards):
+    ''' Returns the file of the shard 'shard' of the corpus 'path'.
+    '''
+    return f'{path}-{shard:05d}-of-{num_shards:05d}'
+
+def build_shard(path,
+                num_games,
+                shard=0,
+                num_shards=1,
+                seed=0,
+                num_nodes=MAX_NODES,
+                markov_exp=2,
+                color_dist=RGB_DIST):
+    ''' Generates 'num_games' random games of upset-downset (see
+    randomDag.uniform_random_dags()) and writes them to the shard 'shard' of
+    the corpus 'path'. The games are drawn from the numpy random generator
+    seeded by ('seed', 'shard').
+
+    Parameters
+    ----------
+    path : str
+        the corpus. (The shard is written to shard_path().)
+    num_games : int (nonnegative)
+        the number of games in the shard.
+    shard : int (nonnegative), optional
+        the index of the shard. The default is 0.
+    num_shards : int (positive), optional
+        the number of shards in the corpus. The default is 1.
+    seed : int (nonnegative), optional
+        the seed of the corpus. The default is 0.
+    num_nodes : int (at least 2), optional
+        the number of nodes in each game. The default is MAX_NODES.
+    markov_exp : float, optional
+        The exponent determining the number of steps taken in the markov
+        chains. The default is 2.
+    color_dist : tuple, optional
+        the distribution of node colorings of the games: the proportion of
+        red-green-blue games and of all green games. The default is RGB_DIST.
+
+    Returns
+    -------
+    str
+        the file written.
+
+    '''
+    assert 0 <= shard < num_shards, 'There is no such shard.'
+    np.random.seed([seed, shard])
+    records = np.zeros(num_games, dtype=record_dtype(num_nodes))
+    weights = np.left_shift(1, np.arange(num_nodes, dtype=np.uint64))
+    for start in range(0, num_games, CHAINS_PER_BATCH):
+        stop = min(start + CHAINS_PER_BATCH, num_games)
+        dags = uniform_random_dags(num_nodes, stop - start, exp=markov_exp)
+        A = batchDigraph.to_adjacency_batch(dags, num_nodes)
+        reduced = batchDigraph.transitive_reduction(A)
+        batch = records[start:stop]
+        batch['rows'] = (reduced * weights).sum(axis=-1, dtype=np.uint64)
+        # all green games, or random colors for a proportion color_dist[0]
+        # of the games.
+        RGB = np.random.random(stop - start) < color_dist[0]
+        colors = np.random.randint(-1, 2, size=(stop - start, num_nodes))
+        colors[~RGB] = 0
+        batch['colors'] = colors
+        batch['player'] = np.random.choice([UP, DOWN], size=stop - start)
+    header = np.array([MAGIC, num_nodes, num_games, shard, num_shards, seed,
+                       records.dtype.itemsize, 0], dtype=np.uint64)
+    shard_file = shard_path(path, shard, num_shards)
+    with open(shard_file, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(records.tobytes())
+
+    return shard_file
+
+def _build_shard(args):
+    return build_shard(*args)
+
+def build_corpus(path,
+                 num_games,
+                 num_shards=1,
+                 seed=0,
+                 num_nodes=MAX_NODES,
+                 markov_exp=2,
+                 color_dist=RGB_DIST,
+                 workers=None):
+    ''' Generates a corpus of 'num_games' random games of upset-downset in
+    'num_shards' shards (of as equal sizes as possible), written in parallel
+    across a process pool. (See build_shard().)
+
+    Parameters
+    ----------
+    path : str
+        the corpus.
+    num_games : int (nonnegative)
+        the number of games in the corpus.
+    num_shards : int (positive), optional
+        the number of shards. The default is 1.
+    seed : int (nonnegative), optional
+        the seed of the corpus. The default is 0.
+    num_nodes : int (at least 2), optional
+        the number of nodes in each game. The default is MAX_NODES.
+    markov_exp : float, optional
+        The exponent determining the number of steps taken in the markov
+        chains. The default is 2.
+    color_dist : tuple, optional
+        the distribution of node colorings of the games. The default is
+        RGB_DIST.
+    workers : int (positive), optional
+        the number of worker processes. The default is None, in which case
+        the shards are written in this process.
+
+    Returns
+    -------
+    GameCorpus
+        the corpus read from 'path'.
+
+    '''
+    tasks = [(path, num_games // num_shards + (shard < num_games % num_shards),
+              shard, num_shards, seed, num_nodes, markov_exp, color_dist)
+             for shard in range(num_shards)]
+    if workers is None or workers == 1:
+        for task in tasks:
+            _build_shard(task)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(_build_shard, tasks))
+
+    return GameCorpus(path)
+
+class GameCorpus(object):
+    ''' Class for reading a corpus written by build_corpus(), or the shards
+    written by build_shard(). (The shards are memory-mapped.) Indexing and
+    slicing a corpus returns records (see record_dtype()).
+    '''
+    def __init__(self, path):
+        '''
+        Parameters
+        ----------
+        path : str
+            a corpus. (All of its shards are to be present.)
+
+        Returns
+        -------
+        None.
+
+        '''
+        # the first shard (exactly path-00000-of-NNNNN) gives the number of 
+        # shards, and the others are opened by name.
+        first = [f for f in glob(escape(path) + '-00000-of-*') 
+                 if re.fullmatch(re.escape(path) + r'-00000-of-\d{5}', f)]
+        assert first, f'{path} has no shards.'
+        assert len(first) == 1, \
+            f'{path} has shards of corpora with different numbers of shards.'
+        num_shards = int(first[0][-5:])
+        self.path = path
+        self.shards = []
+        for shard in range(num_shards):
+            shard_file = shard_path(path, shard, num_shards)
+            assert os.path.exists(shard_file), \
+                f'The shards of {path} are incomplete.'
+            header = np.fromfile(shard_file, dtype=np.uint64,
+                                 count=HEADER_SIZE)
+            assert len(header) == HEADER_SIZE and header[0] == MAGIC, \
+                f'{shard_file} is not a corpus shard.'
+            assert header[3] == shard and header[4] == num_shards, \
+                f'{shard_file} is misnamed.'
+            if shard == 0:
+                self.num_nodes = int(header[1])
+                self.seed = int(header[5])
+                self.dtype = record_dtype(self.num_nodes)
+            assert int(header[1]) == self.num_nodes and \
+                int(header[6]) == self.dtype.itemsize, \
+                f'The shards of {path} do not match.'
+            num_games = int(header[2])
+            # (np.memmap cannot map an empty file region.)
+            self.shards.append(
+                np.memmap(shard_file, dtype=self.dtype, mode='r',
+                          offset=8 * HEADER_SIZE, shape=(num_games,))
+                if num_games else np.zeros(0, dtype=self.dtype)
+                )
+        # the index of the first game of each shard, and of the last + 1.
+        self.starts = np.cumsum([0] + [len(s) for s in self.shards])
+
+    def __len__(self):
+        return int(self.starts[-1])
+
+    def __getitem__(self, index):
+        ''' Returns the record of the game at 'index', or the records of a
+        slice of games. (A slice within a single shard is a view of the
+        shard, otherwise the records are copied.)
+        '''
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            assert step == 1, 'Only contiguous slices are supported.'
+            return self.records(start, stop)
+        if index < 0:
+            index += len(self)
+        assert 0 <= index < len(self), 'Index out of range.'
+        shard = int(np.searchsorted(self.starts, index, side='right')) - 1
+        return self.shards[shard][index - self.starts[shard]]
+
+    def records(self, start, stop):
+        ''' Returns the records of the games from 'start' to 'stop'.
+
+        Parameters
+        ----------
+        start : int (nonnegative)
+            the index of the first game.
+        stop : int (nonnegative)
+            the index after the last game.
+
+        Returns
+        -------
+        numpy array
+            records. (A view of the shard if all lie in a single shard.)
+
+        '''
+        parts = []
+        for shard, records in enumerate(self.shards):
+            offset = int(self.starts[shard])
+            lo, hi = max(start - offset, 0), min(stop - offset, len(records))
+            if lo < hi:
+                parts.append(records[lo:hi])
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else \
+            np.zeros(0, dtype=self.dtype)
+
+    def chunks(self, start=0, chunk_size=CHAINS_PER_BATCH):
+        ''' Returns a generator of the records of the corpus in order from
+        'start', in views of at most 'chunk_size' records of a single shard.
+        '''
+        for shard, records in enumerate(self.shards):
+            offset = int(self.starts[shard])
+            for lo in range(max(start - offset, 0), len(records), chunk_size):
+                yield records[lo:lo + chunk_size]
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Pre-generate a sharded corpus of random games.'
+        )
+    parser.add_argument('path', help='the corpus (shards are path-*-of-*)')
+    parser.add_argument('num_games', type=int)
+    parser.add_argument('--shards', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--nodes', type=int, default=MAX_NODES)
+    parser.add_argument('--markov-exp', type=float, default=2)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    corpus = build_corpus(args.path, 
+                          args.num_games, 
+                          num_shards=args.shards, 
+                          seed=args.seed, 
+                          num_nodes=args.nodes, 
+                          markov_exp=args.markov_exp, 
+                          workers=args.workers)
+    print(f'wrote {len(corpus)} games in {len(corpus.shards)} shards.')
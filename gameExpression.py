@@ -0,0 +1,331 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module provides lazy expressions of games of upset-downset built
+with the operators of the UpDown class: sums (G + H and G - H), negatives
+(of expressions) and ordinal sums (G / H). An expression keeps its operands
+and is only materialized into a single (flat) UpDown when something other
+than its value or outcome is asked for: any other attribute or method of
+UpDown is looked up on the materialized game, built once in a single pass
+over the operands, however deeply the expression is nested.
+
+Values and outcomes use the structure of an expression: the value of a sum
+is the sum of the values of its terms (each solved on its own, see the
+gameValue module), and the value of a negative is the negative of the value.
+Outcomes only go through values if the values of all terms are known
+without search (see UpDown.known_value()): canonical forms are far slower to
+compute than outcomes, so an expression is otherwise materialized and
+solved as a flat game.
+
+The ordinal sum of upset-downset is not the ordinal sum of combinatorial game
+theory (every node of G is above every node of H in G / H, so Up playing in
+H removes all of G but Down playing in H does not), so an ordinal sum is
+solved as a flat game.
+"""
+from abc import ABC, abstractmethod
+from bitDag import bits
+import gameValue
+import upDown
+
+class GameExpression(ABC):
+    ''' Abstract class for lazy expressions of games of upset-downset. 
+    (Subclasses implement _build() and __len__().)
+    '''
+    def __init__(self):
+        self._game = None
+        self._value = None
+
+    def materialize(self):
+        ''' Returns the (flat) game of upset-downset of the expression.
+        (Built once.)
+
+        Returns
+        -------
+        UpDown
+
+        '''
+        if self._game is None:
+            self._game = self._build()
+        return self._game
+
+    @abstractmethod
+    def _build(self):
+        # the (flat) game of upset-downset of the expression.
+        pass
+
+    def __getattr__(self, name):
+        # everything but the value and outcome is asked of the flat game.
+        if name.startswith('__') or name in ('_game', '_value'):
+            raise AttributeError(name)
+        return getattr(self.materialize(), name)
+
+    def value(self):
+        ''' Returns the value of the game in canonical form. (See the
+        gameValue module.)
+
+        Returns
+        -------
+        Value
+
+        '''
+        if self._value is None:
+            self._value = self._compute_value()
+        return self._value
+
+    def _compute_value(self):
+        return self.materialize().value()
+
+    def known_value(self):
+        ''' Returns the value of the game if it is known without search, 
+        and None otherwise. (See UpDown.known_value().)
+        '''
+        return self._value
+
+    def outcome(self, workers=None):
+        ''' Returns the outcome of the game. (See UpDown.outcome().)
+
+        Parameters
+        ----------
+        workers : int, optional
+            passed on to UpDown.outcome(). The default is None.
+
+        Returns
+        -------
+        str
+            'Next', 'Previous', 'Up' or 'Down'.
+
+        '''
+        value = self.known_value()
+        if value is not None:
+            return value.outcome()
+        return self.materialize().outcome(workers)
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    def __neg__(self):
+        return Neg(self)
+
+    def __add__(self, other):
+        return Sum(self, other)
+
+    def __sub__(self, other):
+        return Sum(self, -other)
+
+    def __truediv__(self, other):
+        return Ordinal(self, other)
+
+    def __eq__(self, other):
+        return self.value() is other.value()
+
+    def __or__(self, other):
+        G, H = self.value(), other.value()
+        return not G <= H and not H <= G
+
+    def __gt__(self, other):
+        return self.value() > other.value()
+
+    def __lt__(self, other):
+        return self.value() < other.value()
+
+class Sum(GameExpression):
+    ''' Class for the lazy (disjunctive) sum of two games.
+    '''
+    def __init__(self, left, right):
+        '''
+        Parameters
+        ----------
+        left : UpDown or GameExpression
+            a game of upset-downset.
+        right : UpDown or GameExpression
+            a game of upset-downset.
+
+        Returns
+        -------
+        None.
+
+        '''
+        super().__init__()
+        self.left = left
+        self.right = right
+
+    def terms(self):
+        ''' Returns the games summed, from left to right, with nested sums
+        flattened.
+
+        Returns
+        -------
+        list
+            UpDown games and (non-sum) GameExpressions.
+
+        '''
+        terms = []
+        stack = [self]
+        while stack:
+            G = stack.pop()
+            if isinstance(G, Sum):
+                stack.append(G.right)
+                stack.append(G.left)
+            else:
+                terms.append(G)
+        return terms
+
+    def __len__(self):
+        return sum(len(G) for G in self.terms())
+
+    def _compute_value(self):
+        value = gameValue.ZERO
+        for G in self.terms():
+            value = gameValue.add(value, G.value())
+        return value
+
+    def known_value(self):
+        if self._value is None:
+            values = []
+            for G in self.terms():
+                value = G.known_value()
+                if value is None:
+                    return None
+                values.append(value)
+            self._value = gameValue.ZERO
+            for value in values:
+                self._value = gameValue.add(self._value, value)
+        return self._value
+
+    def _build(self):
+        # the nodes of each term are relabelled consecutively after those
+        # of the terms before it, and its layout shifted to their right.
+        games = [G.materialize() if isinstance(G, GameExpression) else G
+                 for G in self.terms()]
+        sum_dag = {}
+        sum_coloring = {}
+        offsets = []
+        n = 0
+        for G in games:
+            offsets.append(n)
+            for x, children in G.dag.items():
+                sum_dag[x + n] = [y + n for y in children]
+                sum_coloring[x + n] = G.coloring[x]
+            n += len(G)
+        # instantiate the game, its layout is computed when first needed.
+        sum_game = upDown.UpDown(sum_dag, sum_coloring, reduced=True)
+        def sum_layout():
+            layout = {}
+            largest_x = 0
+            for G, offset in zip(games, offsets):
+                shifted = {x + offset: (p[0] + largest_x, p[1])
+                           for x, p in G.layout.items()}
+                layout.update(shifted)
+                largest_x = max([largest_x] + 
+                                [p[0] for p in shifted.values()])
+            return layout
+        sum_game._layout_source = sum_layout
+
+        return sum_game
+
+class Neg(GameExpression):
+    ''' Class for the lazy negative of a game expression. (The negative of
+    an UpDown is itself a view, see UpDown.__neg__().)
+    '''
+    def __init__(self, game):
+        '''
+        Parameters
+        ----------
+        game : GameExpression
+            a game of upset-downset.
+
+        Returns
+        -------
+        None.
+
+        '''
+        super().__init__()
+        self.game = game
+
+    def __neg__(self):
+        return self.game
+
+    def __len__(self):
+        return len(self.game)
+
+    def _compute_value(self):
+        return gameValue.neg(self.game.value())
+
+    def known_value(self):
+        if self._value is None:
+            value = self.game.known_value()
+            if value is not None:
+                self._value = gameValue.neg(value)
+        return self._value
+
+    def outcome(self, workers=None):
+        # Up and Down swap roles in the negative.
+        outcome = self.game.outcome(workers)
+        return {'Up': 'Down', 'Down': 'Up'}.get(outcome, outcome)
+
+    def _build(self):
+        return -self.game.materialize()
+
+class Ordinal(GameExpression):
+    ''' Class for the lazy ordinal sum G / H of two games: every node of G
+    is placed above every node of H. (Solved as a flat game, see the module
+    NOTE.)
+    '''
+    def __init__(self, top, bottom):
+        '''
+        Parameters
+        ----------
+        top : UpDown or GameExpression
+            a game of upset-downset, G.
+        bottom : UpDown or GameExpression
+            a game of upset-downset, H.
+
+        Returns
+        -------
+        None.
+
+        '''
+        super().__init__()
+        self.top = top
+        self.bottom = bottom
+
+    def __len__(self):
+        return len(self.top) + len(self.bottom)
+
+    def known_value(self):
+        # (an ordinal sum is only valued as a flat game.)
+        if self._value is None:
+            self._value = self.materialize().known_value()
+        return self._value
+
+    def outcome(self, workers=None):
+        return self.materialize().outcome(workers)
+
+    def _build(self):
+        # 'top' is relabelled after the nodes of 'bottom', and an edge is
+        # added from each sink of 'bottom' to every source of 'top'.
+        top = self.top.materialize() \
+            if isinstance(self.top, GameExpression) else self.top
+        bottom = self.bottom.materialize() \
+            if isinstance(self.bottom, GameExpression) else self.bottom
+        n = len(bottom)
+        ordinal_dag = {x: list(children) for x, children in bottom.dag.items()}
+        ordinal_coloring = dict(bottom.coloring)
+        for x, children in top.dag.items():
+            ordinal_dag[x + n] = [y + n for y in children]
+            ordinal_coloring[x + n] = top.coloring[x]
+        top_sources = [x + n for x in bits(top.bitdag.sources())]
+        for x in bits(bottom.bitdag.sinks()):
+            ordinal_dag[x].extend(top_sources)
+        # instantiate the game, its layout is computed when first needed.
+        ordinal = upDown.UpDown(ordinal_dag, ordinal_coloring, reduced=True)
+        def ordinal_layout():
+            largest_y = max(p[0] for p in bottom.layout.values())
+            layout = dict(bottom.layout)
+            layout.update({x + n: (p[0], p[1] + largest_y + 1)
+                           for x, p in top.layout.items()})
+            return layout
+        ordinal._layout_source = ordinal_layout
+
+        return ordinal
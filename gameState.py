@@ -2,8 +2,12 @@
 @author: Charles Petersen and Jamison Barsotti
 """
 from config import *
-import digraph
-from randomDag import uniform_random_dag
+from bitDag import bits
+from canonicalForm import canonical_form, certificate_key
+import tablebase
+import batchDigraph
+from gameCorpus import GameCorpus
+from randomDag import uniform_random_dag, MarkovChains
 from upDown import UpDown
 import numpy as np
 
@@ -31,13 +35,40 @@ class GameState(object):
         self.game = game 
         self.current_player = current_player
         self._encoded_state = None
+        self._key = None
+        self._canonical_order = None
         
     @property
     def encoded_state(self):
         if self._encoded_state is None:
             self._encoded_state = self.encode()
         return self._encoded_state
-        
+    
+    @property
+    def key(self):
+        # the canonical key of the game from the current players 
+        # perspective (as in encode()) together with the current player, so 
+        # relabelled copies of a state share the same key.
+        if self._key is None:
+            self._canonicalize()
+        return self._key
+
+    @property
+    def canonical_order(self):
+        # the nodes of the game in canonical order under key: relabelled 
+        # copies of a state have their nodes in the same positions.
+        if self._canonical_order is None:
+            self._canonicalize()
+        return self._canonical_order
+
+    def _canonicalize(self):
+        in_perspective = self.game if self.current_player == UP \
+            else -self.game
+        certificate, self._canonical_order = canonical_form(
+            in_perspective.bitdag, 
+            in_perspective.coloring
+            )
+        self._key = certificate_key(certificate, extra=self.current_player)
         
     def valid_actions(self):
         '''Returns the valid actions.
@@ -88,6 +119,25 @@ class GameState(object):
     '''
         return not len(self.valid_actions())
     
+    def known_value(self):
+        ''' Returns the exact value of the GameState from the current 
+        players perspective, if the game is small enough to be in the 
+        tablebase set by tablebase.use(). (See the tablebase module.)
+        
+        Returns
+        -------
+        int or None
+            1 if the current player wins (moving first), -1 if they lose, 
+            and None if there is no tablebase or the game is not in it.
+        '''
+        table = tablebase.active()
+        if table is None:
+            return None
+        wins = table.wins_first(self.game, self.current_player)
+        if wins is None:
+            return None
+        return 1 if wins else -1
+    
     def plot(self):
         ''' Plots the underlying upset-downset game from the perepsctive of 
         the current player.
@@ -136,24 +186,27 @@ class GameState(object):
         # current player
         encoded_state = np.zeros(ENCODED_STATE_SHAPE, dtype=np.int8)
         encoded_state[3,:,:] = self.current_player       
-        # get the underlying dag, its transitive closure and node coloring.
-        # make sure viewing board from correct persepective
-        game_state = -self.game if self.current_player == DOWN \
-            else self.game
-        dag = game_state.dag
-        tc = digraph.transitive_closure(dag)    
-        color_dict = game_state.coloring
+        # get the underlying dag (its descendant masks are its transitive 
+        # closure) and node coloring. make sure viewing board from correct 
+        # persepective: the negative has the ancestors as descendants and 
+        # the opposite colors, so it is read off without being built.
+        bitdag = self.game.bitdag
+        color_dict = self.game.coloring
+        if self.current_player == DOWN:
+            reachable, sign = bitdag.ancestors, -1
+        else:
+            reachable, sign = bitdag.descendants, 1
         # encode the game
-        for node in tc:
+        for node in bitdag:
           # set the [node,node] entry in the diagonal of the proper 
           # channel according to the color of node.
-          color = color_dict[node]
+          color = sign*color_dict[node]
           encoded_state[1 - color, node, node] = 1 
-          # now for each adjacent node set the off diagonal entry 
-          # in the proper channel (adjacent node color), row (node) and 
-          # column (adjacent_node)
-          for adjacent_node in tc[node]:
-            color = color_dict[adjacent_node]
+          # now for each descendant node set the off diagonal entry 
+          # in the proper channel (descendant node color), row (node) and 
+          # column (descendant node)
+          for adjacent_node in bits(reachable(node)):
+            color = sign*color_dict[adjacent_node]
             encoded_state[1 - color, node, adjacent_node] = 1
             
         return encoded_state       
@@ -192,6 +245,100 @@ class GameState(object):
         
         return GameState(game, current_player)
     
+    @staticmethod
+    def encode_batch(states):
+        '''Returns the encoded representations of all GameStates in 'states'
+        at once. (See the encode() method.) The transitive closures of all 
+        underlying dags are unpacked from their descendant masks together 
+        in a single vectorized pass and each GameState caches its encoded 
+        representation.
+        
+        Parameters
+        ----------
+        states : list
+            GameStates.
+        
+        Returns
+        -------
+        encoded_states : 4D-numpy array
+            the encoded representation of the b-th GameState in 'states' 
+            is encoded_states[b].
+        '''
+        num_states = len(states)
+        nodes = range(MAX_NODES)
+        closure_rows = np.zeros((num_states, MAX_NODES), dtype=np.int64)
+        present_rows = np.zeros(num_states, dtype=np.int64)
+        colors = np.zeros((num_states, MAX_NODES), dtype=np.int8)
+        players = np.array([state.current_player for state in states])
+        # collect the closure (the descendant masks) and colors of all 
+        # (absolute) games as rows of bitmasks.
+        for b, state in enumerate(states):
+            game = state.game
+            assert len(game) <= MAX_NODES, 'The game is too large.'
+            descendants = game.bitdag.descendant_masks
+            closure_rows[b] = [descendants.get(v, 0) for v in nodes]
+            colors[b] = [game.coloring.get(v, 0) for v in nodes]
+            present_rows[b] = game.bitdag.nodes
+        closure = batchDigraph.unpack_rows(closure_rows, MAX_NODES)
+        present = batchDigraph.unpack_rows(present_rows, MAX_NODES)
+        # view the games where Down is to move from Downs perspective: 
+        # the negative has the reversed dag and opposite colors.
+        down = players == DOWN
+        closure[down] = np.swapaxes(closure[down], -1, -2)
+        colors[down] = -colors[down]
+        # each node is present in the diagonal entry of its channel
+        diagonal = np.arange(MAX_NODES)
+        closure[:, diagonal, diagonal] |= present
+        # entry (k, i, j) is set if j has color 1-k and i is an 
+        # ancestor of j.
+        encoded_states = np.zeros(
+            (num_states,) + ENCODED_STATE_SHAPE, 
+            dtype=np.int8
+            )
+        for k in range(3):
+            encoded_states[:, k] = closure & (colors == 1 - k)[:, None, :]
+        encoded_states[:, 3] = players[:, None, None]
+        for b, state in enumerate(states):
+            state._encoded_state = encoded_states[b]
+            
+        return encoded_states
+    
+    @staticmethod
+    def from_adjacency_batch(adjacency, colors, current_players):
+        '''Returns GameStates built in bulk from a batch of directed acyclic 
+        graphs. All graphs are checked for cycles and transitively reduced 
+        together in a few vectorized passes.
+        
+        Parameters
+        ----------
+        adjacency : numpy array
+            boolean array of shape (B, n, n): adjacency[b, i, j] is True if 
+            and only if there is an edge i --> j in the b-th dag.
+        colors : numpy array
+            int array of shape (B, n): colors[b, i] is the color of node i 
+            in the b-th game. (1 (resp. 0,-1) for blue (resp. green, red).)
+        current_players : numpy array
+            int array of shape (B,) of the player to move in each game. 
+            (See UP and DOWN in config.py)
+        
+        Returns
+        -------
+        list
+            the B GameStates.
+        '''
+        closure = batchDigraph.transitive_closure(adjacency)
+        assert batchDigraph.is_acyclic(adjacency, closure).all(), \
+            'Check the dags. There is a cycle.'
+        reduced = batchDigraph.transitive_reduction(adjacency, closure)
+        states = []
+        for A, coloring, player in zip(reduced, colors, current_players):
+            dag = batchDigraph.from_adjacency(A)
+            coloring = {i: int(c) for i, c in enumerate(coloring)}
+            game = UpDown(dag, coloring, reduced=True)
+            states.append(GameState(game, int(player)))
+        
+        return states
+    
     @staticmethod
     def state_generator(markov_exp, color_dist=RGB_DIST):
         ''' Returns a generator of GameStates. Proceeds along the Markov chain 
@@ -240,3 +387,105 @@ class GameState(object):
             start_markov = random_dag
             
             yield random_state
+            
+    @staticmethod
+    def batch_state_generator(markov_exp, 
+                              num_chains=GENERATOR_CHAINS,
+                              color_dist=RGB_DIST):
+        ''' Returns a generator of batches of GameStates. As 
+        state_generator(), but 'num_chains' ongoing Markov chains (starting 
+        from the empty dag) are advanced together, vectorized, and the 
+        games of a batch are built in bulk. (See randomDag.MarkovChains and 
+        from_adjacency_batch().)
+
+        Parameters
+        ----------
+        markov_exp : float, optional
+            The exponent determining the number of steps taken in 
+            the markov chains between batches. 
+        num_chains : int (positive), optional
+            the number of chains, and of GameStates in a batch. The default 
+            is GENERATOR_CHAINS.
+        color_dist : tuple, optional
+            the distribution of node colorings for the generated games. 
+            (See state_generator().) The default is RGB_DIST.
+
+        Yields
+        ------
+        list
+            'num_chains' GameStates, each with MAX_NODES number of nodes, 
+            and the current player chosen uniformly randomly.
+        '''
+        chains = MarkovChains(MAX_NODES, num_chains)
+        num_steps = int(pow(MAX_NODES, markov_exp))
+        while True:
+            chains.run(num_steps)
+            players = np.random.choice([UP, DOWN], size=num_chains)
+            # all green games, or random colors for a proportion 
+            # color_dist[0] of the games.
+            RGB = np.random.random(num_chains) < color_dist[0]
+            colors = np.random.randint(-1, 2, size=(num_chains, MAX_NODES))
+            colors[~RGB] = 0
+            
+            yield GameState.from_adjacency_batch(chains.A, colors, players)
+            
+    @staticmethod
+    def from_record(record):
+        ''' Returns the GameState of a record of a game corpus. (See the 
+        gameCorpus module.)
+
+        Parameters
+        ----------
+        record : numpy record
+            a record of a GameCorpus: the bit-rows of the transitive 
+            reduction of the dag, the colors and the player to move.
+
+        Returns
+        -------
+        GameState
+
+        '''
+        rows, colors = record['rows'].tolist(), record['colors'].tolist()
+        dag = {i: bits(row) for i, row in enumerate(rows)}
+        coloring = dict(enumerate(colors))
+        game = UpDown(dag, coloring, reduced=True)
+        
+        return GameState(game, int(record['player']))
+    
+    @staticmethod
+    def corpus_generator(path, start=0, shuffle=False, loop=True):
+        ''' Returns a generator of the GameStates of the pre-generated 
+        corpus 'path', streamed from its memory-mapped shards. (See the 
+        gameCorpus module.)
+
+        Parameters
+        ----------
+        path : str
+            a corpus written by gameCorpus.build_corpus().
+        start : int (nonnegative), optional
+            the index of the first game. The default is 0.
+        shuffle : bool, optional
+            True if the games should be drawn in a (numpy) random order 
+            and False if in order. The default is False.
+        loop : bool, optional
+            True if the corpus should be started over once it is 
+            exhausted. The default is True.
+
+        Yields
+        ------
+        GameState
+            
+        '''
+        corpus = GameCorpus(path)
+        assert len(corpus) > 0, f'The corpus {path} is empty.'
+        while True:
+            if shuffle:
+                for index in np.random.permutation(len(corpus))[start:]:
+                    yield GameState.from_record(corpus[int(index)])
+            else:
+                for records in corpus.chunks(start):
+                    for record in records:
+                        yield GameState.from_record(record)
+            start = 0
+            if not loop:
+                return
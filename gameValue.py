@@ -0,0 +1,656 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module computes the values of games of upset-downset as short
+partizan combinatorial games in canonical form: all dominated options are
+removed and all reversible options bypassed. Canonical forms are unique, so
+each value is built once (interned) and equal games have identical values.
+Values of sums are sums of values, so a game is valued one connected
+component at a time (positions falling apart mid-game included), and the
+values of components are cached by their canonical keys (see the
+canonicalForm module), shared between all games. (Memos and caches are
+cleared once full, and a value is only kept interned while in use, so
+memory stays bounded over long runs.)
+
+Reference:
+    - E. R. Berlekamp, J. H. Conway and R. K. Guy, Winning Ways for your
+      Mathematical Plays, Vol. 1, 2nd ed., A K Peters, 2001.
+    - A. N. Siegel, Combinatorial Game Theory, AMS, 2013.
+"""
+from bitDag import bits
+from weakref import WeakValueDictionary
+
+class Value(object):
+    ''' Class for the value of a short partizan game in canonical form.
+    (Values are interned: do not instantiate directly, see make().)
+    '''
+    __slots__ = ('left', 'right', '__weakref__')
+
+    def __init__(self, left, right):
+        '''
+        Parameters
+        ----------
+        left : frozenset
+            the (canonical) values of Ups (Lefts) options.
+        right : frozenset
+            the (canonical) values of Downs (Rights) options.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.left = left
+        self.right = right
+
+    def __le__(self, other):
+        return le(self, other)
+
+    def __ge__(self, other):
+        return le(other, self)
+
+    def __lt__(self, other):
+        return le(self, other) and self is not other
+
+    def __gt__(self, other):
+        return le(other, self) and self is not other
+
+    def __add__(self, other):
+        return add(self, other)
+
+    def __neg__(self):
+        return neg(self)
+
+    def __sub__(self, other):
+        return add(self, neg(other))
+
+    def outcome(self):
+        ''' Returns the outcome of a game with this value.
+
+        Returns
+        -------
+        str
+            'Next', 'Previous', 'Up' or 'Down'. (See UpDown.outcome().)
+
+        '''
+        # Up wins moving first exactly when G is not <= 0, and Down wins
+        # moving first exactly when G is not >= 0.
+        up_first = not le(self, ZERO)
+        down_first = not le(ZERO, self)
+        if up_first and down_first:
+            return 'Next'
+        if up_first:
+            return 'Up'
+        if down_first:
+            return 'Down'
+        return 'Previous'
+
+    def __repr__(self):
+        if self is ZERO:
+            return '0'
+        if self is STAR:
+            return '*'
+        n = _integer(self)
+        if n is not None:
+            return str(n)
+        n = _nimber(self)
+        if n is not None:
+            return '*' + str(n)
+        left = ','.join(sorted(map(repr, self.left)))
+        right = ','.join(sorted(map(repr, self.right)))
+        return '{' + left + '|' + right + '}'
+
+def _integer(G):
+    # the integer n > 0 (resp. n < 0) is {n-1|} (resp. {|n+1}).
+    if G is ZERO:
+        return 0
+    if len(G.left) == 1 and not G.right:
+        n = _integer(next(iter(G.left)))
+        return None if n is None or n < 0 else n + 1
+    if len(G.right) == 1 and not G.left:
+        n = _integer(next(iter(G.right)))
+        return None if n is None or n > 0 else n - 1
+    return None
+
+def _nimber(G):
+    # the nimber *n is {0,*,...,*(n-1)|0,*,...,*(n-1)}. (Values are 
+    # interned, so G is *n exactly when it is the nimber with n options.)
+    if G.left != G.right:
+        return None
+    n = len(G.left)
+    return n if nimber(n) is G else None
+
+class _Form(object):
+    ''' A game form {left|right} (not necessarily canonical) with canonical
+    options. Used for comparisons while canonicalizing. (Not interned.)
+    '''
+    __slots__ = ('left', 'right')
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+# interned canonical values keyed by their options (held weakly: a value 
+# no longer used anywhere is dropped, and interned anew if built again), 
+# and memos of comparisons, sums and negatives.
+_VALUES = WeakValueDictionary()
+_LE = {}
+_ADD = {}
+_NEG = {}
+# the most entries a memo (resp. cache of values) keeps before it is 
+# cleared.
+MAX_MEMO_SIZE = 2**18
+MAX_CACHED_VALUES = 2**16
+
+def _remember(cache, key, value, max_size):
+    # caches 'value', clearing 'cache' first if it is full.
+    if len(cache) >= max_size:
+        cache.clear()
+    cache[key] = value
+
+def le(G, H):
+    ''' Returns wether G <= H: there is no Up option of G which is >= H
+    and no Down option of H which is <= G.
+
+    Parameters
+    ----------
+    G : Value (or a game form)
+
+    H : Value (or a game form)
+
+    Returns
+    -------
+    bool
+
+    '''
+    if G is H:
+        return True
+    memoize = type(G) is Value and type(H) is Value
+    if memoize:
+        key = (G, H)
+        result = _LE.get(key)
+        if result is not None:
+            return result
+    result = not any(le(H, GL) for GL in G.left) and \
+        not any(le(HR, G) for HR in H.right)
+    if memoize:
+        _remember(_LE, key, result, MAX_MEMO_SIZE)
+    return result
+
+def make(left, right):
+    ''' Returns the canonical value of the game {left|right}: dominated
+    options are removed and reversible options are bypassed until none
+    remain.
+
+    Parameters
+    ----------
+    left : iterable
+        the values of Ups options.
+    right : iterable
+        the values of Downs options.
+
+    Returns
+    -------
+    Value
+        the (interned) canonical value.
+
+    '''
+    left = set(left)
+    right = set(right)
+    while True:
+        # Up keeps only maximal options, Down only minimal ones. (Equal
+        # values are identical, so the sets hold no duplicates.)
+        left = {GL for GL in left
+                if not any(GL is not other and le(GL, other)
+                           for other in left)}
+        right = {GR for GR in right
+                 if not any(GR is not other and le(other, GR)
+                            for other in right)}
+        G = _Form(left, right)
+        changed = False
+        # an Up option GL reverses through GLR <= G, and is then replaced
+        # by the Up options of GLR, and likewise for Down.
+        new_left = set()
+        for GL in left:
+            reversing = next((GLR for GLR in GL.right if le(GLR, G)), None)
+            if reversing is None:
+                new_left.add(GL)
+            else:
+                new_left.update(reversing.left)
+                changed = True
+        new_right = set()
+        for GR in right:
+            reversing = next((GRL for GRL in GR.left if le(G, GRL)), None)
+            if reversing is None:
+                new_right.add(GR)
+            else:
+                new_right.update(reversing.right)
+                changed = True
+        if not changed:
+            break
+        left, right = new_left, new_right
+    return _intern(left, right)
+
+def _intern(left, right):
+    # the interned value {left|right}, which is to be in canonical form.
+    key = (frozenset(left), frozenset(right))
+    value = _VALUES.get(key)
+    if value is None:
+        value = Value(*key)
+        _VALUES[key] = value
+    return value
+
+def add(G, H):
+    ''' Returns the (canonical) value of the sum of G and H.
+    '''
+    if G is ZERO:
+        return H
+    if H is ZERO:
+        return G
+    key = (G, H) if id(G) <= id(H) else (H, G)
+    value = _ADD.get(key)
+    if value is None:
+        value = make(
+            [add(GL, H) for GL in G.left] + [add(G, HL) for HL in H.left],
+            [add(GR, H) for GR in G.right] + [add(G, HR) for HR in H.right]
+            )
+        _remember(_ADD, key, value, MAX_MEMO_SIZE)
+    return value
+
+def neg(G):
+    ''' Returns the (canonical) value of the negative of G.
+    '''
+    value = _NEG.get(G)
+    if value is None:
+        value = make([neg(GR) for GR in G.right], [neg(GL) for GL in G.left])
+        _remember(_NEG, G, value, MAX_MEMO_SIZE)
+    return value
+
+def nimber(n):
+    ''' Returns the nimber *n = {0,*,...,*(n-1)|0,*,...,*(n-1)}.
+    '''
+    # the form is canonical (no option of a nimber dominates or reverses),
+    # so it is interned as is.
+    while len(_NIMBERS) <= n:
+        _NIMBERS.append(_intern(_NIMBERS, _NIMBERS))
+    return _NIMBERS[n]
+
+def integer(n):
+    ''' Returns the integer n: {n-1|} if n > 0 and {|n+1} if n < 0.
+    '''
+    while len(_INTEGERS) <= abs(n):
+        _INTEGERS.append(make([_INTEGERS[-1]], []))
+    return _INTEGERS[n] if n >= 0 else neg(_INTEGERS[-n])
+
+ZERO = make([], [])
+STAR = make([ZERO], [ZERO])
+# the nimbers *0, *1, ... and integers 0, 1, ... built so far.
+_NIMBERS = [ZERO]
+_INTEGERS = [ZERO]
+
+##############################################################################
+############################## UPSET-DOWNSET #################################
+##############################################################################
+
+# values of connected games keyed by their canonical keys.
+_COMPONENT_VALUES = {}
+
+# Families of connected games valued without search. A chain (resp. complete
+# bipartite graph) only has chains (resp. complete bipartite graphs and
+# antichains) as positions, so their values are computed from the colors
+# alone and cached across all games.
+_CHAIN_VALUES = {}
+_BIPARTITE_VALUES = {}
+
+def antichain_value(num_blue, num_green, num_red):
+    ''' Returns the value of a game on an antichain: a sum of single nodes,
+    1 for each blue node, -1 for each red node and * for each green node.
+    '''
+    return add(integer(num_blue - num_red), 
+               STAR if num_green % 2 else ZERO)
+
+def chain_value(colors):
+    ''' Returns the value of a game on a chain.
+
+    Parameters
+    ----------
+    colors : tuple
+        the colors of the nodes of the chain, from the bottom up.
+
+    Returns
+    -------
+    Value
+
+    '''
+    if not any(colors):
+        # a green chain is a Nim heap.
+        return nimber(len(colors))
+    value = _CHAIN_VALUES.get(colors)
+    if value is None:
+        # Up playing the i-th node leaves the nodes below it, and Down the 
+        # nodes above it.
+        value = make(
+            [chain_value(colors[:i]) 
+             for i, c in enumerate(colors) if c != -1],
+            [chain_value(colors[i+1:]) 
+             for i, c in enumerate(colors) if c != 1]
+            )
+        _remember(_CHAIN_VALUES, colors, value, MAX_CACHED_VALUES)
+    return value
+
+def complete_bipartite_value(bottom, top):
+    ''' Returns the value of a game on a complete bipartite graph: every
+    bottom node is below every top node.
+
+    Parameters
+    ----------
+    bottom : tuple
+        the numbers of blue, green and red bottom nodes.
+    top : tuple
+        the numbers of blue, green and red top nodes.
+
+    Returns
+    -------
+    Value
+
+    '''
+    if not any(bottom):
+        return antichain_value(*top)
+    if not any(top):
+        return antichain_value(*bottom)
+    key = (bottom, top)
+    value = _BIPARTITE_VALUES.get(key)
+    if value is None:
+        left, right = [], []
+        # (index 0 is blue, 1 green and 2 red.)
+        for c in range(3):
+            if bottom[c]:
+                fewer = bottom[:c] + (bottom[c] - 1,) + bottom[c+1:]
+                # Up removes all top nodes with a bottom node.
+                if c != 2:
+                    left.append(antichain_value(*fewer))
+                if c != 0:
+                    right.append(complete_bipartite_value(fewer, top))
+            if top[c]:
+                fewer = top[:c] + (top[c] - 1,) + top[c+1:]
+                if c != 2:
+                    left.append(complete_bipartite_value(bottom, fewer))
+                # Down removes all bottom nodes with a top node.
+                if c != 0:
+                    right.append(antichain_value(*fewer))
+        value = make(left, right)
+        _remember(_BIPARTITE_VALUES, key, value, MAX_CACHED_VALUES)
+    return value
+
+def classify(mask, up_masks, down_masks, blue, red):
+    ''' Returns the family of the connected position on the nodes in 'mask'
+    of a game given by (dense) masks, as in ValueSolver.
+
+    Parameters
+    ----------
+    mask : int
+        dense bitmask of the nodes of a connected position.
+    up_masks : list
+        the upset mask of each node.
+    down_masks : list
+        the downset mask of each node.
+    blue : int
+        mask of the blue nodes.
+    red : int
+        mask of the red nodes.
+
+    Returns
+    -------
+    family : str or None
+        'blue' or 'red' (all nodes of one color, any poset), 'chain', 
+        'complete bipartite', or None if the position is in none of these 
+        families.
+    parameters : 
+        the number of nodes for 'blue' and 'red', the colors from the 
+        bottom up for 'chain' (see chain_value()), the colors counts of the
+        bottom and top nodes for 'complete bipartite' (see 
+        complete_bipartite_value()), and None otherwise.
+
+    '''
+    nodes = bits(mask)
+    if mask & ~blue == 0:
+        return 'blue', len(nodes)
+    if mask & ~red == 0:
+        return 'red', len(nodes)
+    def color(x):
+        return 1 if (blue >> x) & 1 else -1 if (red >> x) & 1 else 0
+    if all((up_masks[x] | down_masks[x]) & mask == mask for x in nodes):
+        nodes.sort(key=lambda x: bin(down_masks[x] & mask).count('1'))
+        return 'chain', tuple(color(x) for x in nodes)
+    bottom_mask, top_mask = 0, 0
+    for x in nodes:
+        if down_masks[x] & mask == 1 << x:
+            bottom_mask |= 1 << x
+        elif up_masks[x] & mask == 1 << x:
+            top_mask |= 1 << x
+        else:
+            return None, None
+    if all(up_masks[x] & mask == (1 << x) | top_mask 
+           for x in bits(bottom_mask)):
+        counts = []
+        for side in (bottom_mask, top_mask):
+            counts.append((bin(side & blue).count('1'),
+                           bin(side & ~blue & ~red).count('1'),
+                           bin(side & red).count('1')))
+        return 'complete bipartite', tuple(counts)
+    return None, None
+
+def closed_form_value(mask, up_masks, down_masks, blue, red):
+    ''' Returns the value of the connected position on the nodes in 'mask'
+    if it is in one of the families recognized by classify(), and None 
+    otherwise. (All nodes blue (resp. red) is the integer n (resp. -n): Up 
+    can make n moves, playing the top nodes first.)
+    '''
+    family, parameters = classify(mask, up_masks, down_masks, blue, red)
+    if family == 'blue':
+        return integer(parameters)
+    if family == 'red':
+        return integer(-parameters)
+    if family == 'chain':
+        return chain_value(parameters)
+    if family == 'complete bipartite':
+        return complete_bipartite_value(*parameters)
+    return None
+
+class ValueSolver(object):
+    ''' Class for computing the values of a game of upset-downset and its
+    positions, on bitmasks of the nodes remaining. (As in the outcomeSolver
+    module.) A position falling apart into several components is valued as
+    the sum of the values of its components.
+    '''
+    def __init__(self, game):
+        '''
+        Parameters
+        ----------
+        game : UpDown
+            a game of upset-downset.
+
+        Returns
+        -------
+        None.
+
+        '''
+        bitdag = game.bitdag
+        # dense indices: the node nodes[i] is bit i.
+        self.nodes = list(bitdag)
+        index = {x: i for i, x in enumerate(self.nodes)}
+        def dense(mask):
+            dense_mask = 0
+            for x in bits(mask):
+                dense_mask |= 1 << index[x]
+            return dense_mask
+        self.up_masks = [dense(bitdag.upset(x)) for x in self.nodes]
+        self.down_masks = [dense(bitdag.downset(x)) for x in self.nodes]
+        self.neighbors = [dense(bitdag.children[x] | bitdag.parents[x])
+                          for x in self.nodes]
+        blue, red = 0, 0
+        for i, x in enumerate(self.nodes):
+            if game.coloring[x] == 1:
+                blue |= 1 << i
+            elif game.coloring[x] == -1:
+                red |= 1 << i
+        self.full = (1 << len(self.nodes)) - 1
+        self.blue = blue
+        self.red = red
+        self.up_playable = self.full & ~red
+        self.down_playable = self.full & ~blue
+        self.table = {}
+
+    def components(self, mask):
+        ''' Returns the dense bitmasks of the connected components of the
+        position on the nodes in 'mask'. (Flood fill.)
+        '''
+        components = []
+        while mask:
+            component = mask & -mask
+            frontier = component
+            while frontier:
+                reached = 0
+                for i in bits(frontier):
+                    reached |= self.neighbors[i]
+                frontier = reached & mask & ~component
+                component |= frontier
+            components.append(component)
+            mask &= ~component
+        return components
+
+    def closed_form(self, mask=None):
+        ''' Returns the value of the connected position on the nodes in 
+        'mask' if it is in a family valued without search (see classify()),
+        and None otherwise. (The default, None, is the whole game.)
+        '''
+        return closed_form_value(
+            self.full if mask is None else mask,
+            self.up_masks,
+            self.down_masks,
+            self.blue,
+            self.red
+            )
+
+    def _component_value(self, component):
+        # the value of a connected position, recognized families first.
+        value = self.table.get(component)
+        if value is None:
+            value = self.closed_form(component)
+            if value is None:
+                return self.value(component)
+            self.table[component] = value
+        return value
+
+    def value(self, mask=None):
+        ''' Returns the value of the position on the nodes in 'mask'.
+
+        Parameters
+        ----------
+        mask : int, optional
+            dense bitmask of the nodes remaining. The default is None, in
+            which case the value of the whole game is returned.
+
+        Returns
+        -------
+        Value
+
+        '''
+        # the families of classify() are only looked for in the whole game
+        # and in the components of positions falling apart. (Checking every
+        # position costs more than it saves on typical games.)
+        root = mask is None
+        if root:
+            mask = self.full
+        value = self.table.get(mask)
+        if value is not None:
+            return value
+        components = self.components(mask)
+        if len(components) > 1:
+            value = ZERO
+            for component in components:
+                value = add(value, self._component_value(component))
+        elif root:
+            value = self.closed_form(mask)
+        if value is None:
+            value = make(
+                [self.value(mask & ~self.up_masks[i])
+                 for i in bits(mask & self.up_playable)],
+                [self.value(mask & ~self.down_masks[i])
+                 for i in bits(mask & self.down_playable)]
+                )
+        self.table[mask] = value
+        return value
+
+def game_value(game):
+    ''' Returns the value of the game of upset-downset 'game': the sum of
+    the values of its components. The value of each component is cached by
+    its canonical key, so isomorphic components (in any game) are valued
+    once.
+
+    Parameters
+    ----------
+    game : UpDown
+        a game of upset-downset.
+
+    Returns
+    -------
+    Value
+
+    '''
+    value = ZERO
+    for summand in game.summands():
+        key = summand.key
+        summand_value = _COMPONENT_VALUES.get(key)
+        if summand_value is None:
+            summand_value = ValueSolver(summand).value()
+            _remember(_COMPONENT_VALUES, key, summand_value, 
+                      MAX_CACHED_VALUES)
+        value = add(value, summand_value)
+    return value
+
+def known_value(game, solver):
+    ''' Returns the value of the game of upset-downset 'game' if the value
+    of each of its components is known without search: the component is in
+    a family of classify() or its value is cached (see game_value()). 
+    Returns None otherwise.
+
+    Parameters
+    ----------
+    game : UpDown
+        a game of upset-downset.
+    solver : OutcomeSolver or ValueSolver
+        the solver of 'game', whose (dense) masks are classified.
+
+    Returns
+    -------
+    Value or None
+
+    '''
+    index = {x: i for i, x in enumerate(solver.nodes)}
+    values = []
+    unknown = []
+    for k, component in enumerate(game.bitdag.components()):
+        dense = 0
+        for x in bits(component):
+            dense |= 1 << index[x]
+        value = closed_form_value(
+            dense, solver.up_masks, solver.down_masks, solver.blue, solver.red
+            )
+        if value is None:
+            # (canonical keys are only computed if there are values 
+            # cached.)
+            if not _COMPONENT_VALUES:
+                return None
+            unknown.append(k)
+        values.append(value)
+    if unknown:
+        summands = game.summands()
+        for k in unknown:
+            values[k] = _COMPONENT_VALUES.get(summands[k].key)
+            if values[k] is None:
+                return None
+    value = ZERO
+    for component_value in values:
+        value = add(value, component_value)
+    return value
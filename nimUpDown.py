@@ -1,13 +1,20 @@
 """
 @author: Charles Petersen and Jamison Barsotti
+
+NOTE: A game of Nim is kept as its heaps only: each heap is an interval of
+consecutive nodes (start, start+1, ..., start+size-1) linked from each node
+to the next. Playing a node cuts its heap (Up keeps the nodes below it, Down
+the nodes above it), so options are found from the heaps by a binary search,
+without the directed acyclic graph, which is only built when asked for.
 """
 from upDown import UpDown
-import digraph
-import copy
+from bitDag import BitDag
+import gameValue
+from bisect import bisect_right
 
 def int_to_bin(n):
     ''' Returns the binary representation of the integer 'n'.
-    
+
     Parameters
     ----------
     n : int
@@ -20,15 +27,19 @@ def int_to_bin(n):
     '''
     return bin(n).replace('0b', '')
 
-def nim_dag(heaps):
+def nim_dag(heaps, starts=None):
     ''' Returns a directed acyclic graph corresonding to the Nim heaps, 
     'heaps'.
-    
+
     Parameters
     ----------
     heaps : list
         positive ints, each representing the size of the corresponding 
         Nim heap.
+    starts : list, optional
+        the first (lowest) node of each heap. The default is None, in which
+        case the heaps are labelled consecutively from 0.
+
     Returns
     -------
     dict
@@ -36,42 +47,121 @@ def nim_dag(heaps):
         lists keyed by node) corresponing to' heaps'. A disjoint union of
         directed acyclic graphs, one for each heap in 'heaps': each is 
         comprised of consecutively linked nodes.
-        
+
 
     '''
+    if starts is None:
+        starts = _consecutive_starts(heaps)
     dag = {}
-    node_count = 0
-    for k in heaps:  
+    for node_count, k in zip(starts, heaps):
         heap = {j:[j+1] for j in range(node_count, node_count+k-1)}
         heap[node_count+k-1] = []
         dag.update(heap)
-        node_count += k
-        
+
     return dag
 
+def _consecutive_starts(heaps):
+    starts = []
+    node_count = 0
+    for k in heaps:  
+        starts.append(node_count)
+        node_count += k
+    return starts
+
 class NimGame(UpDown):
     ''' Subclass of UpDown for Nim games of upset-downset.
     '''
-    def __init__(self, heaps):
+    def __init__(self, heaps, starts=None):
         ''' Initializes an all green game of upset-downset on a disjoint union 
         of directed acyclic graphs, each comprised of consecutively linked 
         nodes. (Equivalent to a game of Nim!)
-        
+
         Parameters
         ----------
         heaps : list 
             positive ints, each representing the size of the corresponding 
             Nim heap. 
+        starts : list, optional
+            the first (lowest) node of each heap, increasing. The default is
+            None, in which case the heaps are labelled consecutively from 0.
 
         Returns
         -------
         None
 
         '''
-        dag = nim_dag(heaps)
-        UpDown.__init__(self, dag, reduced=True)
-        self.heaps = heaps
-        
+        self.heaps = list(heaps)
+        self.starts = _consecutive_starts(self.heaps) if starts is None \
+            else list(starts)
+        # the dag and coloring are only built when asked for.
+        self._bitdag = None
+        self._coloring = None
+        self._dag = None
+        self._init_caches()
+
+    @property
+    def bitdag(self):
+        if self._bitdag is None:
+            self._bitdag = BitDag(nim_dag(self.heaps, self.starts))
+        return self._bitdag
+
+    @bitdag.setter
+    def bitdag(self, x):
+        self._bitdag = x
+
+    @property
+    def coloring(self):
+        if self._coloring is None:
+            self._coloring = {x:0 for x in self.nodes()}
+        return self._coloring
+
+    @coloring.setter
+    def coloring(self, x):
+        self._coloring = x
+
+    def nodes(self):
+        ''' Returns all nodes, heap by heap.
+
+        Returns
+        -------
+        list
+            all nodes.
+
+        '''
+        return [x for start, k in zip(self.starts, self.heaps)
+                for x in range(start, start + k)]
+
+    def up_nodes(self):
+        return self.nodes()
+
+    def down_nodes(self):
+        return self.nodes()
+
+    def __len__(self):
+        return sum(self.heaps)
+
+    def _heap_of(self, x):
+        # the index of the heap containing node x.
+        i = bisect_right(self.starts, x) - 1
+        assert i >= 0 and x < self.starts[i] + self.heaps[i], \
+            f'{x} is not a node of the game.'
+        return i
+
+    def _option(self, i, start, k):
+        # the game with heap i replaced by the heap of size k from 'start'.
+        option_heaps = self.heaps.copy()
+        option_starts = self.starts.copy()
+        if k > 0:
+            option_heaps[i] = k
+            option_starts[i] = start
+        else:
+            del option_heaps[i]
+            del option_starts[i]
+        option = NimGame(option_heaps, option_starts)
+        self._inherit_layout(option)
+
+        return option
+
     def up_play(self, x):
         '''returns the nim game of upset-downset left after Up plays node 'x'.
 
@@ -85,38 +175,13 @@ class NimGame(UpDown):
         NimGame
             the game after Up plays node 'x'.
 
-        '''      
-        # get the index of the heap containing node x in the list of heaps
-        option_heaps = self.heaps.copy()
-        nodes = sorted(list(self.dag))
-        x_idx = nodes.index(x)
-        x_heap_idx = 0
-        heap_sum = 0
-        while heap_sum <= x_idx:
-            heap_sum += option_heaps[x_heap_idx]
-            x_heap_idx += 1
-        x_heap_idx -= 1
-        
-        # remove nodes from heap containing x and mutate list of 
-        # heaps accordingly
-        x_upset = self.upset(x)
-        num_to_remove = len(x_upset)
-        new_heap_size = option_heaps[x_heap_idx] - num_to_remove
-        if new_heap_size > 0:
-            option_heaps[x_heap_idx] = new_heap_size 
-        else:
-            del option_heaps[x_heap_idx]
-            
-        # instantiate option, relable nodes and set coloring
-        option_nodes = sorted(list(set(nodes) - set(x_upset)))  
-        option = NimGame(option_heaps)
-        relabelling = {i: option_nodes[i] for i in range(len(option_nodes))}
-        option.dag = digraph.relabel(option.dag, relabelling)
-        option.coloring = {i:0 for i in option_nodes}
-        option.layout = {i: self.layout[i] for i in option_nodes}
-        
-        return option
-    
+        '''
+        # the upset of x is x and the nodes above it in its heap.
+        i = self._heap_of(x)
+        start = self.starts[i]
+
+        return self._option(i, start, x - start)
+
     def down_play(self, x):
         '''Returns the nim game of  upset-downset left after Down plays 
         node 'x'.
@@ -132,90 +197,74 @@ class NimGame(UpDown):
             the game after Down plays node 'x'.
 
         '''
-        # get the index of the heap containing node x in the list of heaps
-        option_heaps = self.heaps.copy()
-        nodes = sorted(list(self.dag))
-        x_idx = nodes.index(x)
-        x_heap_idx = 0
-        heap_sum = 0
-        while heap_sum <= x_idx:
-            heap_sum += option_heaps[x_heap_idx]
-            x_heap_idx += 1
-        x_heap_idx -= 1
-        
-        # remove nodes from heap containing x
-        x_downset = self.downset(x)
-        num_to_remove = len(x_downset)
-        new_heap_size = option_heaps[x_heap_idx] - num_to_remove
-        if new_heap_size > 0:
-            option_heaps[x_heap_idx] = new_heap_size 
-        else:
-            del option_heaps[x_heap_idx]
-        
-        # instantiate option, relable nodes and set coloring
-        option_nodes = sorted(list(set(nodes) - set(x_downset))) 
-        option = NimGame(option_heaps)
-        relabelling = {i: option_nodes[i] for i in range(len(option_nodes))}
-        option.dag = digraph.relabel(option.dag, relabelling)
-        option.coloring = {i:0 for i in option_nodes}
-        option.layout = {i: self.layout[i] for i in option_nodes}
-        
-        return option
-               
+        # the downset of x is x and the nodes below it in its heap.
+        i = self._heap_of(x)
+        end = self.starts[i] + self.heaps[i]
+
+        return self._option(i, x + 1, end - x - 1)
+
     def nim_sum(self):
         ''' Returns the Nim sum of the heaps in the game.
-        
+
         Returns
         -------
         nim_sum : int (nonnegative)
-            to compute the NIM sum convert the heap sizes to binarty and sum them 
-            without carrying!
+            the heap sizes added in binary without carrying: their bitwise
+            exclusive or.
 
         '''
-        # write each heap size as binary string each having a common length.
-        bin_heaps = [int_to_bin(heap) for heap in self.heaps]
-        n = max(len(bin_heap) for bin_heap in bin_heaps)
-        bin_heaps = [bin_heap.zfill(n) for bin_heap in bin_heaps]
-        # convert binary strings to lists of bits
-        bin_heaps = [list(bin_heap) for bin_heap in bin_heaps] 
-        bin_heaps = [list(map(int,bin_heap)) for bin_heap in bin_heaps]
-        # compute teh nim sum
         _nim_sum = 0
-        for i in range(n):
-            digit = 0
-            for bin_heap in bin_heaps:
-                digit = (digit + bin_heap[-1-i]) % 2
-            _nim_sum += digit*(2**i)
+        for heap in self.heaps:
+            _nim_sum ^= heap
         return _nim_sum
-    
-    def outcome(self):
+
+    def outcome(self, workers=None):
         ''' Returns the outcome of the game. Overloads outcome method from 
-        UpDown class.
+        UpDown class. ('workers' is accepted for compatibility, the outcome
+        is read off the Nim sum.)
         -------
         str
             'Previous' if the game is a second player win, and 'Next' if the
             game is a first player win.
-        '''        
+        '''
         return 'Previous' if self.nim_sum() == 0 else 'Next'
-    
+
+    def value(self):
+        ''' Returns the value of the game: the nimber of its Nim sum.
+        Overloads value method from UpDown class.
+
+        Returns
+        -------
+        Value
+
+        '''
+        return gameValue.nimber(self.nim_sum())
+
+    def known_value(self):
+        # the value of Nim is always known.
+        return self.value()
+
     def __neg__(self):                
         '''Returns the negative of the nim game. (Since a game of nim is its 
         own negative a copy of 'self' is returned.)
-    
+
         Returns
         -------
         NimGame
             the negative of the nim game of upset-downset.
 
         '''
-        return copy.deepcopy(self)
+        negative = NimGame(self.heaps, self.starts)
+        self._inherit_layout(negative)
+
+        return negative
 
     def __add__(self, other):              
         '''Returns the (disjunctive) sum of nim games of upset-dowmnset.
         . **Relabels elements in 'other to consecutive nonnegative integers
         starting from len('self'). If 'other' is also a nim game then the 
         sum will be too!
-        
+
         Parameters
         ----------
         other : UpDown
@@ -226,7 +275,7 @@ class NimGame(UpDown):
         UpDown (NimGame)
             The upset-downset game on the disjoint union of directed acyclic 
             graphs with unchanged colorings.
-            
+
         Note: the sum retains all nodes ('other' being relabelled), edges 
             and coloring from both 'self' and 'other' with no new edges added 
             between 'self' and 'other'
@@ -237,10 +286,10 @@ class NimGame(UpDown):
             return NimGame(add_heaps)
         else:
             return super().__add__(other)
-    
+
     def __sub__(self, other):
         ''' Returns the difference of games.
-    
+
         Parameters
         ----------
         other : UpDown
@@ -0,0 +1,581 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module solves games of upset-downset exactly, working directly on
+bitmasks of the nodes remaining. The nodes of the game are relabelled
+0,...,n-1 and the upset and downset of each node, and the nodes each player
+may play, are precomputed as masks. Every position reachable in play is then
+an int (the mask of its nodes): playing a node is a single mask-and, and
+outcomes are memoized in a dict keyed by these ints. No UpDown objects are
+built during the search.
+
+Each player's question "do I win moving first?" is searched on its own and
+stops at the first winning move found, trying the moves removing the most
+nodes first. The outcome of a position is the pair of answers, and the
+winning moves of each player can be read off (see winning_moves()).
+
+All positions of a game can also be solved at once (see solve_all()): the
+positions reachable in play are enumerated layer by layer (by number of
+nodes) as sorted numpy arrays of masks, and then solved bottom-up, one
+vectorized step per layer, player and node.
+
+For larger games the options of the game can be searched across a process
+pool (see parallel_outcome()), the workers sharing solved positions through
+a lock-free transposition table in shared memory (see SharedTable).
+"""
+from bitDag import bits, popcount
+import packedDigraph
+from multiprocessing import Pool, shared_memory
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+# the outcome of a position is coded by two bits: bit 0 (resp. 1) is set if
+# Up (resp. Down) wins moving first.
+OUTCOMES = ('Previous', 'Up', 'Down', 'Next')
+UP_WINS_FIRST = 1
+DOWN_WINS_FIRST = 2
+# players (as in config.py)
+UP = 0
+DOWN = 1
+# the most nodes of a game solved by OutcomeSolver.solve_all().
+MAX_SOLVE_ALL_NODES = 25
+
+class OutcomeSolver(object):
+    ''' Class for the exact (memoized) solution of a game of upset-downset
+    and all of its positions.
+    '''
+    def __init__(self, game):
+        '''
+        Parameters
+        ----------
+        game : UpDown
+            a game of upset-downset.
+
+        Returns
+        -------
+        None.
+
+        '''
+        bitdag = game.bitdag
+        # dense indices: the node nodes[i] is bit i.
+        self.nodes = list(bitdag)
+        index = {x: i for i, x in enumerate(self.nodes)}
+        def dense(mask):
+            dense_mask = 0
+            for x in bits(mask):
+                dense_mask |= 1 << index[x]
+            return dense_mask
+        self.up_masks = [dense(bitdag.upset(x)) for x in self.nodes]
+        self.down_masks = [dense(bitdag.downset(x)) for x in self.nodes]
+        blue, red = 0, 0
+        for i, x in enumerate(self.nodes):
+            if game.coloring[x] == 1:
+                blue |= 1 << i
+            elif game.coloring[x] == -1:
+                red |= 1 << i
+        self.blue = blue
+        self.red = red
+        self.full = (1 << len(self.nodes)) - 1
+        # nodes Up (resp. Down) may play: blue/green (resp. red/green).
+        self.up_playable = self.full & ~red
+        self.down_playable = self.full & ~blue
+        # move ordering: largest upset (resp. downset) first.
+        self.up_order = sorted(range(len(self.nodes)), 
+                               key=lambda x: -popcount(self.up_masks[x]))
+        self.down_order = sorted(range(len(self.nodes)), 
+                                 key=lambda x: -popcount(self.down_masks[x]))
+        # wether Up (resp. Down) wins moving first keyed by position.
+        self.tables = ({}, {})
+        # a SharedTable, when solving in parallel, and the least number of 
+        # nodes of positions kept in it. (Smaller positions are quicker to 
+        # solve again than to share.)
+        self.shared = None
+        self.shared_min_nodes = 0
+
+    def wins_first(self, mask, player):
+        ''' Returns wether 'player' wins moving first in the position on 
+        the nodes in 'mask'. (The search stops at the first winning move.)
+
+        Parameters
+        ----------
+        mask : int
+            dense bitmask of the nodes remaining.
+        player : int
+            UP (0) or DOWN (1).
+
+        Returns
+        -------
+        bool
+
+        '''
+        table = self.tables[player]
+        result = table.get(mask)
+        if result is not None:
+            return result
+        shared = self.shared is not None and \
+            popcount(mask) >= self.shared_min_nodes
+        if shared:
+            result = self.shared.get((mask << 1) | player)
+            if result is not None:
+                result = bool(result)
+                table[mask] = result
+                return result
+        if player == UP:
+            playable = mask & self.up_playable
+            order, masks, own = self.up_order, self.up_masks, self.blue
+        else:
+            playable = mask & self.down_playable
+            order, masks, own = self.down_order, self.down_masks, self.red
+        # base cases: no moves, lose. All nodes of the players color, win.
+        if not playable:
+            result = False
+        elif mask & ~own == 0:
+            result = True
+        else:
+            # a player wins moving first exactly when they have a move to a 
+            # position their opponent loses moving first.
+            opponent = DOWN if player == UP else UP
+            result = False
+            for x in order:
+                if (playable >> x) & 1 and \
+                    not self.wins_first(mask & ~masks[x], opponent):
+                    result = True
+                    break
+        table[mask] = result
+        if shared:
+            self.shared.put((mask << 1) | player, int(result))
+
+        return result
+
+    def solve(self, mask):
+        ''' Returns the coded outcome of the position on the nodes in 'mask'.
+        (See OUTCOMES.)
+
+        Parameters
+        ----------
+        mask : int
+            dense bitmask of the nodes remaining.
+
+        Returns
+        -------
+        int
+            0, 1, 2 or 3: the index of the outcome in OUTCOMES.
+
+        '''
+        code = 0
+        if self.wins_first(mask, UP):
+            code |= UP_WINS_FIRST
+        if self.wins_first(mask, DOWN):
+            code |= DOWN_WINS_FIRST
+
+        return code
+    
+    def winning_moves(self, mask=None):
+        ''' Returns the winning moves of each player (moving first) in the
+        position on the nodes in 'mask'.
+
+        Parameters
+        ----------
+        mask : int, optional
+            dense bitmask of the nodes remaining. The default is None, in
+            which case the whole game is used.
+
+        Returns
+        -------
+        up_moves : list
+            the nodes (labels of the game) Up may play to win moving first.
+        down_moves : list
+            the nodes (labels of the game) Down may play to win moving 
+            first.
+
+        '''
+        mask = self.full if mask is None else mask
+        up_moves = [self.nodes[x] for x in bits(mask & self.up_playable)
+                    if not self.wins_first(mask & ~self.up_masks[x], DOWN)]
+        down_moves = [self.nodes[x] for x in bits(mask & self.down_playable)
+                      if not self.wins_first(mask & ~self.down_masks[x], UP)]
+        
+        return up_moves, down_moves
+
+    def outcome(self, mask=None):
+        ''' Returns the outcome of the position on the nodes in 'mask'.
+
+        Parameters
+        ----------
+        mask : int, optional
+            dense bitmask of the nodes remaining. The default is None, in
+            which case the outcome of the whole game is returned.
+
+        Returns
+        -------
+        str
+            'Next', 'Previous', 'Up' or 'Down'. (See UpDown.outcome().)
+
+        '''
+        return OUTCOMES[self.solve(self.full if mask is None else mask)]
+
+    def solve_all(self):
+        ''' Returns the outcomes and best moves of all positions reachable
+        in play, solved bottom-up (retrograde) with numpy. (Positions are 
+        the whole game minus unions of upsets and downsets, so there are 
+        far fewer of them than subsets of the nodes for most games. The
+        solution is kept in arrays indexed by mask while solving, five of 
+        one byte per subset of the nodes: about 160MB for 25 nodes, on top
+        of the positions themselves.)
+
+        Returns
+        -------
+        SolutionTable
+
+        '''
+        n = len(self.nodes)
+        assert n <= MAX_SOLVE_ALL_NODES, 'The game is too large.'
+        one = np.uint64(1)
+        up_masks = np.array(self.up_masks, dtype=np.uint64)
+        down_masks = np.array(self.down_masks, dtype=np.uint64)
+        # the moves of each player: (node, mask removed).
+        up_moves = [(x, up_masks[x]) for x in self.up_order 
+                    if (self.up_playable >> x) & 1]
+        down_moves = [(x, down_masks[x]) for x in self.down_order 
+                      if (self.down_playable >> x) & 1]
+        # the reachable positions with each number of nodes. Options have 
+        # fewer nodes than their position, so a layer is complete once all 
+        # larger layers have been expanded.
+        reached = np.zeros(1 << n, dtype=bool)
+        reached[self.full] = True
+        found = [[] for _ in range(n + 1)]
+        found[n].append(np.array([self.full], dtype=np.uint64))
+        layers = [None]*(n + 1)
+        for size in range(n, -1, -1):
+            layer = np.sort(np.concatenate(
+                found[size] + [np.zeros(0, dtype=np.uint64)]))
+            # (sorted, so duplicates are adjacent.)
+            layer = layer[np.r_[True, layer[1:] != layer[:-1]][:len(layer)]]
+            layers[size] = layer
+            options = []
+            for x, removed in up_moves + down_moves:
+                present = layer[(layer >> np.uint64(x)) & one == one]
+                option = present & ~removed
+                options.append(option[~reached[option]])
+            if not options:
+                continue
+            options = np.concatenate(options)
+            reached[options] = True
+            sizes = packedDigraph.popcount(options)
+            for option_size in np.unique(sizes):
+                found[option_size].append(options[sizes == option_size])
+        # wether Up (resp. Down) wins moving first, and the best winning 
+        # move (or -1), keyed by mask.
+        up_wins = np.zeros(1 << n, dtype=bool)
+        down_wins = np.zeros(1 << n, dtype=bool)
+        up_best = np.full(1 << n, -1, dtype=np.int8)
+        down_best = np.full(1 << n, -1, dtype=np.int8)
+        sides = ((up_moves, up_wins, up_best, down_wins),
+                 (down_moves, down_wins, down_best, up_wins))
+        # smallest layers first: all options are solved before their 
+        # positions. Moves are tried in the order of the search (largest 
+        # upset or downset first), so the best move is the first win.
+        for size in range(1, n + 1):
+            layer = layers[size]
+            for moves, wins, best, opponent_wins in sides:
+                for x, removed in moves:
+                    present = layer[(layer >> np.uint64(x)) & one == one]
+                    winning = present[~opponent_wins[present & ~removed]]
+                    wins[winning] = True
+                    best[winning[best[winning] < 0]] = x
+        masks = np.sort(np.concatenate(layers))
+        codes = (up_wins[masks] * UP_WINS_FIRST + 
+                 down_wins[masks] * DOWN_WINS_FIRST).astype(np.uint8)
+        labels = np.array(self.nodes + [-1], dtype=np.int64)
+
+        return SolutionTable(
+            self.nodes,
+            masks,
+            codes,
+            labels[up_best[masks]],
+            labels[down_best[masks]]
+            )
+
+    def to_mask(self, nodes):
+        ''' Returns the dense bitmask of the nodes (labels of the game) in
+        'nodes'.
+        '''
+        index = {x: i for i, x in enumerate(self.nodes)}
+        mask = 0
+        for x in nodes:
+            mask |= 1 << index[x]
+        return mask
+
+    def options(self, mask):
+        ''' Returns the dense bitmasks of all options (for either player)
+        of the position on the nodes in 'mask'.
+        '''
+        return [mask & ~self.up_masks[x]
+                for x in bits(mask & self.up_playable)] + \
+            [mask & ~self.down_masks[x]
+             for x in bits(mask & self.down_playable)]
+
+    def __getstate__(self):
+        # workers get the masks, not the shared table or the memo.
+        state = dict(self.__dict__)
+        state['tables'] = ({}, {})
+        state['shared'] = None
+        return state
+
+class SolutionTable(object):
+    ''' Class for the outcomes and best moves of all positions of a game of
+    upset-downset reachable in play. (See OutcomeSolver.solve_all().) 
+    Positions are dense bitmasks of the nodes remaining, as in OutcomeSolver.
+    '''
+    def __init__(self, nodes, masks, codes, up_moves, down_moves):
+        '''
+        Parameters
+        ----------
+        nodes : list
+            the nodes of the game: the node nodes[i] is bit i.
+        masks : numpy array
+            uint64 array of the positions, sorted.
+        codes : numpy array
+            uint8 array of the coded outcomes of the positions. (See 
+            OUTCOMES.)
+        up_moves : numpy array
+            int array of the best move for Up (moving first) in each 
+            position: the first winning move in the move ordering of the
+            search (the largest upset in the whole game first, ties broken
+            by position in 'nodes'), or -1 if Up has no winning move.
+        down_moves : numpy array
+            int array of the best moves for Down, likewise (the largest 
+            downset first).
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.nodes = nodes
+        self.masks = masks
+        self.codes = codes
+        self.up_moves = up_moves
+        self.down_moves = down_moves
+
+    def __len__(self):
+        return len(self.masks)
+
+    def index(self, mask=None):
+        ''' Returns the index of the position on the nodes in 'mask'. (The
+        default, None, is the whole game.)
+        '''
+        if mask is None:
+            mask = (1 << len(self.nodes)) - 1
+        i = int(np.searchsorted(self.masks, np.uint64(mask)))
+        assert i < len(self.masks) and self.masks[i] == mask, \
+            f'{mask} is not a reachable position.'
+        return i
+
+    def outcome(self, mask=None):
+        ''' Returns the outcome of the position on the nodes in 'mask'. 
+        (The default, None, is the whole game.)
+        '''
+        return OUTCOMES[self.codes[self.index(mask)]]
+
+    def best_moves(self, mask=None):
+        ''' Returns the best moves of Up and Down (moving first) in the 
+        position on the nodes in 'mask', each None if that player has no 
+        winning move. (The default, None, is the whole game.)
+        '''
+        i = self.index(mask)
+        up_move = int(self.up_moves[i])
+        down_move = int(self.down_moves[i])
+        return (None if up_move < 0 else up_move,
+                None if down_move < 0 else down_move)
+
+class SharedTable(object):
+    ''' Class for a transposition table of solved positions in shared
+    memory, for use by several processes at once. Open addressing with
+    linear probing on an array of uint64 words: each entry is a single word
+    holding a key (e.g. a position mask) and a 2-bit code, so entries are written
+    and read whole and no locking is needed. (When the probed slots are all
+    taken the entry is simply not stored.)
+    '''
+    # (2**64)/golden ratio, for multiplicative hashing
+    _MULTIPLIER = 0x9E3779B97F4A7C15
+    _MAX_PROBES = 8
+
+    def __init__(self, size_exp=22, name=None):
+        '''
+        Parameters
+        ----------
+        size_exp : int, optional
+            the table has 2**size_exp entries (8 bytes each). The default is
+            22.
+        name : str, optional
+            the name of an existing table to attach to. The default is None,
+            in which case a new table is created.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.size_exp = size_exp
+        size = 1 << size_exp
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True, size=8*size)
+            np.ndarray(size, dtype=np.uint64, buffer=self.memory.buf)[:] = 0
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        # (a memoryview reads and writes whole words as python ints.)
+        self.words = self.memory.buf.cast('Q')
+        self.name = self.memory.name
+        self._shift = 64 - size_exp
+        self._size_mask = size - 1
+
+    def _slot(self, mask):
+        return ((mask * self._MULTIPLIER) & 0xFFFFFFFFFFFFFFFF) >> self._shift
+
+    def get(self, mask):
+        ''' Returns the code stored under the key 'mask', or None if it is 
+        not in the table.
+        '''
+        slot = self._slot(mask)
+        for probe in range(self._MAX_PROBES):
+            word = self.words[(slot + probe) & self._size_mask]
+            if word == 0:
+                return None
+            # (a word is never 0: it is (key << 2 | code) + 1.)
+            word -= 1
+            if word >> 2 == mask:
+                return word & 3
+        return None
+
+    def put(self, mask, code):
+        ''' Stores the 2-bit 'code' under the key 'mask'.
+        '''
+        word = ((mask << 2) | code) + 1
+        slot = self._slot(mask)
+        for probe in range(self._MAX_PROBES):
+            i = (slot + probe) & self._size_mask
+            current = self.words[i]
+            if current == 0 or current == word:
+                self.words[i] = word
+                return
+
+    def close(self, unlink=False):
+        ''' Detaches from the table (and frees it if 'unlink' is True).
+        '''
+        self.words.release()
+        del self.words
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+# the solver of each worker process, and the flags of the players whose 
+# question is answered, set by _init_worker().
+_worker_solver = None
+_worker_decided = None
+
+def _init_worker(solver, table_name, size_exp, shared_min_nodes, decided):
+    global _worker_solver, _worker_decided
+    solver.shared = SharedTable(size_exp, name=table_name)
+    solver.shared_min_nodes = shared_min_nodes
+    _worker_solver = solver
+    _worker_decided = decided
+
+def _wins_first_in_worker(task):
+    # (the tasks of a player whose question is answered are skipped.)
+    parent, mask, player = task
+    if _worker_decided[parent]:
+        return parent, None
+    return parent, _worker_solver.wins_first(mask, player)
+
+def parallel_outcome(game, 
+                     workers, 
+                     size_exp=22, 
+                     shared_min_nodes=None):
+    ''' Returns the outcome of the game of upset-downset 'game', searching
+    the options of the game in parallel across a process pool. A player
+    wins moving first exactly when one of their moves leads to a position
+    their opponent loses moving first, so each player's question is split
+    into one task per move (largest first, as in the serial search). The 
+    workers share solved positions through a SharedTable. Once a player's
+    answer is decided their tasks left are skipped, and once the outcome is
+    decided the workers are terminated.
+
+    Parameters
+    ----------
+    game : UpDown
+        a game of upset-downset. (At most 60 nodes.)
+    workers : int (positive)
+        the number of worker processes.
+    size_exp : int, optional
+        the shared table has 2**size_exp entries. The default is 22.
+    shared_min_nodes : int, optional
+        only positions with at least this many nodes are shared between
+        workers. The default is None, in which case it is half the number
+        of nodes of 'game'.
+
+    Returns
+    -------
+    str
+        'Next', 'Previous', 'Up' or 'Down'. (See UpDown.outcome().)
+
+    '''
+    solver = OutcomeSolver(game)
+    # (keys in the shared table are (mask << 1 | player).)
+    assert len(solver.nodes) <= 60, 'The game is too large.'
+    if shared_min_nodes is None:
+        shared_min_nodes = len(solver.nodes) // 2
+    full = solver.full
+    # the options of each player (without repeats), in the order of the 
+    # serial search.
+    options = (
+        list(dict.fromkeys(full & ~solver.up_masks[x] 
+                           for x in solver.up_order 
+                           if (solver.up_playable >> x) & 1)),
+        list(dict.fromkeys(full & ~solver.down_masks[x] 
+                           for x in solver.down_order 
+                           if (solver.down_playable >> x) & 1))
+        )
+    # the number of tasks of each player yet to finish. (A player without
+    # moves loses moving first.)
+    pending = [len(options[UP]), len(options[DOWN])]
+    # the tasks of the players alternate, so both are answered as early as
+    # possible.
+    tasks = []
+    for k in range(max(pending)):
+        for player, opponent in ((UP, DOWN), (DOWN, UP)):
+            if k < len(options[player]):
+                tasks.append((player, options[player][k], opponent))
+    decided = RawArray('b', 2)
+    code = 0
+    table = SharedTable(size_exp)
+    try:
+        # (a Pool rather than a ProcessPoolExecutor: tasks still running 
+        # once the outcome is decided are terminated on exit.)
+        with Pool(workers, 
+                  initializer=_init_worker, 
+                  initargs=(solver, 
+                            table.name, 
+                            size_exp, 
+                            shared_min_nodes, 
+                            decided)
+                  ) as pool:
+            for player, result in pool.imap_unordered(_wins_first_in_worker,
+                                                      tasks):
+                if not pending[player]:
+                    continue
+                if result:
+                    pending[player] -= 1
+                else:
+                    # a winning move: the rest of the player's tasks are
+                    # not needed.
+                    code |= UP_WINS_FIRST if player == UP else DOWN_WINS_FIRST
+                    pending[player] = 0
+                if not pending[player]:
+                    decided[player] = 1
+                if not any(pending):
+                    break
+    finally:
+        table.close(unlink=True)
+
+    return OUTCOMES[code]
@@ -0,0 +1,424 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module holds versions of the algorithms in the digraph module for
+directed graphs on at most 64 nodes stored as packed adjacency matrices: an
+array 'rows' of n uint64 row masks, where bit j of rows[i] is set if and
+only if there is an edge i --> j. (These are the children masks of the
+bitDag module, stored in NumPy.) Node sets are uint64 masks as well. Every
+function also takes a batch of graphs: an array of shape (B, n) (with node
+set masks of shape (B,)), and works on all of them at once.
+"""
+import numpy as np
+
+# number of bits set in each byte
+_BYTE_POPCOUNT = np.array([bin(b).count('1') for b in range(256)],
+                          dtype=np.uint8)
+
+def _all_nodes(num_nodes):
+    return np.uint64((1 << num_nodes) - 1)
+
+def _bit(rows, k):
+    # boolean array: wether bit k of each entry of 'rows' is set.
+    return ((rows >> np.uint64(k)) & np.uint64(1)).astype(bool)
+
+def popcount(masks):
+    ''' Returns the number of bits set in each entry of 'masks'. (Byte table
+    lookup.)
+
+    Parameters
+    ----------
+    masks : numpy array
+        uint64 array.
+
+    Returns
+    -------
+    numpy array
+        int array of the same shape as 'masks'.
+
+    '''
+    masks = np.ascontiguousarray(masks, dtype='<u8')
+    counts = _BYTE_POPCOUNT[masks.view(np.uint8)]
+    return counts.reshape(masks.shape + (8,)).sum(axis=-1, dtype=np.int64)
+
+##############################################################################
+############################### CONVERSIONS ##################################
+##############################################################################
+
+def from_dict(G, num_nodes=None):
+    ''' Returns the packed adjacency matrix of the directed graph 'G'.
+
+    Parameters
+    ----------
+    G : dict
+        adjacency representation of a directed graph. (Adjacency lists keyed
+        by node.) Nodes are to be labelled by integers 0,...,63.
+    num_nodes : int, optional
+        the number of rows. The default is None, in which case it is one
+        more than the largest node.
+
+    Returns
+    -------
+    numpy array
+        uint64 array of shape ('num_nodes',).
+
+    '''
+    if num_nodes is None:
+        num_nodes = max(G, default=-1) + 1
+    assert num_nodes <= 64, 'Too many nodes to pack.'
+    rows = np.zeros(num_nodes, dtype=np.uint64)
+    for v in G:
+        mask = 0
+        for u in G[v]:
+            mask |= 1 << int(u)
+        rows[v] = mask
+    return rows
+
+def to_dict(rows, nodes=None):
+    ''' Returns the adjacency representation of the directed graph with
+    packed adjacency matrix 'rows'.
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (n,).
+    nodes : int, optional
+        mask of the nodes to be kept. The default is None, in which case all
+        of 0,...,n-1 are kept.
+
+    Returns
+    -------
+    dict
+        adjacency lists keyed by node.
+
+    '''
+    n = len(rows)
+    nodes = (1 << n) - 1 if nodes is None else int(nodes)
+    A = unpack(rows)
+    return {v: np.flatnonzero(A[v]).tolist() for v in range(n)
+            if (nodes >> v) & 1}
+
+def from_bitdag(bitdag, num_nodes=None, closure=False):
+    ''' Returns the packed adjacency matrix of the BitDag 'bitdag'. (See the
+    bitDag module.)
+
+    Parameters
+    ----------
+    bitdag : BitDag
+
+    num_nodes : int, optional
+        the number of rows. The default is None, in which case it is one
+        more than the largest node.
+    closure : bool, optional
+        if True, the packed transitive closure (descendant masks) is
+        returned instead. The default is False.
+
+    Returns
+    -------
+    numpy array
+        uint64 array of shape ('num_nodes',).
+
+    '''
+    if num_nodes is None:
+        num_nodes = bitdag.nodes.bit_length()
+    assert num_nodes <= 64, 'Too many nodes to pack.'
+    masks = bitdag.descendant_masks if closure else bitdag.children
+    rows = np.zeros(num_nodes, dtype=np.uint64)
+    for v, mask in masks.items():
+        rows[v] = mask
+    return rows
+
+def pack(A):
+    ''' Returns the packed adjacency matrices of the boolean adjacency
+    tensor 'A'. (See the batchDigraph module.)
+
+    Parameters
+    ----------
+    A : numpy array
+        boolean array of shape (B, n, n) or (n, n), n at most 64.
+
+    Returns
+    -------
+    numpy array
+        uint64 array of shape (B, n) or (n,).
+
+    '''
+    A = np.asarray(A, dtype=bool)
+    n = A.shape[-1]
+    assert n <= 64, 'Too many nodes to pack.'
+    padded = np.zeros(A.shape[:-1] + (64,), dtype=bool)
+    padded[..., :n] = A
+    packed = np.packbits(padded, axis=-1, bitorder='little')
+    return packed.view('<u8')[..., 0].astype(np.uint64)
+
+def unpack(rows, num_nodes=None):
+    ''' Returns the boolean adjacency tensor of the packed adjacency matrices
+    'rows'. (The inverse of pack().)
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    num_nodes : int, optional
+        the number of columns. The default is None, in which case it is n.
+
+    Returns
+    -------
+    numpy array
+        boolean array of shape (B, n, 'num_nodes') or (n, 'num_nodes').
+
+    '''
+    rows = np.ascontiguousarray(rows, dtype='<u8')
+    num_nodes = rows.shape[-1] if num_nodes is None else num_nodes
+    A = np.unpackbits(
+        rows[..., None].view(np.uint8),
+        axis=-1,
+        bitorder='little'
+        )
+    return A[..., :num_nodes].astype(bool)
+
+##############################################################################
+################################# KERNELS ####################################
+##############################################################################
+
+def sinks(rows, nodes=None):
+    ''' Returns the mask of all sinks. (A node is a sink if it has no
+    outgoing edges.)
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    nodes : numpy array (or int), optional
+        mask(s) of the nodes present, of shape (B,). The default is None, in
+        which case all of 0,...,n-1 are present.
+
+    Returns
+    -------
+    numpy array (or uint64)
+        mask(s) of all sinks.
+
+    '''
+    n = rows.shape[-1]
+    nodes = _all_nodes(n) if nodes is None else np.asarray(nodes, np.uint64)
+    weights = np.uint64(1) << np.arange(n, dtype=np.uint64)
+    empty = np.where(rows == 0, weights, np.uint64(0))
+    return np.bitwise_or.reduce(empty, axis=-1) & nodes
+
+def sources(rows, nodes=None):
+    ''' Returns the mask of all sources. (A node is a source if it has no
+    incoming edges.) (See sinks().)
+    '''
+    n = rows.shape[-1]
+    nodes = _all_nodes(n) if nodes is None else np.asarray(nodes, np.uint64)
+    # every node with a parent is in some row.
+    has_parent = np.bitwise_or.reduce(rows, axis=-1)
+    return nodes & ~has_parent
+
+def transpose(rows):
+    ''' Returns the packed adjacency matrices of the reverse graphs.
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+
+    Returns
+    -------
+    numpy array
+        uint64 array of the same shape as 'rows'.
+
+    '''
+    return pack(np.swapaxes(unpack(rows), -1, -2))
+
+def descendants(rows):
+    ''' Returns the packed transitive closures: bit j of the i-th returned
+    row is set if and only if there is a (nonempty) path i --> j. (Warshall
+    on row masks: n passes, one per intermediate node.)
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+
+    Returns
+    -------
+    numpy array
+        uint64 array of the same shape as 'rows'.
+
+    '''
+    R = np.array(rows, dtype=np.uint64)
+    for k in range(R.shape[-1]):
+        # every row reaching k reaches all k reaches.
+        R |= np.where(_bit(R, k), R[..., k, None], np.uint64(0))
+    return R
+
+def ancestors(rows):
+    ''' Returns the packed transitive closures of the reverse graphs: bit j
+    of the i-th returned row is set if and only if there is a (nonempty)
+    path j --> i. (See descendants().)
+    '''
+    return descendants(transpose(rows))
+
+def is_acyclic(rows, closure=None):
+    ''' Returns wether each graph is acyclic: no node reaches itself.
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    closure : numpy array, optional
+        the packed transitive closures, if already at hand. The default is
+        None.
+
+    Returns
+    -------
+    numpy array (or bool)
+        boolean array of shape (B,).
+
+    '''
+    R = descendants(rows) if closure is None else closure
+    n = R.shape[-1]
+    diagonal = np.uint64(1) << np.arange(n, dtype=np.uint64)
+    return ~((R & diagonal) != 0).any(axis=-1)
+
+def transitive_reduction(rows, closure=None):
+    ''' Returns the packed transitive reductions of the directed acyclic
+    graphs. (It is assumed that the graphs are acyclic, we do not check.)
+    An edge of the closure survives exactly when it is not the composite
+    of two edges of the closure.
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    closure : numpy array, optional
+        the packed transitive closures, if already at hand. The default is
+        None.
+
+    Returns
+    -------
+    numpy array
+        uint64 array of the same shape as 'rows'.
+
+    '''
+    R = descendants(rows) if closure is None else closure
+    two_step = np.zeros_like(R)
+    for k in range(R.shape[-1]):
+        two_step |= np.where(_bit(R, k), R[..., k, None], np.uint64(0))
+    return R & ~two_step
+
+def number_of_edges(rows):
+    ''' Returns the number of edges in each graph.
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+
+    Returns
+    -------
+    numpy array (or int)
+        int array of shape (B,).
+
+    '''
+    return popcount(rows).sum(axis=-1)
+
+def levels(rows, nodes=None):
+    ''' Returns the level of each node in the directed acyclic graphs: the
+    length of the longest path ending at the node. (It is assumed that the
+    graphs are acyclic, we do not check.) Levels are peeled off as the
+    sources of what remains.
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    nodes : numpy array (or int), optional
+        mask(s) of the nodes present, of shape (B,). The default is None, in
+        which case all of 0,...,n-1 are present.
+
+    Returns
+    -------
+    numpy array
+        int array of the same shape as 'rows'. (-1 for nodes not present.)
+
+    '''
+    n = rows.shape[-1]
+    remaining = _all_nodes(n) if nodes is None else \
+        np.asarray(nodes, np.uint64)
+    remaining = np.full(rows.shape[:-1], remaining, dtype=np.uint64)
+    level = np.full(rows.shape, -1, dtype=np.int64)
+    weights = np.uint64(1) << np.arange(n, dtype=np.uint64)
+    for l in range(n):
+        if not remaining.any():
+            break
+        level_set = sources(subgraph(rows, remaining), remaining)
+        level[(level_set[..., None] & weights) != 0] = l
+        remaining = remaining & ~level_set
+    return level
+
+def subgraph(rows, nodes):
+    ''' Returns the packed adjacency matrices of the subgraphs on the nodes
+    in 'nodes'. (Rows of nodes not present are zero.)
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    nodes : numpy array (or int)
+        mask(s) of the nodes to be kept, of shape (B,).
+
+    Returns
+    -------
+    numpy array
+        uint64 array of the same shape as 'rows'.
+
+    '''
+    nodes = np.asarray(nodes, dtype=np.uint64)
+    n = rows.shape[-1]
+    kept = _bit(nodes[..., None], np.arange(n, dtype=np.uint64))
+    return np.where(kept, rows & nodes[..., None], np.uint64(0))
+
+def relabel(rows, perm):
+    ''' Returns the packed adjacency matrices of the graphs with node i
+    relabelled perm[i]. (A row and column permutation.)
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    perm : numpy array
+        int array: a permutation of 0,...,n-1.
+
+    Returns
+    -------
+    numpy array
+        uint64 array of the same shape as 'rows'.
+
+    '''
+    inverse = np.argsort(perm)
+    A = unpack(rows)
+    return pack(A[..., inverse, :][..., inverse])
+
+def has_edge_between(rows, tails, heads):
+    ''' Returns wether there is an edge from a node in 'tails' to a node in
+    'heads'. (E.g., from any sink of one graph to any source of another.)
+
+    Parameters
+    ----------
+    rows : numpy array
+        uint64 array of shape (B, n) or (n,).
+    tails : numpy array (or int)
+        mask(s) of nodes, of shape (B,).
+    heads : numpy array (or int)
+        mask(s) of nodes, of shape (B,).
+
+    Returns
+    -------
+    numpy array (or bool)
+        boolean array of shape (B,).
+
+    '''
+    heads = np.asarray(heads, dtype=np.uint64)
+    return ((subgraph(rows, tails) & heads[..., None]) != 0).any(axis=-1)
@@ -19,6 +19,8 @@ paper Uniform Random Posets. Citation information:
 """
 import numpy as np
 import digraph
+import batchDigraph
+from bitDag import BitDag, bits, popcount
 
 def class_cardinality(G):
     ''' Returns the class cardinality of the DAG 'G' under the equivalence 
@@ -36,26 +38,150 @@ def class_cardinality(G):
     int
         the class cardinality of 'G'.
     '''
-    # get a list of the components for G
-    components = digraph.connected_components(G)
-    
-    # for each component, compute the difference between the nuber of
-    # edges in th transitive closure (li) and transitive reduction (ri)
-    # and keep a running sum.
-    component_sum = 0
-    for nodes in components:
-        subG = digraph.subgraph(G, nodes)
-        l_component = digraph.number_of_edges(
-            digraph.transitive_closure(subG)
-            )
-        r_component = digraph.number_of_edges(
-            digraph.transitive_reduction(subG)
-            )
-        component_sum += (l_component - r_component)
+    # the sum over the components of G of the difference between the 
+    # number of edges in the transitive closure (li) and transitive 
+    # reduction (ri) is the same difference for G itself, as no edges run 
+    # between components.
+    index = digraph.DagIndex(G)
+    component_sum = digraph.number_of_edges(index.transitive_closure) - \
+        digraph.number_of_edges(index.transitive_reduction)
         
     return pow(2, component_sum)
 
-def markov_step(Xt, class_card, num_nodes):
+class Reachability(object):
+    ''' Class for maintaining the transitive closure (descendant and 
+    ancestor bitmasks) and the transitive reduction (covering bitmasks) of 
+    the DAG in the markov chain, together with the number of edges in each, 
+    under single edge insertions and deletions. (See the bitDag module.)
+    
+    The edge (i,j) creates a cycle exactly when i is reachable from j, which 
+    is then a single bit test. Inserting or deleting (i,j) only changes the 
+    descendants and covers of nodes in the downset of i, so the change in 
+    class cardinality of a proposed transition is computed on that region 
+    alone.
+    '''
+    def __init__(self, G):
+        '''
+        Parameters
+        ----------
+        G : dict
+            adjacency representation of a directed acyclic graph. 
+            (Adjacency lists keyed by node.)
+
+        Returns
+        -------
+        None.
+
+        '''
+        bitdag = BitDag(G)
+        reduction = bitdag.transitive_reduction()
+        self.children = dict(bitdag.children)
+        self.parents = dict(bitdag.parents)
+        self.descendants = dict(bitdag.descendant_masks)
+        self.ancestors = dict(bitdag.ancestor_masks)
+        self.covers = dict(reduction.children)
+        self.closure_edges = sum(map(popcount, self.descendants.values()))
+        self.reduction_edges = reduction.number_of_edges()
+        
+    def class_cardinality(self):
+        ''' Returns the class cardinality of the DAG. (See 
+        class_cardinality().)
+        '''
+        return pow(2, self.closure_edges - self.reduction_edges)
+        
+    def creates_cycle(self, i, j):
+        ''' Returns wether adding the edge (i,j) creates a cycle. '''
+        return i == j or bool((self.descendants[j] >> i) & 1)
+    
+    def propose_add(self, i, j):
+        ''' Returns the transition adding the edge (i,j), without applying 
+        it. (It is assumed that no cycle is created.) Every node in the 
+        downset of i gains the upset of j as descendants.
+        
+        Returns
+        -------
+        tuple
+            (i, j, descendants, covers, closure change, reduction change):
+            'descendants' and 'covers' are the new masks keyed by the nodes 
+            in the downset of i, and the changes are those in the number of 
+            edges of the transitive closure and reduction, respectively.
+        '''
+        up_j = self.descendants[j] | (1 << j)
+        down_i = bits(self.ancestors[i] | (1 << i))
+        descendants = {a: self.descendants[a] | up_j for a in down_i}
+        return self._transition(
+            i, j, down_i, descendants, self.children[i] | (1 << j)
+            )
+    
+    def propose_remove(self, i, j):
+        ''' Returns the transition removing the edge (i,j), without applying 
+        it. The descendants of the nodes in the downset of i are recomputed 
+        in topological order. (See propose_add().)
+        '''
+        children_i = self.children[i] & ~(1 << j)
+        # a node has strictly more descendants than any of its children,
+        # so sorting by the number of descendants gives a reverse 
+        # topological ordering.
+        down_i = sorted(
+            bits(self.ancestors[i] | (1 << i)), 
+            key=lambda a: popcount(self.descendants[a])
+            )
+        descendants = {}
+        for a in down_i:
+            des = 0
+            for c in bits(children_i if a == i else self.children[a]):
+                des |= (1 << c) | descendants.get(c, self.descendants[c])
+            descendants[a] = des
+        return self._transition(i, j, down_i, descendants, children_i)
+    
+    def _transition(self, i, j, down_i, descendants, children_i):
+        closure_change = 0
+        reduction_change = 0
+        covers = {}
+        for a in down_i:
+            # a child c of a is a cover unless it is a descendant of another 
+            # child of a.
+            children = children_i if a == i else self.children[a]
+            redundant = 0
+            for c in bits(children):
+                redundant |= descendants.get(c, self.descendants[c])
+            covers[a] = children & ~redundant
+            closure_change += popcount(descendants[a]) - \
+                popcount(self.descendants[a])
+            reduction_change += popcount(covers[a]) - popcount(self.covers[a])
+        return i, j, descendants, covers, closure_change, reduction_change
+    
+    def apply(self, transition):
+        ''' Applies a proposed transition. (See propose_add() and 
+        propose_remove().) The ancestors of the nodes in the upset of j 
+        are updated as well.
+        '''
+        i, j, descendants, covers, closure_change, reduction_change = \
+            transition
+        # (j is not in the downset of i, its upset is unchanged.)
+        up_j = self.descendants[j] | (1 << j)
+        removed = (self.children[i] >> j) & 1
+        self.children[i] ^= 1 << j
+        self.parents[j] ^= 1 << i
+        self.descendants.update(descendants)
+        self.covers.update(covers)
+        self.closure_edges += closure_change
+        self.reduction_edges += reduction_change
+        if removed:
+            # sorting by the number of ancestors gives a topological 
+            # ordering.
+            for d in sorted(bits(up_j), 
+                            key=lambda d: popcount(self.ancestors[d])):
+                anc = 0
+                for p in bits(self.parents[d]):
+                    anc |= (1 << p) | self.ancestors[p]
+                self.ancestors[d] = anc
+        else:
+            down_i = self.ancestors[i] | (1 << i)
+            for d in bits(up_j):
+                self.ancestors[d] |= down_i
+
+def markov_step(Xt, class_card, num_nodes, reach=None):
     ''' Returns the DAG generated after one step of the Matrkov process 
     starting from the DAG 'Xt'.
     
@@ -67,7 +193,12 @@ def markov_step(Xt, class_card, num_nodes):
     num_nodes : int (nonegative)
         number of nodes in Xt
     class_card : int
-        the class cardinality of the DAG 'Xt'.
+        the class cardinality of the DAG 'Xt'. (Unused if 'reach' is 
+        passed, as it is maintained there.)
+    reach : Reachability, optional
+        the transitive closure and reduction of 'Xt', updated in place on 
+        accepted transitions. The default is None, in which case it is 
+        computed.
         
     Returns
     -------
@@ -76,39 +207,39 @@ def markov_step(Xt, class_card, num_nodes):
         which is the t+1-th step in the markov chain generating a
         random DAG.
     '''
-    # Randomly sample two integers from 0,...,n-1. 
-    i, j = np.random.choice(num_nodes, 2, replace=False)
+    if reach is None:
+        reach = Reachability(Xt)
+    # Randomly sample two distinct integers from 0,...,n-1. 
+    i = int(np.random.randint(num_nodes))
+    j = int(np.random.randint(num_nodes - 1))
+    if j >= i:
+        j += 1
 
     # check to see if the edge (i,j) is in X_t, if it is, probabilistically 
     # choose to move to the graph 'Z' created by removing (i,j) from Xt.
     # else, probabilistically choose to move to the graph 
-    # 'Y' created by adding it (as long as Y is acyclic).
-    Xt_class_card = class_card
-    if j in Xt[i]:
-        Xt[i].remove(j)
-        Z_class_card = class_cardinality(Xt)
-        prob = min(1 , Xt_class_card / Z_class_card)
-        choice = np.random.choice(['z','x'], p=[prob, 1-prob])
-        if choice == 'z':
-            class_card = Z_class_card
-        else:
-            Xt[i].append(j)
+    # 'Y' created by adding it (as long as Y is acyclic: i.e., as long as
+    # i is not reachable from j).
+    if (reach.children[i] >> j) & 1:
+        transition = reach.propose_remove(i, j)
+    elif not reach.creates_cycle(i, j):
+        transition = reach.propose_add(i, j)
     else:
-        # add the edge (i,j) to Xt if adding such an edge gives an 
-        # acyclic graph. otherwise, it will return the original graph Xt.
-        Xt[i].append(j)     
-        if not digraph.is_acyclic(Xt) :
-            Xt[i].remove(j) 
-        else:  
-            Y_class_card = class_cardinality(Xt)
-            prob = min(1 , Xt_class_card / Y_class_card)
-            choice = np.random.choice(['y','x'], p=[prob, 1-prob])
-            if choice == 'y':  
-                class_card = Y_class_card
-            else: 
-                Xt[i].remove(j) 
-                
+        transition = None
+    # the ratio of class cardinalities of Xt and the proposal is 
+    # 2^-(change in # closure edges - change in # reduction edges)
+    if transition is not None:
+        exponent = transition[4] - transition[5]
+        prob = 1 if exponent <= 0 else pow(2.0, -exponent)
+        if np.random.random() < prob:
+            reach.apply(transition)
+            if (reach.children[i] >> j) & 1:
+                Xt[i].append(j)
+            else:
+                Xt[i].remove(j)
+    
     Xt1 = Xt
+    class_card = reach.class_cardinality()
                 
     return Xt1, class_card
 
@@ -124,7 +255,8 @@ def markov_chain(G, num_steps, class_card=None):
     num_steps : int (nonnegative)
         number of steps in the markov chain. 
     class_card: int (nonegative)
-        the class cardinality of the DAG 'G'. If None, it will compute it
+        the class cardinality of the DAG 'G'. (Not needed: the class 
+        cardinality is maintained along the chain, see Reachability.)
         
     Returns
     -------
@@ -133,12 +265,10 @@ def markov_chain(G, num_steps, class_card=None):
         starting with the DAG  'G'.
     '''
     num_nodes = len(G)
-    if class_card is None:
-        G_class_card = class_cardinality(G)
-    else:
-        G_class_card = class_card
+    reach = Reachability(G)
+    G_class_card = reach.class_cardinality()
     for _ in range(num_steps):
-        G, G_class_card = markov_step(G, G_class_card, num_nodes)
+        G, G_class_card = markov_step(G, G_class_card, num_nodes, reach)
         
     return G, G_class_card
 
@@ -167,6 +297,9 @@ def uniform_random_dag(num_nodes,
         adjacency representation of the DAG from which to start the markov 
         process. (Adjacency lists keyed by node.) The default is the empty 
         DAG on 'num_nodes'. 
+    class_card : int, optional
+        the class cardinality of 'X0'. (Not needed: the class cardinality 
+        is maintained along the chain, see Reachability.)
         
     Returns
     -------
@@ -176,20 +309,187 @@ def uniform_random_dag(num_nodes,
     '''
     if X0 is None:
         X0 = {i:[] for i in range(num_nodes)}
-        X0_class_card = 1
-    else:
-        if class_card is None:
-            X0_class_card = class_cardinality(X0)
-        else:
-            X0_class_card = class_card
             
     num_steps = int(
         pow(num_nodes,exp) + extra_steps
         )      
-    G, _ = markov_chain(
-        X0, 
-        num_steps, 
-        class_card=X0_class_card
-        )
+    G, _ = markov_chain(X0, num_steps)
     
     return G
+
+class MarkovChains(object):
+    ''' Class for advancing K independent copies of the markov chain at 
+    once. The DAGs of the chains are kept as a boolean adjacency tensor of 
+    shape (K, n, n), together with their transitive closures and the number 
+    of edges in the closures and reductions, and every step (proposals, 
+    cycle tests, class cardinality ratios and acceptance) is vectorized 
+    over the chains. (See the batchDigraph module.)
+    
+    Adding the edge (i,j) joins the downset of i to the upset of j in the 
+    closure, which is a single outer product. Removing it may break paths 
+    anywhere below i, so the closures of the chains proposing a removal are 
+    recomputed (vectorized Warshall over those chains alone).
+    '''
+    def __init__(self, num_nodes, num_chains, X0=None):
+        '''
+        Parameters
+        ----------
+        num_nodes : int (at least 2)
+            number of nodes n in each DAG.
+        num_chains : int (positive)
+            number of chains K.
+        X0 : list, optional
+            adjacency representations of the 'num_chains' DAGs from which to 
+            start the chains. (Adjacency lists keyed by node.) The default 
+            is None, in which case every chain starts from the empty DAG.
+
+        Returns
+        -------
+        None.
+
+        '''
+        assert num_nodes > 1, 'The chains need at least two nodes.'
+        self.num_nodes = num_nodes
+        self.num_chains = num_chains
+        if X0 is None:
+            self.A = np.zeros((num_chains, num_nodes, num_nodes), dtype=bool)
+        else:
+            assert len(X0) == num_chains, \
+                'There must be one starting DAG per chain.'
+            self.A = batchDigraph.to_adjacency_batch(X0, num_nodes)
+        self.R = batchDigraph.transitive_closure(self.A)
+        assert batchDigraph.is_acyclic(self.A, self.R).all(), \
+            'The starting graphs must be acyclic.'
+        self.excess = self._excess(self.R)
+        
+    @staticmethod
+    def _excess(R):
+        # the number of edges in the transitive closures less those in the 
+        # transitive reductions: the log2 of the class cardinalities.
+        reduction = batchDigraph.transitive_reduction(R, R)
+        return batchDigraph.number_of_edges(R) - \
+            batchDigraph.number_of_edges(reduction)
+    
+    def class_cardinalities(self):
+        ''' Returns the class cardinalities of the DAGs of the chains. (See 
+        class_cardinality().)
+        
+        Returns
+        -------
+        list
+            ints, one per chain.
+        '''
+        return [pow(2, int(e)) for e in self.excess]
+        
+    def step(self):
+        ''' Advances every chain by one step of the markov process. (See 
+        markov_step().)
+        
+        Returns
+        -------
+        None.
+        
+        '''
+        K, n = self.num_chains, self.num_nodes
+        chains = np.arange(K)
+        # sample two distinct nodes for each chain.
+        i = np.random.randint(n, size=K)
+        j = np.random.randint(n - 1, size=K)
+        j += j >= i
+        # propose to remove (i,j) if it is present, and otherwise to add it 
+        # as long as i is not reachable from j.
+        remove = self.A[chains, i, j]
+        add = ~remove & ~self.R[chains, j, i]
+        proposed = np.flatnonzero(remove | add)
+        if not len(proposed):
+            return
+        i, j = i[proposed], j[proposed]
+        A = self.A[proposed]
+        A[np.arange(len(proposed)), i, j] ^= True
+        R = self.R[proposed]
+        # the closure gains the edges from the downset of i to the upset 
+        # of j on an addition.
+        adding = add[proposed]
+        a = np.flatnonzero(adding)
+        down_i = R[a, :, i[a]]
+        down_i[np.arange(len(a)), i[a]] = True
+        up_j = R[a, j[a], :]
+        up_j[np.arange(len(a)), j[a]] = True
+        R[a] |= down_i[:, :, None] & up_j[:, None, :]
+        r = np.flatnonzero(~adding)
+        if len(r):
+            R[r] = batchDigraph.transitive_closure(A[r])
+        # the ratio of class cardinalities of the chain and the proposal is
+        # 2^-(change in # closure edges - change in # reduction edges).
+        excess = self._excess(R)
+        exponent = excess - self.excess[proposed]
+        prob = np.exp2(-np.maximum(exponent, 0))
+        accepted = np.random.random(len(proposed)) < prob
+        k = proposed[accepted]
+        self.A[k] = A[accepted]
+        self.R[k] = R[accepted]
+        self.excess[k] = excess[accepted]
+        
+    def run(self, num_steps):
+        ''' Advances every chain by 'num_steps' steps of the markov process.
+        
+        Parameters
+        ----------
+        num_steps : int (nonnegative)
+            number of steps.
+        
+        Returns
+        -------
+        None.
+        
+        '''
+        for _ in range(num_steps):
+            self.step()
+            
+    def dags(self):
+        ''' Returns the DAGs of the chains.
+        
+        Returns
+        -------
+        list
+            adjacency representations of the 'num_chains' DAGs. (Adjacency 
+            lists keyed by node.)
+        '''
+        return [batchDigraph.from_adjacency(A) for A in self.A]
+
+def uniform_random_dags(num_nodes, 
+                        num_dags, 
+                        exp=2, 
+                        extra_steps=0, 
+                        X0=None):
+    ''' Returns 'num_dags' random DAGs on 'num_nodes' nodes, each the end of 
+    an independent markov chain as in uniform_random_dag(). The chains are 
+    run together, vectorized. (See MarkovChains.)
+    
+    Parameters
+    ----------
+    num_nodes : int (at least 2)
+        The number of nodes you want the returned DAGs to have.
+    num_dags : int (positive)
+        The number of DAGs (chains).
+    exp : int
+        The exponent on num_nodes determining the number of steps taken in 
+        the markov process. (See uniform_random_dag().) The default is 2.
+    extra_steps : int, optional
+        Use this to fine tune the number of steps taken in the markov chains. 
+        The default is 0.
+    X0 : list, optional
+        adjacency representations of the DAGs from which to start the markov 
+        chains, one per chain. (Adjacency lists keyed by node.) The default 
+        is the empty DAG on 'num_nodes' for every chain.
+        
+    Returns
+    -------
+    list
+        adjacency representations of the 'num_dags' DAGs. (Adjacency lists 
+        keyed by node.)
+    '''
+    chains = MarkovChains(num_nodes, num_dags, X0)
+    chains.run(int(pow(num_nodes, exp) + extra_steps))
+    
+    return chains.dags()
@@ -31,7 +31,8 @@ class SelfPlay(object):
             temp=TEMP, 
             temp_thrshld=TEMP_THRSHLD):
         '''Starts indefinite self-play loop. The games for self-play are 
-        generated via an ongoing Markov chain as described in randomDag.py.
+        generated in batches via GENERATOR_CHAINS ongoing Markov chains as 
+        described in randomDag.py. (See GameState.batch_state_generator().)
         The self-play processes are synchronized with one another, train 
         and evaluation processes via the 'replay_buffer' and 'update_signal', 
         respectively. 'replay_buffer' stores the self-play data and triggers 
@@ -71,8 +72,12 @@ class SelfPlay(object):
         self.agent.model.eval()
         # the action space...
         actions = np.arange(MAX_NODES)
-        # game state generator via an ongoing Markov chain
-        state_generator = GameState.state_generator(markov_exp)   
+        # game state generator via ongoing Markov chains, run together
+        state_generator = (
+            state 
+            for batch in GameState.batch_state_generator(markov_exp)
+            for state in batch
+            )
         # start indefinite self-play loop
         while True:     
             # check for updates
@@ -0,0 +1,273 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: This module builds and reads endgame tablebases: the exact outcomes
+of all games of upset-downset on at most k nodes, for small k. All posets
+(uncolored) on at most k nodes are enumerated up to isomorphism, and for
+each poset the outcomes of all 3^n colorings of its nodes are solved
+together, one numpy vector entry per coloring. A coloring is indexed by the
+colors of the nodes in the canonical order of the poset (see the
+canonicalForm module), so any two isomorphic colored games share an entry.
+
+The tablebase is written to a single file holding the sorted canonical keys
+of the posets, the offset of each posets block of outcomes, and the outcomes
+packed four to a byte (two bits each, as in the outcomeSolver module). The
+file is memory-mapped when read, so a lookup costs one canonical form, one
+binary search and one byte read, whatever the size of the table. (The
+canonical ordering of each dag looked up is cached, so looking up another
+coloring or a repeated position of the same dag is a single byte read.)
+
+The numbers of posets on 0,1,...,7 nodes are 1, 1, 2, 5, 16, 63, 318, 2045.
+
+Reference:
+    - https://oeis.org/A000112
+"""
+from bitDag import BitDag, bits
+from canonicalForm import canonical_form, certificate_key
+from outcomeSolver import OUTCOMES, UP_WINS_FIRST, DOWN_WINS_FIRST, UP
+import numpy as np
+
+# the first entry of the header of a tablebase file.
+MAGIC = int.from_bytes(b'UDTBASE1', 'little')
+HEADER_SIZE = 4
+# the most dags whose canonical orderings a Tablebase keeps.
+MAX_CACHED_FORMS = 2**16
+
+def posets(max_nodes):
+    ''' Returns all posets on at most 'max_nodes' nodes, up to isomorphism.
+    Every poset on n+1 nodes is a poset on n nodes with a new maximal node
+    added above an antichain (the nodes it covers).
+
+    Parameters
+    ----------
+    max_nodes : int (nonnegative)
+        the largest number of nodes.
+
+    Returns
+    -------
+    list
+        the list of posets on n nodes is at index n. Each poset is a
+        transitively reduced dag on the nodes 0,...,n-1, as a dict
+        of adjacency lists keyed by node.
+
+    '''
+    all_posets = [[{}]]
+    for n in range(max_nodes):
+        found = {}
+        for poset in all_posets[-1]:
+            bitdag = BitDag(poset)
+            for antichain in range(1 << n):
+                if any(bitdag.descendants(x) & antichain
+                       for x in bits(antichain)):
+                    continue
+                extended = {x: list(children)
+                            for x, children in poset.items()}
+                extended[n] = []
+                for x in bits(antichain):
+                    extended[x].append(n)
+                certificate, _ = canonical_form(extended)
+                found.setdefault(certificate, extended)
+        all_posets.append(list(found.values()))
+
+    return all_posets
+
+def _solve_colorings(poset, order):
+    ''' Returns the outcome codes of all colorings of the nodes of 'poset':
+    the coloring where the node order[i] has color c_i has index
+    sum((c_i + 1) * 3**i).
+    '''
+    n = len(order)
+    bitdag = BitDag(poset)
+    position = {x: i for i, x in enumerate(order)}
+    # the color of each node in each coloring.
+    digits = (np.arange(3**n)[:, None] // 3**np.arange(n)) % 3 - 1
+    up_ok = {x: digits[:, position[x]] != -1 for x in order}
+    down_ok = {x: digits[:, position[x]] != 1 for x in order}
+    up_masks = {x: bitdag.upset(x) for x in order}
+    down_masks = {x: bitdag.downset(x) for x in order}
+    nothing = np.zeros(3**n, dtype=bool)
+    table = {}
+
+    def solve(mask):
+        # wether Up, resp. Down, wins moving first, in every coloring.
+        result = table.get(mask)
+        if result is not None:
+            return result
+        up_wins = nothing
+        down_wins = nothing
+        for x in bits(mask):
+            up_wins = up_wins | (up_ok[x] & ~solve(mask & ~up_masks[x])[1])
+            down_wins = down_wins | \
+                (down_ok[x] & ~solve(mask & ~down_masks[x])[0])
+        table[mask] = (up_wins, down_wins)
+        return table[mask]
+
+    up_wins, down_wins = solve(bitdag.nodes)
+    return (up_wins * UP_WINS_FIRST + down_wins * DOWN_WINS_FIRST) \
+        .astype(np.uint8)
+
+def build_tablebase(path, max_nodes):
+    ''' Builds the tablebase of the outcomes of all games of upset-downset
+    on at most 'max_nodes' nodes and writes it to the file 'path'.
+
+    Parameters
+    ----------
+    path : str
+        the file to write.
+    max_nodes : int (nonnegative)
+        the largest number of nodes. (7 takes seconds and about a megabyte,
+        and each further node multiplies both by a few hundred.)
+
+    Returns
+    -------
+    Tablebase
+        the tablebase read from 'path'.
+
+    '''
+    keys = []
+    blocks = []
+    for poset_list in posets(max_nodes):
+        for poset in poset_list:
+            certificate, order = canonical_form(poset)
+            keys.append(certificate_key(certificate))
+            blocks.append(_solve_colorings(poset, order))
+    sort = np.argsort(np.array(keys, dtype=np.uint64), kind='stable')
+    keys = np.array(keys, dtype=np.uint64)[sort]
+    assert len(np.unique(keys)) == len(keys), 'Canonical key collision.'
+    blocks = [blocks[i] for i in sort]
+    offsets = np.cumsum([0] + [len(block) for block in blocks[:-1]])
+    codes = np.concatenate(blocks)
+    # four codes to a byte, the first in the lowest two bits.
+    padded = np.zeros(-(-len(codes) // 4) * 4, dtype=np.uint8)
+    padded[:len(codes)] = codes
+    padded = padded.reshape(-1, 4) << np.array([0, 2, 4, 6], dtype=np.uint8)
+    packed = np.bitwise_or.reduce(padded, axis=1).astype(np.uint8)
+    header = np.array([MAGIC, max_nodes, len(keys), len(codes)],
+                      dtype=np.uint64)
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(keys.tobytes())
+        f.write(offsets.astype(np.uint64).tobytes())
+        f.write(packed.tobytes())
+
+    return Tablebase(path)
+
+class Tablebase(object):
+    ''' Class for reading a tablebase file written by build_tablebase().
+    (The file is memory-mapped.)
+    '''
+    def __init__(self, path):
+        '''
+        Parameters
+        ----------
+        path : str
+            a tablebase file.
+
+        Returns
+        -------
+        None.
+
+        '''
+        header = np.fromfile(path, dtype=np.uint64, count=HEADER_SIZE)
+        assert len(header) == HEADER_SIZE and header[0] == MAGIC, \
+            f'{path} is not a tablebase file.'
+        self.path = path
+        self.max_nodes = int(header[1])
+        num_posets = int(header[2])
+        num_codes = int(header[3])
+        start = 8 * HEADER_SIZE
+        self.keys = np.memmap(path, dtype=np.uint64, mode='r',
+                              offset=start, shape=(num_posets,))
+        start += 8 * num_posets
+        self.offsets = np.memmap(path, dtype=np.uint64, mode='r',
+                                 offset=start, shape=(num_posets,))
+        start += 8 * num_posets
+        self.packed = np.memmap(path, dtype=np.uint8, mode='r',
+                                offset=start, shape=(-(-num_codes // 4),))
+        self._forms = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def code(self, game):
+        ''' Returns the outcome code of the game of upset-downset 'game'
+        (see the outcomeSolver module), or None if the game is too large.
+
+        Parameters
+        ----------
+        game : UpDown
+            a game of upset-downset.
+
+        Returns
+        -------
+        int or None
+
+        '''
+        if len(game) > self.max_nodes:
+            return None
+        # the canonical ordering depends only on the (labelled) dag, which
+        # repeats often in search, so the block and ordering of each dag are
+        # cached.
+        bitdag = game.bitdag
+        labelled = tuple(bitdag.children.items())
+        form = self._forms.get(labelled)
+        if form is None:
+            certificate, order = canonical_form(bitdag)
+            key = np.uint64(certificate_key(certificate))
+            i = int(np.searchsorted(self.keys, key))
+            assert i < len(self.keys) and self.keys[i] == key, \
+                'The game is missing from the tablebase.'
+            if len(self._forms) >= MAX_CACHED_FORMS:
+                self._forms.clear()
+            form = (int(self.offsets[i]), order)
+            self._forms[labelled] = form
+        entry, order = form
+        coloring = game.coloring
+        place = 1
+        for x in order:
+            entry += (coloring[x] + 1) * place
+            place *= 3
+        return (int(self.packed[entry >> 2]) >> 2*(entry & 3)) & 3
+
+    def outcome(self, game):
+        ''' Returns the outcome of the game of upset-downset 'game' (see
+        UpDown.outcome()), or None if the game is too large.
+        '''
+        code = self.code(game)
+        return None if code is None else OUTCOMES[code]
+
+    def wins_first(self, game, player):
+        ''' Returns wether 'player' wins the game of upset-downset 'game'
+        moving first, or None if the game is too large.
+        '''
+        code = self.code(game)
+        if code is None:
+            return None
+        return bool(code & (UP_WINS_FIRST if player == UP
+                            else DOWN_WINS_FIRST))
+
+# the tablebase consulted by UpDown.outcome() and GameState.known_value().
+_ACTIVE = None
+
+def use(path):
+    ''' Sets the tablebase consulted by UpDown.outcome() and
+    GameState.known_value() (and so by the MCTS of the Agent class).
+
+    Parameters
+    ----------
+    path : str or None
+        a tablebase file, or None to stop consulting a tablebase.
+
+    Returns
+    -------
+    Tablebase or None
+
+    '''
+    global _ACTIVE
+    _ACTIVE = None if path is None else Tablebase(path)
+    return _ACTIVE
+
+def active():
+    ''' Returns the tablebase set by use(), or None.
+    '''
+    return _ACTIVE
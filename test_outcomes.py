@@ -0,0 +1,74 @@
+"""
+@author: Charles Petersen and Jamison Barsotti
+
+NOTE: These tests check the outcome solvers against a direct search of the
+options of small random games (see flat_outcome()): the bitmask solver, its
+parallel mode, the outcomes of sums and negatives of games (see the
+gameExpression module) and the values of Nim games.
+"""
+from outcomeSolver import OutcomeSolver, parallel_outcome
+from randomUpDown import RandomGame
+from nimUpDown import NimGame
+import gameValue
+import numpy as np
+import pytest
+
+def flat_outcome(game):
+    ''' Returns the outcome of 'game' by searching its options directly
+    (through UpDown.up_play() and UpDown.down_play()).
+    '''
+    def wins_first(G, player):
+        if player == 'up':
+            return any(not wins_first(G.up_play(x), 'down')
+                       for x in G.up_nodes())
+        return any(not wins_first(G.down_play(x), 'up')
+                   for x in G.down_nodes())
+    up, down = wins_first(game, 'up'), wins_first(game, 'down')
+    return {(True, True): 'Next',
+            (True, False): 'Up',
+            (False, True): 'Down',
+            (False, False): 'Previous'}[(up, down)]
+
+def random_games(num_games, num_nodes, seed):
+    np.random.seed(seed)
+    return [RandomGame(num_nodes, RGB=True) for _ in range(num_games)]
+
+@pytest.mark.parametrize('seed', range(4))
+def test_outcome_solver(seed):
+    for G in random_games(5, 7, seed):
+        assert OutcomeSolver(G).outcome() == flat_outcome(G)
+        assert G.outcome() == flat_outcome(G)
+
+def test_parallel_outcome():
+    for G in random_games(3, 8, 0):
+        assert parallel_outcome(G, 2) == flat_outcome(G)
+
+@pytest.mark.parametrize('seed', range(4))
+def test_expressions(seed):
+    G, H = random_games(2, 5, seed)
+    assert (G + H).outcome() == flat_outcome((G + H).materialize())
+    assert (G - H).outcome() == flat_outcome((G - H).materialize())
+    assert (-G).outcome() == flat_outcome(-G)
+    assert (-(G + H)).outcome(workers=2) == \
+        flat_outcome((-(G + H)).materialize())
+    # through values, once the values of the terms are known.
+    G.value(), H.value()
+    assert (G + H).outcome() == flat_outcome((G + H).materialize())
+
+@pytest.mark.parametrize('heaps', [[1], [3], [1, 2], [1, 2, 3], [2, 3, 4]])
+def test_nim(heaps):
+    nim_sum = 0
+    for heap in heaps:
+        nim_sum ^= heap
+    N = NimGame(heaps)
+    assert N.value() is gameValue.nimber(nim_sum)
+    assert N.outcome() == flat_outcome(N)
+    assert OutcomeSolver(N).outcome() == N.outcome()
+
+def test_nimbers():
+    for n in range(6):
+        assert gameValue.nimber(n).outcome() == \
+            ('Previous' if n == 0 else 'Next')
+        for m in range(6):
+            assert gameValue.add(gameValue.nimber(n), gameValue.nimber(m)) \
+                is gameValue.nimber(n ^ m)
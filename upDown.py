@@ -3,12 +3,36 @@
 """
 
 import digraph 
+import csrDigraph
+from bitDag import BitDag, bits
+from canonicalForm import canonical_key
+from outcomeSolver import OutcomeSolver
+import gameValue
+import gameExpression
+import tablebase
 from upDownPlot import UpDownPlot
+from collections.abc import Mapping
 import random                                              
 import matplotlib.pyplot as plt
 from IPython.display import clear_output
 import time
 
+class _NegatedColoring(Mapping):
+    ''' A read-only view of the opposite of a coloring: color keyed by node,
+    negated on lookup. (The coloring of the negative of a game.)
+    '''
+    def __init__(self, coloring):
+        self.coloring = coloring
+
+    def __getitem__(self, x):
+        return -self.coloring[x]
+
+    def __iter__(self):
+        return iter(self.coloring)
+
+    def __len__(self):
+        return len(self.coloring)
+
 class UpDown(object):
     ''' Abstract class for construction of an upset-downset game from a 
     directed acyclic graph with blue-green-red node coloring. 
@@ -17,11 +41,12 @@ class UpDown(object):
         '''
         Parameters
         ----------
-        dag : dict
+        dag : dict or BitDag
             djacecny representation of a directed acyclic graph. 
             (Adjacecny lists keyed by node.) Nodes are to be labelled by
             nonnegative integers. All nodes must be a key in the dict. If a 
-            node is a sink, its value is to be an empty list.
+            node is a sink, its value is to be an empty list. (A BitDag 
+            is used as is, see the bitDag module.)
         coloring : dict, optional
             a coloring of the nodes of 'dag': color keyed by node.
             (The colors are 1 (resp. 0,-1) for blue (resp. green, red).
@@ -37,27 +62,102 @@ class UpDown(object):
         None.
 
         '''
-        if reduced is False:
-            assert digraph.is_acyclic(dag), 'Check the dag. There is a cycle.'
-            self.dag = digraph.transitive_reduction(dag)
+        # the game is stored internally as a BitDag, the adjacency lists in
+        # 'dag' are only exported when asked for.
+        if isinstance(dag, BitDag):
+            self._dag = None
+            bitdag = dag
         else:
-            self.dag = dag
+            self._dag = dag
+            bitdag = BitDag(dag)
+        if reduced is False:
+            assert bitdag.is_acyclic(), 'Check the dag. There is a cycle.'
+            bitdag = bitdag.transitive_reduction()
+            self._dag = None
+        self.bitdag = bitdag
         if coloring is None:
-            self.coloring = {x:0 for x in self.dag}
+            self.coloring = {x:0 for x in bitdag}
         else:
             self.coloring = coloring
+        self._init_caches()
+        
+    def _init_caches(self):
+        # everything computed from the dag and coloring when first needed.
+        self._index = None
+        # the layout is only computed when a plot is drawn. Until then an 
+        # option (resp. the negative) refers to the game whose layout it 
+        # restricts (resp. flips). (See the layout property.)
         self._layout = None
+        self._layout_parent = None
+        self._layout_flipped = False
+        # a function returning the layout, for games built from others.
+        self._layout_source = None
+        self._key = None
+        self._value = None
+        
+    @property
+    def dag(self):
+        if self._dag is None:
+            self._dag = self.bitdag.to_dict()
+        return self._dag
+    
+    @dag.setter
+    def dag(self, x):
+        self.bitdag = BitDag(x)
+        self._dag = x
+        self._index = None
+        self._key = None
+        self._value = None
+        
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = digraph.DagIndex(self.dag)
+        return self._index
         
     @property
     def layout(self):
         if self._layout is None:
-            self._layout = digraph.hasse_layout(self.dag)
+            parent = self._layout_parent
+            if self._layout_source is not None:
+                self._layout = self._layout_source()
+            elif parent is None:
+                # (the layout of hasse_layout() in the digraph module, 
+                # computed on arrays.)
+                graph = csrDigraph.CSRGraph.from_dict(self.dag)
+                x, y = csrDigraph.hasse_layout(graph)
+                self._layout = dict(zip(graph.labels.tolist(), 
+                                        zip(x.tolist(), y.tolist())))
+            elif self._layout_flipped:
+                self._layout = parent._flipped_layout()
+            else:
+                parent_layout = parent.layout
+                self._layout = {x: parent_layout[x] for x in self.bitdag}
         return self._layout
     
     @layout.setter
     def layout(self, x):
         self._layout = x
         
+    def _inherit_layout(self, option):
+        # the layout of 'option' (on a subset of the nodes) is the 
+        # restriction of the layout of the nearest game, up the chain of 
+        # options, which will not compute one of its own.
+        parent = self
+        if self._layout is None and self._layout_parent is not None \
+            and not self._layout_flipped:
+            parent = self._layout_parent
+        option._layout_parent = parent
+        option._layout_flipped = False
+        
+    @property
+    def key(self):
+        # games isomorphic as colored posets share the same key. (See the 
+        # canonicalForm module.)
+        if self._key is None:
+            self._key = canonical_key(self.bitdag, self.coloring)
+        return self._key
+        
 ##############################################################################
 ################################## COLORING ###################################
 ##############################################################################
@@ -71,7 +171,7 @@ class UpDown(object):
             all blue/green nodes.
 
         '''
-        return list(filter(lambda x : self.coloring[x] in {0,1}, self.dag))
+        return list(filter(lambda x : self.coloring[x] in {0,1}, self.bitdag))
     
     def down_nodes(self):
         '''Returns all red/green nodes
@@ -82,7 +182,7 @@ class UpDown(object):
             all red/green nodes
 
         '''
-        return list(filter(lambda x : self.coloring[x] in {-1,0}, self.dag)) 
+        return list(filter(lambda x : self.coloring[x] in {-1,0}, self.bitdag)) 
                
     def color_sum(self):
         '''Returns the sum over all node colors.
@@ -113,10 +213,7 @@ class UpDown(object):
             all nodes reachable from 'x', including 'x' itself. 
 
         '''
-        upset = digraph.descendants(self.dag, x)
-        upset.append(x)
-        
-        return upset
+        return bits(self.bitdag.upset(x))
     
     def downset(self, x):
         '''Returns the downset of node 'x'.
@@ -132,10 +229,7 @@ class UpDown(object):
             all nodes having a path to node 'x', including node 'x' itself.
 
         '''
-        downset = digraph.ancestors(self.dag, x)
-        downset.append(x)
-        
-        return downset
+        return bits(self.bitdag.downset(x))
 
     def up_play(self, x):
         '''Returns the upset-downset game left after Up plays node 'x'.
@@ -152,12 +246,14 @@ class UpDown(object):
 
         '''
         assert x in self.up_nodes()
-        option_nodes = list(set(self.dag) - set(self.upset(x)))
-        option_coloring = {node: color for node, color in 
-                           self.coloring.items() if node in option_nodes}
-        option_dag = digraph.subgraph(self.dag, option_nodes) 
+        # the complement of an upset is convex, so the option inherits
+        # all reachability information.
+        option_mask = self.bitdag.nodes & ~self.bitdag.upset(x)
+        option_nodes = bits(option_mask)
+        option_coloring = {node: self.coloring[node] for node in option_nodes}
+        option_dag = self.bitdag.restrict(option_mask)
         option = UpDown(option_dag, option_coloring, reduced=True)
-        option.layout = {x: self.layout[x] for x in option_nodes}
+        self._inherit_layout(option)
         
         return option
     
@@ -176,16 +272,56 @@ class UpDown(object):
 
         '''
         assert x in self.down_nodes()
-        option_nodes = list(set(self.dag) - set(self.downset(x)))
-        option_coloring = {node: color for node, color in 
-                           self.coloring.items() if node in option_nodes}
-        option_dag = digraph.subgraph(self.dag, option_nodes) 
+        # the complement of a downset is convex, so the option inherits
+        # all reachability information.
+        option_mask = self.bitdag.nodes & ~self.bitdag.downset(x)
+        option_nodes = bits(option_mask)
+        option_coloring = {node: self.coloring[node] for node in option_nodes}
+        option_dag = self.bitdag.restrict(option_mask)
         option = UpDown(option_dag, option_coloring, reduced=True)
-        option.layout = {x: self.layout[x] for x in option_nodes}
+        self._inherit_layout(option)
         
-        return UpDown(option_dag, option_coloring, reduced=True)
+        return option
            
               
+    def components(self):
+        '''Returns the nodes of each connected component of the game. (The 
+        game is the sum of the games on its components.) Options inherit 
+        the components of the game, only the component of the node played 
+        is split.
+        
+        Returns
+        -------
+        list
+            lists of nodes in each connected component, ordered by their 
+            smallest node.
+
+        '''
+        return [bits(component) for component in self.bitdag.components()]
+    
+    def summands(self):
+        '''Returns the games on the connected components of the game. (The 
+        game is their sum.)
+        
+        Returns
+        -------
+        list
+            UpDown games, one for each connected component.
+
+        '''
+        summands = []
+        for component in self.bitdag.components():
+            nodes = bits(component)
+            summand = UpDown(
+                self.bitdag.restrict(component),
+                {x: self.coloring[x] for x in nodes},
+                reduced=True
+                )
+            self._inherit_layout(summand)
+            summands.append(summand)
+            
+        return summands
+           
 ##############################################################################    
 ###############################   PLOT  ######################################
 ##############################################################################
@@ -348,10 +484,23 @@ class UpDown(object):
 ########### UPDOWNS PARTIALLY ORDERED ABELIAN GROUP STRUCTURE ################
 ##############################################################################
     
-    def outcome(self):
-        ''' Returns the outcome of the game. (Due to the possibly huge number 
-        of suboptions, for all but relitively small games, this algorithm is 
-        extremely slow.)
+    def outcome(self, workers=None):
+        ''' Returns the outcome of the game. (A connected game is solved 
+        exactly on bitmasks of the nodes remaining, see the outcomeSolver 
+        module. Due to the possibly huge number of suboptions, this is slow
+        for large games. Small games are looked up in the tablebase set by 
+        tablebase.use(), if any, and games whose components are all in the
+        families of gameValue.classify() (chains, complete bipartite, one 
+        color) or already valued are solved from the values of their
+        components, see gameValue.known_value().)
+        
+        Parameters
+        ----------
+        workers : int, optional
+            accepted for compatibility, the game is solved in this process.
+            (parallel_outcome() in the outcomeSolver module solves a game 
+            across a process pool, but has not been shown faster than the 
+            serial search.) The default is None.
         
         Returns
         -------
@@ -362,86 +511,87 @@ class UpDown(object):
             'Down', Down can force a win. (Playing first or second). 
 
         '''
-        def get_outcome(G, nodes, memo):
-            num_nodes = len(G)
-            num_edges = digraph.number_of_edges(G.dag)
-            color_sum = G.color_sum()
-            # possible outcomes
-            N, P, L, R = 'Next', 'Previous', 'Up', 'Down'
-            # base cases/heuristics for recursion (no nodes or no edges):
-            # no nodes, second player win.
-            if num_nodes == 0:
-                out = P
-            # nonzero # of nodes and all are blue,  Up wins.
-            elif color_sum == num_nodes:
-                out = L
-            # nozero # of nodes and all are red,  Down wins.
-            elif color_sum == -num_nodes:
-               out = R
-            # nonzero # of nodes, but no edges:
-            elif num_edges == 0:
-                if color_sum == 0:
-                    # no edges, equal # of blue and red nodes, even # of 
-                    # nodes, second player win.
-                    if num_nodes%2 == 0:
-                        out = P
-                    # no edges, equal # of blue and red nodes, odd # of 
-                    # nodes, second player win.
-                    else:
-                        out = N
-                # no edges, more blue nodes than red, Up wins
-                elif color_sum > 0:
-                    out = L
-                # no edges, more red nodes than blue, Down wins
-                else:
-                    out = R
-            # w/ memoization, recursively find outcome of all of G's options.
-            else:
-                # store outcomes of G's options:
-                up_outcomes = set()
-                down_outcomes = set()
-                # determine the outcome of all of G's options:
-                for x in G.up_nodes():
-                    GL = G.up_play(x)
-                    GLnodes = frozenset(GL.dag)
-                    GLout = outcomes_store[GLnodes] if GLnodes in \
-                        outcomes_store else \
-                            get_outcome(GL, GLnodes, outcomes_store)
-                    up_outcomes.add(GLout)
-                    del GL
-                for x in G.down_nodes():
-                    GR = G.down_play(x)
-                    GRnodes = frozenset(GR.dag)
-                    GRout = outcomes_store[GRnodes] if GRnodes in \
-                        outcomes_store else \
-                            get_outcome(GR, GRnodes, outcomes_store)
-                    down_outcomes.add(GRout)
-                    del GR
-                # determine outcome of G via the outcomes of the options:
-                # first player to move wins
-                if ({P, L} & up_outcomes) and ({P,R} & down_outcomes):
-                    out = N
-                # second player to move wins
-                elif not ({P, L} & up_outcomes) and not ({P, R} & down_outcomes):
-                    out = P
-                # up wins no matter who moves first
-                elif ({P, L} & up_outcomes) and not ({P,R} & down_outcomes):
-                    out = L
-                # down wins no matter who moves first
-                elif not ({P, L} & up_outcomes)  and ({P,R} & down_outcomes):
-                    out = R
-            # memoize the outcome
-            outcomes_store[nodes] = out
-           
-            return out
-            
-        # store nodes of the game to a hashable object
-        nodes = frozenset(self.dag)
-        # recursively find the outcome of the game by determining 
-        # the outcome of each of the games options (and memoizing).
-        outcomes_store = {}
+        table = tablebase.active()
+        if table is not None:
+            outcome = table.outcome(self)
+            if outcome is not None:
+                return outcome
+        solver = OutcomeSolver(self)
+        # the values of the components are only used if known without 
+        # search, the bitmask solver is faster otherwise.
+        if len(self.bitdag.components()) > 1:
+            known = gameValue.known_value(self, solver)
+        else:
+            known = gameValue.closed_form_value(
+                solver.full, 
+                solver.up_masks, 
+                solver.down_masks, 
+                solver.blue, 
+                solver.red
+                )
+        if known is not None:
+            return known.outcome()
+        return solver.outcome()
+    
+    def winning_moves(self):
+        ''' Returns the winning moves of each player, moving first. (See 
+        the outcomeSolver module.)
+        
+        Returns
+        -------
+        up_moves : list
+            the nodes Up may play to win moving first. (Empty if there are 
+            none.)
+        down_moves : list
+            the nodes Down may play to win moving first. (Empty if there 
+            are none.)
+
+        '''
+        return OutcomeSolver(self).winning_moves()
+    
+    def solve_all(self):
+        ''' Returns the outcomes and best moves of all positions of the game
+        reachable in play, solved in one vectorized bottom-up pass. (See 
+        OutcomeSolver.solve_all().)
+        
+        Returns
+        -------
+        SolutionTable
+            positions are bitmasks over the nodes of the game in the order
+            of its nodes attribute.
+
+        '''
+        return OutcomeSolver(self).solve_all()
+    
+    def value(self):
+        ''' Returns the value of the game in canonical form, as a short 
+        partizan combinatorial game: the sum of the values of its 
+        components. (See the gameValue module. Values of components are 
+        cached by their canonical keys and shared between games.)
+        
+        Returns
+        -------
+        Value
+            the canonical value. Equal games have identical values.
+
+        '''
+        if self._value is None:
+            self._value = gameValue.game_value(self)
+        return self._value
+    
+    def known_value(self):
+        ''' Returns the value of the game if it is known without search: 
+        already computed, or the sum of values of components in closed form
+        or cached (see gameValue.known_value()). Returns None otherwise.
         
-        return get_outcome(self, nodes, outcomes_store)
+        Returns
+        -------
+        Value or None
+
+        '''
+        if self._value is None:
+            self._value = gameValue.known_value(self, OutcomeSolver(self))
+        return self._value
     
     def __neg__(self):                
         '''Returns the negative of the game. 
@@ -452,28 +602,37 @@ class UpDown(object):
             the upset-downset game on the reverse directed acyclic graph
             and opposite coloring.
 
+        NOTE: the negative is a view of the game: its BitDag shares all 
+        masks with the game (with the roles of upsets and downsets swapped, 
+        see BitDag.reverse()) and its coloring negates colors on lookup. Its
+        adjacency lists and its (flipped) layout are only built when asked 
+        for.
+
         '''
-        # get reversed graph and inverted coloring
-        dual = digraph.reverse(self.dag)
-        reverse_coloring = {x: -self.coloring[x] for x in self.dag}
-        # get layout of the negative
-        components = digraph.connected_components(self.dag)
-        levels_dict = digraph.longest_path_lengths(
-            self.dag, 
-            direction = 'incoming'
-            )
+        dual = self.bitdag.reverse()
+        if isinstance(self.coloring, _NegatedColoring):
+            reverse_coloring = self.coloring.coloring
+        else:
+            reverse_coloring = _NegatedColoring(self.coloring)
+        # instantiate game, its layout is flipped when first needed.
+        negative = UpDown(dual, reverse_coloring, reduced=True)
+        negative._layout_parent = self
+        negative._layout_flipped = True
+        
+        return negative
+    
+    def _flipped_layout(self):
+        # the layout of the negative: each component is flipped upside down.
+        levels_dict = self.index.levels
         flipped_layout = {}
-        for component in components:
+        for component in self.components():
             height = max(levels_dict[x] for x in component)
             flipped_layout.update(
                 {x: (self.layout[x][0], 
                      height-self.layout[x][1]) for x in component}
                 ) 
-        # instantiate game and set layout
-        negative = UpDown(dual, reverse_coloring, reduced=True)
-        negative.layout = flipped_layout
         
-        return negative
+        return flipped_layout
 
     def __add__(self, other):              
         '''Returns the (disjunctive) sum of games. **Relabels elements in 'other'
@@ -486,44 +645,18 @@ class UpDown(object):
 
         Returns
         -------
-        UpDown
+        Sum
             The upset-downset game on the disjoint union of directed acyclic 
-            graphs with unchanged colorings.
+            graphs with unchanged colorings. (A lazy expression, only 
+            materialized into an UpDown when needed, see the gameExpression 
+            module.)
             
         Note: the sum retains all nodes ('other' being relabelled), edges 
             and coloring from both 'self' and 'other' with no new edges added 
             between 'self' and 'other'
 
         '''
-        # initialze dag in sum and update with selfs relations
-        sum_dag = {}
-        sum_dag.update(self.dag)
-        # initialze coloring in sum and update with selfs relations
-        sum_coloring = {}
-        sum_coloring.update(self.coloring)
-        # relabelling for other.
-        n = len(self)
-        # relabel other
-        relabel_map = {i : i+n for i in other.dag}
-        other_relabel = digraph.relabel(other.dag, relabel_map)
-        # update dag in sum with others nodes/edges
-        sum_dag.update(other_relabel)
-        # update coloring of sum with others colors
-        for x in relabel_map:
-            y = relabel_map[x]
-            sum_coloring[y] = other.coloring[x]
-        # get the layout of the sum
-        largest_x = max(x[0] for x in self.layout.values())
-        sum_layout = {x:self.layout[x] for x in self.dag}
-        sum_layout.update(
-            {relabel_map[x]: (other.layout[x][0]+largest_x, 
-                 other.layout[x][1]) for x in other.dag}
-                 )
-        # instantiate the game and set the layout
-        sum_game = UpDown(sum_dag, sum_coloring, reduced=True)
-        sum_game.layout = sum_layout
-        
-        return sum_game
+        return gameExpression.Sum(self, other)
     
     def __sub__(self, other):
         ''' Returns the difference of games.
@@ -535,18 +668,18 @@ class UpDown(object):
 
         Returns
         -------
-        UpDown
+        Sum
             the upset-downset game on the disjoint union of the directed 
             acyclic graph of 'self' with unchanged coloring and the reverse
             of the the directed acyclic graph of 'other' with the opposite 
-            coloring.
+            coloring. (A lazy expression, see the gameExpression module.)
 
         '''
         return self + (-other)
     
     def __eq__(self, other):
-        ''' Returns wether the games are equal. (Depends on the outcome 
-        method.)
+        ''' Returns wether the games are equal. (Compares canonical values, 
+        see the value method.)
 
         Parameters
         ----------
@@ -560,11 +693,11 @@ class UpDown(object):
             is a second player win) and False otherwise.
 
         '''
-        return (self - other).outcome() == 'Previous'
+        return self.value() is other.value()
     
     def __or__(self, other):
-        ''' Returns wether games are incomparable (fuzzy). (Depends on the 
-        outcome method.)
+        ''' Returns wether games are incomparable (fuzzy). (Compares 
+        canonical values, see the value method.)
 
         Parameters     
         ----------
@@ -577,11 +710,12 @@ class UpDown(object):
             True if the games 'self' and 'other' are fuzzy (their difference 
             is a first player win) and False otherwise.
         '''
-        return (self - other).outcome == 'Next'
+        G, H = self.value(), other.value()
+        return not G <= H and not H <= G
 
     def __gt__(self, other):
-        ''' Returns wether games are comparable in specified order. (Depends 
-        on the outcome method.)
+        ''' Returns wether games are comparable in specified order. (Compares 
+        canonical values, see the value method.)
 
         Parameters
         ----------
@@ -595,11 +729,11 @@ class UpDown(object):
             differnce is a win for Up) and False otherwise.
 
         '''
-        return (self - other).outcome() == 'Up'
+        return self.value() > other.value()
     
     def __lt__(self, other):
-        ''' Returns wether games are comparable in specified order. ** Depends 
-        on the outcome method.
+        ''' Returns wether games are comparable in specified order. (Compares 
+        canonical values, see the value method.)
 
         Parameters
         ----------
@@ -613,7 +747,7 @@ class UpDown(object):
             differnce is a win for Down) and False otherwise.
 
         '''
-        return (self - other).outcome() == 'Down'
+        return self.value() < other.value()
     
     def __len__(self):
         ''' Returns the number of nodes.
@@ -623,7 +757,7 @@ class UpDown(object):
             the number of nodes.
 
         '''
-        return len(self.dag)
+        return len(self.bitdag)
     
 
 ###############################################################################
@@ -643,46 +777,11 @@ class UpDown(object):
 
         Returns
         -------
-        UpDown
+        Ordinal
             The ordinal sum retains all nodes ('self' relabelled), edges,
             and coloring from both 'self' and 'other' and adds an edge 
-            from each sink of 'other' to every source of 'self'.
+            from each sink of 'other' to every source of 'self'. (A lazy 
+            expression, see the gameExpression module.)
 
         '''
-        # initialze dag for ordinal sum and update with nodes/edges in other
-        ordinal_dag= {}
-        for x in other.dag:
-            ordinal_dag[x] = []
-            for y in other.dag[x]:
-                ordinal_dag[x].append(y)
-        # initialize coloring in ordinal sum and update with others coloring.
-        ordinal_coloring = {}
-        ordinal_coloring.update(other.coloring)
-        # relabel self
-        n = len(other)
-        relabel_map = {i : i+n for i in self.dag}
-        self_relabel = digraph.relabel(self.dag, relabel_map)
-        # update dag in ordinal sum with selfs nodes/edges
-        ordinal_dag.update(self_relabel)
-        # update dag in ordinal sum with new edges between self 
-        # and others sink and source nodes
-        other_sinks = digraph.sinks(other.dag)
-        self_sources = [relabel_map[x] for x in digraph.sources(self.dag)]
-        for x in other_sinks:
-            ordinal_dag[x].extend(self_sources)
-        # update coloring of ordinal sum with selfs coloring
-        self_colors = {relabel_map[x]: self.coloring[x] for x in \
-                       self.dag}
-        ordinal_coloring.update(self_colors)
-        # get the layout of ordinal sum
-        largest_y = max(x[0] for x in other.layout.values())
-        ordinal_layout = {x:other.layout[x] for x in other.dag}
-        ordinal_layout.update(
-            {relabel_map[x]: (self.layout[x][0], 
-                 self.layout[x][1]+largest_y+1) for x in self.dag}
-                 )
-        # instantiate the game and set the layout
-        ordinal = UpDown(ordinal_dag, ordinal_coloring, reduced = True)
-        ordinal.layout = ordinal_layout
-        
-        return ordinal
+        return gameExpression.Ordinal(self, other)
@@ -1,8 +1,11 @@
 """
 @author: Charles Petersen and Jamison Barsotti
 """
-import digraph    
+from csrDigraph import CSRGraph
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
 
 def color(c):
     ''' Assigns an RGB color value to 'c'.
@@ -22,17 +25,43 @@ def color(c):
     
     return colordict[c]                           
 
+def edge_arrays(dag):
+    ''' Returns the nodes and edges of the directed graph 'dag' as arrays.
+
+    Parameters
+    ----------
+    dag : dict
+        adjacency representation of a directed graph. (Adjacency lists keyed 
+        by node.)
+
+    Returns
+    -------
+    nodes : list
+        the nodes of 'dag'.
+    tails : numpy array
+        int array of the position (in 'nodes') of the start of each edge.
+    heads : numpy array
+        int array of the position (in 'nodes') of the end of each edge.
+
+    '''
+    graph = CSRGraph.from_dict(dag)
+    tails = np.repeat(np.arange(len(graph)), graph.out_degrees())
+    
+    return graph.labels.tolist(), tails, graph.indices
+
 class UpDownPlot(object):
     '''Abstract class for constructing and mutating the plot of an 
     upset-downset game.
     '''
 
-    def __init__(self, game, marker='o'):               
+    def __init__(self, game, marker='o', labels=True):               
         '''
         Plots the  Hasse diagram (transitively reduced directed 
         acyclic graph with all edges pointing up) underlying the upset-downset 
         game, 'game'. The node positions in the plot are determined according
-        to the 'hasse_layout' function in the digraph module.
+        to the 'hasse_layout' function in the csrDigraph module. All edges 
+        are drawn by a single LineCollection and all nodes by a single 
+        scatter, both built from arrays, so large diagrams plot quickly.
         
         (Besides simply plotting a game of upset-downset, when interactively 
         playing a game this class allows for the easy mutation of the plot so 
@@ -43,61 +72,74 @@ class UpDownPlot(object):
         ----------
         game : UpDown
             a game of upset-downset
+        marker : matplotlib marker, optional
+            the node style. The default is 'o'.
+        labels : bool, optional
+            if True, each node is annotated with its label. (Turn off for
+            diagrams with thousands of nodes.) The default is True.
     
         Returns
         -------
-        list
-            inormation about the figure: 
-            [0] fig : matplotlib.figure
-            [1] fig_edges : dict, figure edges, keyed by edge labels.
-            [2] fig_vertices : dict, figure vertices keyed by labels.
-            [3] fig_vertex_labesl : dict, figure vertex labels keyed by 
-            vertex labels 
+        None. The figure information is kept in the attributes:
+            figure : matplotlib.figure
+            figure_edges : dict, the position of each edge (keyed by edge 
+            labels) in the segments of the LineCollection 'edge_collection'.
+            figure_vertices : dict, the position of each vertex (keyed by 
+            vertex labels) in the offsets of the scatter 'vertex_collection'.
+            figure_vertex_labels : dict, figure vertex labels keyed by 
+            vertex labels.
         '''
         
-        # get the dag, coloring, node and edge lists .     
-        dag = game.dag            
+        # get the coloring, nodes and edges (as arrays).     
         colors = game.coloring
-        nodes = game.dag.keys()
-        edges = digraph.edge_list(dag)
+        nodes, tails, heads = edge_arrays(game.dag)
         pos = game.layout            
+        # coordinates of the nodes and of the endpoints of the edges
+        xy = np.array([pos[n] for n in nodes], dtype=float).reshape(-1, 2)
+        segments = np.stack((xy[tails], xy[heads]), axis=1)
+        edges = list(zip(np.take(nodes, tails).tolist(), 
+                         np.take(nodes, heads).tolist()))
+        node_colors = np.array(
+            [to_rgba(color(colors[n])) for n in nodes]
+            ).reshape(-1, 4)
             
-        # set up the figure and an axes. The empty dicts
-        # will be filled by pointers to the lines, vertices 
-        # and labels of the figure, so pieces can be removed with ease.
+        # set up the figure and an axes. The dicts will be filled by the 
+        # positions of the edges and nodes in the collections, and pointers 
+        # to the labels of the figure, so pieces can be removed with ease.
         fig = plt.figure()
         ax = fig.add_subplot()
-        fig_edges = {}
-        fig_vertices = {}
+        edge_collection = LineCollection(
+            segments, 
+            colors='#000000', 
+            zorder=1
+            )
+        ax.add_collection(edge_collection)
+        vertex_collection = ax.scatter(
+            xy[:, 0], 
+            xy[:, 1], 
+            s=18**2, 
+            c=node_colors, 
+            marker=marker, 
+            zorder=2
+            )
         fig_vertex_labels = {}
-    
-        for e in edges:
-            # add a line segment to the figure connecting 
-            # endpoints of edge
-            ax.plot([pos[e[0]][0],pos[e[1]][0]],
-                    [pos[e[0]][1],pos[e[1]][1]], color='000000')  
-            # update fig_edges with a pointer to the line segment 
-            # in the figure.
-            fig_edges[(e[0],e[1])] = ax.lines[-1]
-                            
-        for n in nodes:
-            # get the color of the node
-            c = color(colors[n])     
-            # add a point to the figure with color c.
-            ax.plot(pos[n][0],pos[n][1], marker=marker, color=c, markersize=18)
-            # add a label to the vertex
-            ax.annotate(str(n), xy=(pos[n][0],pos[n][1]))
-            # update fig_vertices and fig_vertex_labels with
-            # pointers to the new additions.
-            fig_vertices[n] = ax.lines[-1]
-            fig_vertex_labels[n] = ax.texts[-1]
+        if labels:
+            for n, (x, y) in zip(nodes, xy):
+                ax.annotate(str(n), xy=(x, y))
+                fig_vertex_labels[n] = ax.texts[-1]
+        ax.autoscale_view()
         
         # don't plot the x or y axes.
         plt.axis('off')
          
         self.figure = fig
-        self.figure_edges = fig_edges
-        self.figure_vertices = fig_vertices
+        self.edge_collection = edge_collection
+        self.vertex_collection = vertex_collection
+        self.segments = segments
+        self.vertex_xy = xy
+        self.vertex_colors = node_colors
+        self.figure_edges = {e: i for i, e in enumerate(edges)}
+        self.figure_vertices = {n: i for i, n in enumerate(nodes)}
         self.figure_vertex_labels = fig_vertex_labels
 
 
@@ -119,32 +161,33 @@ class UpDownPlot(object):
         '''
         
         # get the nodes and edges of the sub game
-        dag = sub_game.dag            
-        nodes = sub_game.dag.keys()                      
-        edges = digraph.edge_list(dag)
+        nodes, tails, heads = edge_arrays(sub_game.dag)
+        edges = list(zip(np.take(nodes, tails).tolist(), 
+                         np.take(nodes, heads).tolist()))
         
-        # initialize dicts to store  sub game figure info
-        sub_fig_edges = {}
-        sub_fig_vertices = {}
-        sub_fig_vertex_labels = {}
+        # keep only the segments and offsets of the sub game in the 
+        # collections
+        kept_edges = [self.figure_edges[e] for e in edges]
+        kept_vertices = [self.figure_vertices[n] for n in nodes]
+        self.segments = self.segments[kept_edges]
+        self.vertex_xy = self.vertex_xy[kept_vertices]
+        self.vertex_colors = self.vertex_colors[kept_vertices]
+        self.edge_collection.set_segments(self.segments)
+        self.vertex_collection.set_offsets(self.vertex_xy)
+        self.vertex_collection.set_facecolor(self.vertex_colors)
+        self.vertex_collection.set_edgecolor(self.vertex_colors)
         
-        # collect the sub game figure info
-        for e in edges:
-            sub_fig_edges[e] = self.figure_edges.pop(e)
+        # collect the sub game labels and remove those not in the sub game
+        sub_fig_vertex_labels = {}
         for n in nodes:
-            sub_fig_vertices[n] = self.figure_vertices.pop(n)
-            sub_fig_vertex_labels[n] = self.figure_vertex_labels.pop(n)
-            
-        # remove the figure info not in the sub game
-        for e in self.figure_edges:
-            self.figure_edges[e].remove()
-        for v in self.figure_vertices:
-            self.figure_vertices[v].remove()
+            if n in self.figure_vertex_labels:
+                sub_fig_vertex_labels[n] = self.figure_vertex_labels.pop(n)
+        for v in self.figure_vertex_labels:
             self.figure_vertex_labels[v].remove()
         
         # mutate the figure info to match whats left in the sub game
-        self.figure_edges = sub_fig_edges
-        self.figure_vertices = sub_fig_vertices
+        self.figure_edges = {e: i for i, e in enumerate(edges)}
+        self.figure_vertices = {n: i for i, n in enumerate(nodes)}
         self.figure_vertex_labels = sub_fig_vertex_labels
     
     def show(self):